@@ -0,0 +1,142 @@
+"""
+Micro-benchmark of the table DSL executors on config/table.dsl, using a synthetic component
+where looking up a value is a dictionary access, so only the cost of the executors is measured.
+The same table is then built from a generated `_INF` sheet with `ComponentInfo`, which includes
+the cost of reading the values from the sheet.
+
+Run from the repository root:
+
+    python benchmarks/dsl_interpreter.py [variables] [domains] [repeats]
+"""
+import os
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+from table_generation.component import ComponentInfo, VAR_INF_COL, VAR_INF_ROW
+from table_generation.parser.parser import Parser, TableExecutor
+from table_generation.parser.compiler import specialize
+from table_generation.parser.interpreter import assemble, Interpreter
+from utils.dataframes import excel_to_indx
+
+class SyntheticInfo:
+    """
+    Stand-in for `ComponentInfo` with generated values.
+    """
+    def __init__(self, num_variables : int, num_domains : int):
+        self.variables = [f"VarGe{i + 1:02}" for i in range(num_variables)]
+        self.influences = ["Variable influence on process", "Process influence on variable"]
+        self.domains = [f"Domain {i + 1}" for i in range(num_domains)]
+        self._values = {}
+        for n, var in enumerate(self.variables):
+            for inf in self.influences:
+                present = "No" if n % 3 == 0 else "Yes"
+                self._values[(var, inf, "Influence present?", "Yes/No")] = present
+                self._values[(var, inf, "Influence present?", "Description")] = f"{var} {inf}"
+                for domain in self.domains:
+                    self._values[(var, inf, domain, "Rationale")] = f"Rationale for {var} in {domain}"
+
+    def get_value(self, l0, l1, l2, l3) -> str:
+        return self._values[(l0, l1, l2, l3)]
+
+    def get_values(self, keys):
+        return [self._values.get(key) for key in keys]
+
+def sheet_info(synthetic : SyntheticInfo) -> ComponentInfo:
+    """
+    `ComponentInfo` reading the values of `synthetic` from a sheet with the layout of a `_INF` sheet.
+    """
+    j, i = excel_to_indx(VAR_INF_COL, VAR_INF_ROW)
+    num_variables = len(synthetic.variables)
+    piv_offset = num_variables + 4
+    df = pd.DataFrame(index=range(i + piv_offset + num_variables + 1), columns=range(j + 3 * len(synthetic.domains) + 3), dtype=object)
+
+    df.iat[i - 1, j - 3] = "Variable" # Label in front of the level 3 headers
+    df.iat[i - 2, j] = "Influence present?"
+    df.iat[i - 1, j], df.iat[i - 1, j + 1] = "Yes/No", "Description"
+    for d, domain in enumerate(synthetic.domains):
+        col = j + 3 + 3 * d
+        df.iat[i - 2, col] = domain
+        df.iat[i - 1, col], df.iat[i - 1, col + 1] = "How", "Rationale"
+
+    for n, var in enumerate(synthetic.variables):
+        for row, inf in [(i + n, synthetic.influences[0]), (i + n + piv_offset, synthetic.influences[1])]:
+            df.iat[row, j] = synthetic.get_value(var, inf, "Influence present?", "Yes/No")
+            df.iat[row, j + 1] = synthetic.get_value(var, inf, "Influence present?", "Description")
+            for d, domain in enumerate(synthetic.domains):
+                df.iat[row, j + 4 + 3 * d] = synthetic.get_value(var, inf, domain, "Rationale")
+
+    info = ComponentInfo.__new__(ComponentInfo) # Without a workbook
+    info.df = df
+    info.variables = synthetic.variables
+    return info
+
+def measure(func, repeats : int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+def dump(table_state):
+    return list(table_state.iter_cells()), table_state.spans, table_state.force_cutoffs
+
+def main():
+    num_variables = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    num_domains = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    with open(os.path.join(ROOT, "config", "table.dsl")) as f:
+        code = f.read()
+
+    info = SyntheticInfo(num_variables, num_domains)
+    variable_names = {var: f"Description of {var}" for var in info.variables}
+
+    parser = Parser(cache_path=None)
+    parser.parse(code)
+    table = specialize(parser.program, info, variable_names) #type: ignore
+    program = assemble(table.ops)
+    interpreter = Interpreter(program, table)
+
+    def reference():
+        executor = TableExecutor(info, variable_names)
+        executor.transform(parser.tree)
+        return executor.table_state
+
+    # Both executors have to build the same table
+    assert dump(reference()) == dump(interpreter.run())
+    steps = interpreter.steps
+
+    results = {
+        "TableExecutor (reference)": measure(reference, repeats),
+        "specialize + assemble + run": measure(lambda: Interpreter(assemble(specialize(parser.program, info, variable_names).ops), table).run(), repeats), #type: ignore
+        "run (pre-assembled)": measure(interpreter.run, repeats),
+    }
+
+    print(f"{num_variables} variables, {num_domains} domains, {len(program)} instructions, {steps} executed per table\n")
+    print(f"{'Executor':<30}{'Median':>12}{'Instructions/s':>18}")
+    for name, seconds in results.items():
+        print(f"{name:<30}{seconds * 1000:>10.2f}ms{steps / seconds:>18,.0f}")
+
+    # Values read from a sheet, each table gets a new `ComponentInfo` so no values are cached between runs
+    sheet_infos = [sheet_info(info) for _ in range(repeats + 1)]
+    sheet_info_iter = iter(sheet_infos)
+    sheet_info_iter2 = iter(sheet_infos[1:])
+    assert dump(parser.execute(sheet_infos[0], variable_names, compiled=False)) == dump(reference())
+
+    results = {
+        "TableExecutor (reference)": measure(lambda: parser.execute(next(sheet_info_iter), variable_names, compiled=False), repeats),
+        "compiled": measure(lambda: parser.execute(next(sheet_info_iter2), variable_names), repeats),
+    }
+    print(f"\n{'Table from sheet':<30}{'Median':>12}")
+    for name, seconds in results.items():
+        print(f"{name:<30}{seconds * 1000:>10.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Benchmark of constructing the table DSL parser, with and without the serialized parser tables.
+
+Run from the repository root:
+
+    python benchmarks/parser_construction.py [repeats]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from table_generation.parser.parser import Parser
+
+def measure(make_parser, repeats : int):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        make_parser()
+        times.append(time.perf_counter() - start)
+    return times
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    cache_path = os.path.join(tempfile.mkdtemp(), "table_dsl.lark_cache")
+
+    results = {}
+    results["no cache"] = measure(lambda: Parser(cache_path=None), repeats)
+
+    # First construction builds the tables and writes the cache file
+    results["cold cache (build + write)"] = measure(lambda: Parser(cache_path=cache_path), 1)
+    results["warm cache (load)"] = measure(lambda: Parser(cache_path=cache_path), repeats)
+
+    print(f"{'Parser construction':<30}{'Runs':>6}{'Median':>12}{'Min':>12}")
+    for name, times in results.items():
+        print(f"{name:<30}{len(times):>6}{statistics.median(times) * 1000:>10.2f}ms{min(times) * 1000:>10.2f}ms")
+
+    speedup = statistics.median(results["no cache"]) / statistics.median(results["warm cache (load)"])
+    print(f"\nLoading the cached tables is {speedup:.1f}x faster than building them")
+
+    os.remove(cache_path)
+
+if __name__ == "__main__":
+    main()
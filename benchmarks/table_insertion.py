@@ -0,0 +1,55 @@
+"""
+Benchmark of inserting tables after paragraphs of a large document, as in insert mode, comparing
+`insert_table_after` with looking up the position of the paragraph in the body.
+
+Run from the repository root:
+
+    python benchmarks/table_insertion.py [paragraphs] [tables]
+"""
+import os
+import sys
+import time
+
+from docx import Document
+from docx.oxml import OxmlElement
+from docx.text.paragraph import Paragraph
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from utils.xml import insert_table_after
+
+def _insert_by_index(rows : int, cols : int, insert_after):
+    # Previous implementation, the table is placed at the index of `insert_after` in the body
+    tbl = insert_table_after(rows, cols, insert_after)._tbl
+    parent = insert_after._element.getparent()
+    parent.remove(tbl)
+    parent.insert(parent.index(insert_after._element) + 1, tbl)
+
+def measure(insert, num_paragraphs : int, num_tables : int) -> float:
+    doc = Document()
+    # Paragraphs are added to the XML directly, `add_paragraph` searches the body for each one
+    sectPr = doc.element.body[-1]
+    paragraphs = []
+    for _ in range(num_paragraphs):
+        p = OxmlElement("w:p")
+        sectPr.addprevious(p)
+        paragraphs.append(Paragraph(p, doc._body))
+    # Tables are inserted from the start of the document to the end, like the headings are visited
+    targets = paragraphs[::max(num_paragraphs // num_tables, 1)][:num_tables]
+
+    start = time.perf_counter()
+    for paragraph in targets:
+        insert(20, 7, paragraph)
+    return time.perf_counter() - start
+
+def main():
+    num_paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    num_tables = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    print(f"Inserting {num_tables} tables into a document with {num_paragraphs} paragraphs")
+    for name, insert in [("index lookup", _insert_by_index), ("addnext", insert_table_after)]:
+        elapsed = measure(insert, num_paragraphs, num_tables)
+        print(f"    {name:<14}{elapsed * 1000:>10.1f} ms   {elapsed / num_tables * 1e6:>8.1f} us/table")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import sys
 import PyInstaller.__main__
 
 # List of GUI Python scripts to compile
@@ -35,6 +36,14 @@ def build_exe(script):
     PyInstaller.__main__.run(common_options + add_data + [script])
 
 
+def build_parser_cache():
+    # Bundled with the config folder, so the exe does not build the LALR tables on startup
+    print("Building table DSL parser cache...")
+    sys.path.insert(0, "scripts")
+    from table_generation.parser.parser import build_parser_cache
+    build_parser_cache()
+
+
 def ensure_backups_folder():
     dist_dir = "dist"
     backups_path = os.path.join(dist_dir, BACKUPS_DIR)
@@ -47,6 +56,8 @@ def ensure_backups_folder():
 
 
 def main():
+    build_parser_cache()
+
     for file in files_to_build:
         if os.path.exists(file):
             build_exe(file)
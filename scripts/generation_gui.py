@@ -1,6 +1,7 @@
 import os
 import queue
 import sys
+import threading
 from typing import List
 import traceback
 
@@ -21,6 +22,7 @@ from gui import (
     )
 from table_generation.table import TableCollection
 from table_generation.async_table_generator import AsyncTableGenerator
+from table_generation.preview import preview_component, open_html_preview
 from utils.gui_utils import (
     disable_button, 
     open_folder, 
@@ -31,6 +33,7 @@ from utils.gui_utils import (
     )
 from utils.redirect_manager import redirect_stdout_to
 from utils.files import create_backup, resource_path
+from utils.instrumentation import RunReport, record_run, stage
 
 class App(ctk.CTkFrame):
     ASPECT_RATIO = 9 / 16
@@ -59,6 +62,8 @@ class App(ctk.CTkFrame):
         self.recieved_tables : List[TableCollection] = []
         self.doc_path_for_insertion : str = ""
         self.doc_for_insertion : docx.document.Document | None = None
+        self.dry_run = False # Only checking which tables would change, nothing to save
+        self.previewing = False # A preview is being built, the preview button is disabled meanwhile
 
         # Object for generating tables asynchronously 
         self.table_queue = queue.Queue()
@@ -69,8 +74,9 @@ class App(ctk.CTkFrame):
         disable_button(self.save_button)
         self.async_table_generator.stop_event.set()
 
-    def _gen_tables(self, insert=False):        
+    def _gen_tables(self, insert=False, dry_run=False):        
         self.frame_manager.go_to_frame(3)
+        self.dry_run = dry_run
         self.recieved_tables = [] # Clear tables left from previous generate
         self.async_table_generator.stop_event.clear() # Make sure the stop flag is set to false
         self.async_table_generator.on_fail = self._show_gen_fail
@@ -81,7 +87,7 @@ class App(ctk.CTkFrame):
                 assert self.insert_doc_file_handler.has_files, "No files for insertion found"
                 self.doc_path_for_insertion = self.insert_doc_file_handler.first_path() #type: ignore
                 self.doc_for_insertion = Document(self.doc_path_for_insertion)
-                self.async_table_generator.generate_and_insert_tables(self.excel_file_handler.selected_file_paths, self.doc_for_insertion)
+                self.async_table_generator.generate_and_insert_tables(self.excel_file_handler.selected_file_paths, self.doc_for_insertion, dry_run=dry_run)
             else:
                 self.async_table_generator.template_file_path = self.empty_doc_file_handler.first_path()
                 self.async_table_generator.generate_tables(self.excel_file_handler.selected_file_paths)
@@ -101,11 +107,20 @@ class App(ctk.CTkFrame):
         self.after(100, self._poll_table_queue)  # Poll every 100ms
 
     def _save_tables(self):
+        # Save timings are added to the report of the generation run
+        report = self.async_table_generator.run_report or RunReport("save")
         try:
             # If we are inserting into a word file, just save the file and return
             if self.doc_for_insertion is not None:
                 create_backup(self.doc_path_for_insertion)
-                self.doc_for_insertion.save(self.doc_path_for_insertion)
+                with record_run(report), stage("save"):
+                    self.doc_for_insertion.save(self.doc_path_for_insertion)
+
+                # Write run report next to the document, e.g. report.docx -> report_run_report.json
+                name, _ = os.path.splitext(self.doc_path_for_insertion)
+                with redirect_stdout_to(self.output_redirector):
+                    report.write(f"{name}_run_report.json")
+
                 self._show_save_confirmation(os.path.dirname(self.doc_path_for_insertion))
                 return
 
@@ -118,8 +133,10 @@ class App(ctk.CTkFrame):
             make_subfolders = len(self.excel_file_handler.selected_file_paths) > 1
 
             with redirect_stdout_to(self.output_redirector):
-                for table in self.recieved_tables:
-                    table.save(output_dir, make_subfolder=make_subfolders)
+                with record_run(report):
+                    for table in self.recieved_tables:
+                        table.save(output_dir, make_subfolder=make_subfolders)
+                report.write(os.path.join(output_dir, "run_report.json"))
 
             # Show confirmation popup with "Open folder" option
             self._show_save_confirmation(output_dir)
@@ -156,6 +173,38 @@ class App(ctk.CTkFrame):
         confirm_win.set_left("Copy traceback", copy_traceback)
         confirm_win.set_right("Ok", confirm_win.destroy)
 
+    def _preview_table(self):
+        component_id = self.preview_entry.get().strip()
+        if not component_id:
+            return
+
+        # Built on a thread, opening the workbook can take seconds. The result is shown on the main thread
+        def task(xls_paths : List[str]):
+            try:
+                with redirect_stdout_to(self.output_redirector):
+                    table_state = preview_component(xls_paths, component_id)
+            except Exception as e:
+                self.after(0, lambda err=e: self._show_preview_fail(component_id, err)) # `e` is cleared after the except block
+            else:
+                self.after(0, lambda: open_html_preview(table_state, component_id))
+            finally:
+                self.previewing = False
+
+        self.previewing = True
+        threading.Thread(target=task, args=(list(self.excel_file_handler.selected_file_paths),), daemon=True).start()
+
+    def _show_preview_fail(self, component_id : str, err : Exception):
+        confirm_win = PopUpWindow(self, "Preview Failed", f"Could not preview {component_id}:\n{err}")
+        confirm_win.set_left("Cancel", confirm_win.destroy)
+        confirm_win.set_right("Ok", confirm_win.destroy)
+
+    def _show_run_report(self):
+        report = self.async_table_generator.run_report
+        if report is None:
+            return
+        report_win = PopUpWindow(self, "Run report", text=report.format_summary(), width=600, height=300, text_box=True)
+        report_win.text_box.configure(font=("Courier New", 12)) # Monospace to keep columns aligned
+
     def stop(self):
         self.destroy()
 
@@ -300,6 +349,18 @@ class App(ctk.CTkFrame):
             command=lambda: self.frame_manager.go_to_frame(2)
         )
 
+        # Preview of a single component in the browser, without generating a Word document
+        preview_frame = ctk.CTkFrame(files_chosen_frame, fg_color="transparent")
+        self.preview_entry = ctk.CTkEntry(preview_frame, placeholder_text="Component id, e.g. Ge01", width=180)
+        self.preview_button = ctk.CTkButton(
+            preview_frame,
+            text="Preview table",
+            width=120,
+            command=self._preview_table
+        )
+        _hover5 = OnHover(self.preview_button, "Open the table of one component in the browser")
+        disable_button_while(self.preview_button, lambda: self.previewing)
+
         # Containers for the two generation types
         self.empty_doc_frame = CollapsibleFrame(generate_settings_frame, title="Generate in empty document", fg_color="transparent")
         self.insert_doc_frame = CollapsibleFrame(generate_settings_frame, title="Insert into existing document", fg_color="transparent")
@@ -347,6 +408,16 @@ class App(ctk.CTkFrame):
         )
         disable_button_while(self.gen_insert_button, _disable_gen_while)
 
+        self.check_insert_button = ctk.CTkButton(
+            self.insert_doc_frame.content,
+            text="Check changes",
+            width=250,
+            height=30,
+            command=lambda: self._gen_tables(insert=True, dry_run=True)
+        )
+        disable_button_while(self.check_insert_button, _disable_gen_while)
+        _hover6 = OnHover(self.check_insert_button, "List the tables that would be added or changed, without modifying the document")
+
         # Command-line style textbox for table generation output
         output_textbox = ctk.CTkTextbox(
             generating_frame, 
@@ -360,6 +431,9 @@ class App(ctk.CTkFrame):
         def _disable_save_while() -> bool:
             return not self.async_table_generator.is_done()
 
+        def _disable_save_while_dry_run() -> bool:
+            return _disable_save_while() or self.dry_run
+
         # Button for saving tables
         self.save_button = ctk.CTkButton(
             generating_frame,
@@ -369,7 +443,18 @@ class App(ctk.CTkFrame):
             font=("Segoe UI", 20, "bold"),
             command=self._save_tables
         ) 
-        disable_button_while(self.save_button, _disable_save_while)
+        disable_button_while(self.save_button, _disable_save_while_dry_run)
+
+        # Button for showing timings of the generation
+        self.run_report_button = ctk.CTkButton(
+            generating_frame,
+            text="Run report",
+            width=120,
+            height=30,
+            command=self._show_run_report
+        )
+        disable_button_while(self.run_report_button, _disable_save_while)
+        _hover4 = OnHover(self.run_report_button, "Show time spent per stage and component")
 
         #==================================================
         # Placing UI elements and inner containers
@@ -391,6 +476,9 @@ class App(ctk.CTkFrame):
         file_list_frame.pack(**self.FRAME_1_KW)
         self.excel_file_handler.ui.pack(fill="both", expand=True, pady=5) #type: ignore
         self.more_files_button.pack(side=LEFT, padx=5, pady=5)
+        preview_frame.pack(side=LEFT, anchor="s", padx=5, pady=5)
+        self.preview_entry.pack(side=LEFT, padx=(0, 5))
+        self.preview_button.pack(side=LEFT)
         self.continue_button.pack(side=TOP, anchor="e", padx=5, pady=5)
 
         # Frame 2
@@ -407,14 +495,16 @@ class App(ctk.CTkFrame):
             container.grid_rowconfigure(1, weight=0)
 
         self.empty_dnd_box.frame.grid(row=0, column=0, rowspan=2, sticky="nsew", padx=10, pady=10)
-        self.insert_dnd_box.frame.grid(row=0, column=0, rowspan=2, sticky="nsew", padx=10, pady=10)
+        self.insert_dnd_box.frame.grid(row=0, column=0, rowspan=3, sticky="nsew", padx=10, pady=10)
 
         self.empty_doc_file_handler.ui.grid(row=0, column=1, sticky="nsew", padx=10, pady=(10, 5)) #type: ignore
         self.insert_doc_file_handler.ui.grid(row=0, column=1, sticky="nsew", padx=10, pady=(10, 5)) #type: ignore
 
         self.gen_empty_button.grid(row=1, column=1, sticky="nsew", padx=10, pady=(5, 10))
         self.gen_insert_button.grid(row=1, column=1, sticky="nsew", padx=10, pady=(5, 10))
+        self.check_insert_button.grid(row=2, column=1, sticky="nsew", padx=10, pady=(0, 10))
 
         # Frame 3
         output_textbox.pack(fill="both", padx=10, pady=10)
-        self.save_button.pack(side=TOP, anchor="e", padx=10, pady=(5,10))
\ No newline at end of file
+        self.save_button.pack(side=TOP, anchor="e", padx=10, pady=(5,10))
+        self.run_report_button.pack(side=TOP, anchor="e", padx=10, pady=(0,10))
\ No newline at end of file
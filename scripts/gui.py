@@ -1,7 +1,14 @@
-import customtkinter as ctk
-import sync_gui as sync
-import generation_gui as gen
-from gui import Tk
+import sys
+
+# Imported first, so the startup report includes the other imports
+from utils.startup import startup_timer, warm_up
+
+with startup_timer.measure("import customtkinter"):
+    import customtkinter as ctk
+with startup_timer.measure("import gui"):
+    from gui import Tk, PopUpWindow
+from utils.profiling import PROFILES_DIR, profiling_enabled, set_profiling
+from utils.tracing import set_tracing
 
 ASPECT_RATIO = 9 / 16
 RES_X = 720
@@ -41,36 +48,83 @@ class MainApp(Tk):
             font=("Segoe UI", 20, "bold")
             ).grid(row=1, column=1, sticky="ew", padx=10, pady=10)
 
-        self.sync = sync.App(self)
-        self.gen = gen.App(self)
-        self.sync.run()
-        self.gen.run()
-
-        self.sync.frame_manager.callbacks[0] = self.show_buttons
-        self.gen.frame_manager.callbacks[0] = self.show_buttons
+        # Built on first use, importing the generation and sync views pulls in pandas, docx etc.
+        self.sync = None
+        self.gen = None
 
         self.show_buttons()
 
+        # Hidden shortcut for toggling profiling of generation and syncing
+        self.bind("<Control-Shift-P>", lambda _: self.toggle_profiling())
+
+    def toggle_profiling(self):
+        set_profiling(not profiling_enabled())
+        state = "enabled" if profiling_enabled() else "disabled"
+        popup = PopUpWindow(self, "Profiling", f"Profiling {state}. Profiles are saved in the '{PROFILES_DIR}' folder.")
+        popup.set_right("Ok", popup.destroy)
+
+    def _build_app(self, module_name : str):
+        with startup_timer.measure(f"build {module_name}"):
+            module = startup_timer.import_module(module_name)
+            app = module.App(self)
+            app.run()
+            app.frame_manager.callbacks[0] = self.show_buttons
+        return app
+
+    def get_sync(self):
+        if self.sync is None:
+            self.sync = self._build_app("sync_gui")
+        return self.sync
+
+    def get_gen(self):
+        if self.gen is None:
+            self.gen = self._build_app("generation_gui")
+        return self.gen
+
     def show_buttons(self):
         self.title("Select Operation")
         self.button_frame.pack(expand=True, fill="both")
-        self.sync.pack_forget()
-        self.gen.pack_forget()
+        if self.sync is not None:
+            self.sync.pack_forget()
+        if self.gen is not None:
+            self.gen.pack_forget()
 
     def show_sync(self):
+        sync = self.get_sync()
         self.title("File syncing")
         self.button_frame.pack_forget()
-        self.gen.pack_forget()
-        self.sync.pack(expand=True, fill="both")
+        if self.gen is not None:
+            self.gen.pack_forget()
+        sync.pack(expand=True, fill="both")
 
     def show_gen(self):
+        gen = self.get_gen()
         self.title("Table generation")
         self.button_frame.pack_forget()
-        self.sync.pack_forget()
-        self.gen.pack(expand=True, fill="both")
+        if self.sync is not None:
+            self.sync.pack_forget()
+        gen.pack(expand=True, fill="both")
+
+    def on_shown(self, startup_report=False):
+        startup_timer.mark("window shown")
+
+        def done():
+            if startup_report:
+                print(startup_timer.format_report())
+                startup_timer.write()
+
+        # Load the heavy modules while the user picks an operation
+        warm_up(on_done=done)
 
 if __name__ == "__main__":
+    if "--profile" in sys.argv:
+        set_profiling(True)
+    if "--trace" in sys.argv:
+        set_tracing(True)
+
     ctk.set_appearance_mode("system")
 
-    app = MainApp()
+    with startup_timer.measure("build main window"):
+        app = MainApp()
+    app.after_idle(lambda: app.on_shown(startup_report="--startup-report" in sys.argv))
     app.mainloop()
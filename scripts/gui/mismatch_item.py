@@ -1,11 +1,19 @@
-from typing import Callable
+from __future__ import annotations
+
+from functools import cache
+from typing import Callable, Dict, List, TYPE_CHECKING
+
+import tkinter
 
 import customtkinter as ctk
 from PIL import Image
 
 from gui import MultiPartTextBox, OnHover
-from word_sync.sync_files import Mismatch
-from utils.gui_utils import blend_colors, get_color
+
+# word_sync pulls in docx, pandas and rapidfuzz, only imported once a sync is started
+if TYPE_CHECKING:
+    from word_sync.sync_files import Mismatch
+from utils.gui_utils import blend_colors, get_color, unbind_all_command
 from utils.files import resource_path
 
 def _get_similarity_color(similarity: float) -> str:
@@ -21,50 +29,36 @@ def _get_similarity_color(similarity: float) -> str:
     b = 100  # constant to keep it darker
     return f"#{r:02x}{g:02x}{b:02x}"
 
-def _diff_words(a: str, b: str):
-    words_a = a.split()
-    words_b = b.split()
-    
-    result = []
-    match_run = []
-    mismatch_run_a = []
-    mismatch_run_b = []
-
-    # Iterate over both lists of words
-    for wa, wb in zip(words_a, words_b):
-        if wa == wb:
-            # Flush any accumulated mismatches
-            if mismatch_run_a:
-                result.append((" ".join(mismatch_run_a), " ".join(mismatch_run_b)))
-                mismatch_run_a = []
-                mismatch_run_b = []
-            match_run.append(wa)
-        else:
-            # Flush any accumulated matches
-            if match_run:
-                result.append(" ".join(match_run))
-                match_run = []
-            mismatch_run_a.append(wa)
-            mismatch_run_b.append(wb)
-
-    # Flush any remaining runs
-    if match_run:
-        result.append(" ".join(match_run))
-    if mismatch_run_a:
-        result.append((" ".join(mismatch_run_a), " ".join(mismatch_run_b)))
-
-    # Handle leftover words
-    if len(words_a) > len(words_b):
-        result.append((" ".join(words_a[len(words_b):]), None))
-    elif len(words_b) > len(words_a):
-        result.append((None, " ".join(words_b[len(words_a):])))
-
-    return result
+@cache
+def _icon(icon_path : str) -> ctk.CTkImage:
+    # Shared between all rows, images are only loaded once
+    return ctk.CTkImage(Image.open(icon_path))
+
+# Text shown on a resolved row for each choice
+_CHOICE_TEXT = {
+    "w": "Used Word version",
+    "e": "Used Excel version",
+    "t": "Used table value",
+    "s": "Skipped",
+    "": "Skipped",
+}
 
 class _DifferenceFrame(ctk.CTkFrame):
-    def __init__(self, master, mismatch : Mismatch, file_type, on_press, **kwargs):
+    def __init__(self, master, on_press, **kwargs):
         super().__init__(master, **kwargs)
 
+        self._label = ctk.CTkLabel(self, text="", compound="left", text_color="gray")
+        self._label.pack(anchor="w", padx=5, pady=(5, 0))
+
+        # Takes the remaining height of the row, longer texts scroll inside the text box
+        self.text_box = MultiPartTextBox(self, [], height=70)
+        self.text_box.pack(fill="both", expand=True, padx=5, pady=5)
+
+        self.button = ctk.CTkButton(self, text="", command=on_press)
+        self.button.pack(fill="x", expand=True, padx=5, pady=5)
+        self._hover = OnHover(self.button)
+
+    def set_mismatch(self, mismatch : Mismatch, file_type : str):
         match file_type:
             case "word":
                 icon_path = resource_path("resources/word_icon.png")
@@ -92,19 +86,16 @@ class _DifferenceFrame(ctk.CTkFrame):
             case _:
                 raise ValueError(f"File type must be either 'word' or 'excel, found {file_type}")
 
-        img = ctk.CTkImage(Image.open(icon_path))
-        self._label = ctk.CTkLabel(self, text=icon_text, image=img, compound="left", text_color="gray")
-        self._label.pack(anchor="w", padx=5, pady=(5, 0))
-
-        self.text_box = self._make_text_box(mismatch, text_diff_index)
-        self.text_box.pack(fill="both", expand=True, padx=5, pady=5)
+        self._label.configure(text=icon_text, image=_icon(icon_path))
+        self.button.configure(text=button_text)
+        self._hover.tooltip_text = hover_text
+        self.text_box.set_parts(self._text_parts(mismatch, text_diff_index))
 
-        self.button = ctk.CTkButton(self, text=button_text, command=on_press)
-        self.button.pack(fill="x", expand=True, padx=5, pady=5)
-        self._hover = OnHover(self.button, hover_text)
+    def _text_parts(self, mismatch : Mismatch, indx : int) -> List[Dict]:
+        from word_sync.diff import diff_words
 
-    def _make_text_box(self, mismatch : Mismatch, indx : int) -> MultiPartTextBox:
-        substrings = _diff_words(mismatch.in_word, mismatch.in_excel)
+        # Computed once when scanning
+        substrings = mismatch.diff or diff_words(mismatch.in_word, mismatch.in_excel)
         parts = []
 
         for subs in substrings:
@@ -119,149 +110,350 @@ class _DifferenceFrame(ctk.CTkFrame):
                 parts.append({
                     "text": subs + " ",
                 })
-        
-        return MultiPartTextBox(self, parts, height=70)
+        return parts
 
 class _MismatchItem(ctk.CTkFrame):
+    """
+    Row widget showing a single mismatch. Rows are reused for different mismatches 
+    by `MismatchContainer`, see `set_mismatch`.
+    """
     def __init__(
             self, 
             master, 
-            mismatch : Mismatch, 
-            on_resolve : Callable[['_MismatchItem'], None] | None = None,
+            on_choice : Callable[[Mismatch, str], None] | None = None,
             **kwargs
             ):
-        super().__init__(master, **kwargs)
-        self.mismatch = mismatch
-        self.on_resolve = on_resolve
-
-        default_fg_color = get_color(self, "CTkFrame", "fg_color")
-        default_border_color = get_color(self, "CTkFrame", "border_color")
-        similarity_color = _get_similarity_color(mismatch.similarity / 100)
-        border_color = blend_colors(similarity_color, default_border_color, 0.4)
-        fg_color = blend_colors(border_color, default_fg_color, 0.2)
-
-        self.configure(border_color=border_color, fg_color=fg_color, border_width=2)
-
-        # Variable to store the result
-        self.result_var = ctk.StringVar(value="")
+        super().__init__(master, border_width=2, **kwargs)
+        self.mismatch : Mismatch | None = None
+        self.on_choice = on_choice
+        self.shown : tuple | None = None # (id(mismatch), decision, choice) currently displayed
 
         self.grid_columnconfigure((0, 1), weight=1, uniform="row2")
-        self.grid_rowconfigure((0, 3), weight=1)
+        self.grid_rowconfigure(2, weight=1) # Extra height goes to the texts
 
         from gui import MultiPartLabel
 
         bold_font = ctk.CTkFont(family="Seoge UI", size=18, weight="bold")
         font = ctk.CTkFont(family="Seoge UI", size=18)
-        match_text = "mismatch ❌" if int(mismatch.similarity) != 100 else "match ✅"
-        MultiPartLabel(
+        self.title_label = MultiPartLabel(
             self, 
             parts=[
-                {
-                    "text":f"{mismatch.mismatch_type.upper()} ",
-                    "text_color":border_color,
-                    "font":bold_font
-                },
-                {
-                    "text":match_text,
-                    "text_color":border_color,
-                    "font":font
-                },
+                {"text":"", "font":bold_font},
+                {"text":"", "font":font},
             ]
-            ).grid(row=0, column=0, padx=5, pady=(5, 0), sticky="nw")
+            )
+        self.title_label.grid(row=0, column=0, padx=5, pady=(5, 0), sticky="nw")
 
-        ctk.CTkLabel(
-            self, 
-            text=f"{int(mismatch.similarity)}% match",
-            font=font,
-            text_color=border_color
-            ).grid(row=0, column=1, padx=5, pady=(5, 3), sticky="ne")
+        self.similarity_label = ctk.CTkLabel(self, text="", font=font)
+        self.similarity_label.grid(row=0, column=1, padx=5, pady=(5, 3), sticky="ne")
         
-        ctk.CTkLabel(
-            self, 
-            text=f"in {mismatch.header}",
-            font=font,
-            text_color=border_color
-            ).grid(row=1, column=0, columnspan=2, padx=5, pady=(0, 3), sticky="nw")
-
-        if int(mismatch.similarity) != 100:
-            self.w_frame = _DifferenceFrame(
-                self, 
-                mismatch=mismatch,
-                file_type="word",
-                on_press=self._button_cmd("w"),
-                corner_radius=2
-                )
-            match mismatch.mismatch_type:
-                case "description":
-                    self.e_frame = _DifferenceFrame(
-                        self, 
-                        mismatch=mismatch,
-                        file_type="excel",
-                        on_press=self._button_cmd("e"),
-                        corner_radius=2
-                        )
-                case "mapping":
-                    self.e_frame = _DifferenceFrame(
-                        self, 
-                        mismatch=mismatch,
-                        file_type="table",
-                        on_press=self._button_cmd("t"),
-                        corner_radius=2
-                        )  
-            self.skip_button = ctk.CTkButton(self, text="Skip", command=self._button_cmd("s"))
-
-            self.w_frame.grid(row=2, column=0, padx=5, pady=(5, 0), sticky="nsew")
-            self.e_frame.grid(row=2, column=1, padx=5, pady=(5, 0), sticky="nsew")
-            self.skip_button.grid(row=3, column=1, padx=5, pady=5, sticky="se")
+        self.header_label = ctk.CTkLabel(self, text="", font=font)
+        self.header_label.configure(justify="left")
+        self.header_label.grid(row=1, column=0, columnspan=2, padx=5, pady=(0, 3), sticky="nw")
+
+        self.w_frame = _DifferenceFrame(self, on_press=self._button_cmd("w"), corner_radius=2)
+        self.e_frame = _DifferenceFrame(self, on_press=self._button_cmd("e"), corner_radius=2)
+        self.skip_button = ctk.CTkButton(self, text="Skip", command=self._button_cmd("s"))
+        self.status_label = ctk.CTkLabel(self, text="", font=font)
+
+        # Runner-up matches, in case the best match is not the right one
+        self.candidates_label = ctk.CTkLabel(self, text="", text_color="gray", justify="left")
+
+        # Long headers and candidate lists wrap instead of being cut off
+        self.bind("<Configure>", self._on_resize, add="+")
+
+        self.w_frame.grid(row=2, column=0, padx=5, pady=(5, 0), sticky="nsew")
+        self.e_frame.grid(row=2, column=1, padx=5, pady=(5, 0), sticky="nsew")
+        self.candidates_label.grid(row=3, column=0, padx=5, pady=5, sticky="sw")
+
+    def _on_resize(self, event):
+        self.header_label.configure(wraplength=max(event.width - 20, 50))
+        self.candidates_label.configure(wraplength=max(event.width // 2 - 20, 50))
+
+    def set_mismatch(self, mismatch : Mismatch, choice : str | None = None):
+        """
+        Show `mismatch` in this row. `choice` is the choice made by the user, which can be 
+        waiting to be applied, e.g. until the mapping of the description is resolved.
+        """
+        self.mismatch = mismatch
+        self.shown = (id(mismatch), mismatch.decision, choice)
+
+        default_fg_color = get_color(self, "CTkFrame", "fg_color")
+        default_border_color = get_color(self, "CTkFrame", "border_color")
+        similarity_color = _get_similarity_color(mismatch.similarity / 100)
+        border_color = blend_colors(similarity_color, default_border_color, 0.4)
+        fg_color = blend_colors(border_color, default_fg_color, 0.2)
+        self.configure(border_color=border_color, fg_color=fg_color)
 
-    def get_choice(self):
-        """Block until a choice is made and return it."""
-        self.wait_variable(self.result_var)
-        return self.result_var.get()
+        match_text = "mismatch ❌" if int(mismatch.similarity) != 100 else "match ✅"
+        type_label, match_label = self.title_label.labels
+        type_label.configure(text=f"{mismatch.mismatch_type.upper()} ", text_color=border_color)
+        match_label.configure(text=match_text, text_color=border_color)
+        self.similarity_label.configure(text=f"{int(mismatch.similarity)}% match", text_color=border_color)
+        self.header_label.configure(text=f"in {mismatch.header}", text_color=border_color)
+
+        self.w_frame.set_mismatch(mismatch, "word")
+        match mismatch.mismatch_type:
+            case "description":
+                self.e_frame.set_mismatch(mismatch, "excel")
+                self.e_frame.button.configure(command=self._button_cmd("e"))
+            case "mapping":
+                self.e_frame.set_mismatch(mismatch, "table")
+                self.e_frame.button.configure(command=self._button_cmd("t"))
+
+        if len(mismatch.candidates) > 1:
+            others = ", ".join(f"{c} ({int(s)}%)" for c, s in mismatch.candidates[1:])
+            self.candidates_label.configure(text=f"Other close matches: {others}")
+        else:
+            self.candidates_label.configure(text="")
+
+        # Replace the buttons with the made choice once resolved
+        decided = mismatch.decision if mismatch.decision is not None else choice
+        button_state = "normal" if decided is None else "disabled"
+        self.w_frame.button.configure(state=button_state)
+        self.e_frame.button.configure(state=button_state)
+        if decided is None:
+            self.status_label.grid_forget()
+            self.skip_button.grid(row=3, column=1, padx=5, pady=5, sticky="se")
+        else:
+            status = _CHOICE_TEXT.get(decided, decided)
+            if mismatch.decision is None:
+                status += " (waiting for mapping)"
+            self.skip_button.grid_forget()
+            self.status_label.configure(text=status, text_color=border_color)
+            self.status_label.grid(row=3, column=1, padx=5, pady=5, sticky="se")
 
-    def resolve(self):
-        if self.on_resolve:
-            self.on_resolve(self)
-    
     def _button_cmd(self, res_str : str):
         def f():
-            self.result_var.set(res_str)
-            self.resolve()
+            if self.on_choice and self.mismatch is not None:
+                self.on_choice(self.mismatch, res_str)
         return f
-    
-class MismatchContainer(ctk.CTkScrollableFrame):
-    def __init__(self, master, **kwargs):
-        super().__init__(master, **kwargs)
-        self._last = None
-
-    def add_mismatch(self, mismatch : Mismatch, **kwargs):
-
-        def on_resolve(mismatch_item : _MismatchItem):
-            try:
-                mismatch_item.skip_button.grid_forget()
-                mismatch_item.w_frame.grid_forget()
-                mismatch_item.e_frame.grid_forget()
-            except:
-                pass
-            
-        mismatch_item = _MismatchItem(
-            self, 
-            mismatch,
-            on_resolve=on_resolve,
-            )
 
-        if self._last:
-            self._last.resolve()
-        self._last = mismatch_item
-        mismatch_item.pack(**kwargs)
+class MismatchListModel:
+    """
+    Mismatches shown by a `MismatchContainer`, in the order they were added, 
+    together with the choices made by the user.
+    """
+    def __init__(self):
+        self.mismatches : List[Mismatch] = []
+        self._choices : Dict[int, str] = {} # id(mismatch) -> choice
+
+    def __len__(self) -> int:
+        return len(self.mismatches)
+
+    def __getitem__(self, indx : int) -> Mismatch:
+        return self.mismatches[indx]
+
+    def append(self, mismatch : Mismatch) -> int:
+        self.mismatches.append(mismatch)
+        return len(self.mismatches) - 1
+
+    def clear(self):
+        self.mismatches.clear()
+        self._choices.clear()
+
+    def get_choice(self, mismatch : Mismatch) -> str | None:
+        return self._choices.get(id(mismatch))
+
+    def set_choice(self, mismatch : Mismatch, choice : str | None):
+        if choice is None:
+            self._choices.pop(id(mismatch), None)
+        else:
+            self._choices[id(mismatch)] = choice
+
+    def is_unresolved(self, indx : int) -> bool:
+        mismatch = self.mismatches[indx]
+        return mismatch.decision is None and id(mismatch) not in self._choices
+
+    def next_unresolved(self, start : int = -1) -> int | None:
+        """
+        Index of the first unresolved mismatch after `start`, wrapping around to the beginning.
+        """
+        n = len(self.mismatches)
+        for offset in range(1, n + 1):
+            indx = (start + offset) % n
+            if self.is_unresolved(indx):
+                return indx
+        return None
+
+class MismatchContainer(ctk.CTkFrame):
+    """
+    Scrollable list of mismatches. Only the rows in view exist as widgets, they are 
+    reused for other mismatches while scrolling, so the list stays fast with thousands of mismatches.
 
-        # Wait until Tkinter finishes rendering
-        self.after_idle(self._scroll_to_bottom)
+    ## Example
+
+    ```
+    container = MismatchContainer(master, on_choice=lambda m, choice: ...)
+    container.add_mismatch(mismatch)
+    container.jump_to_next_unresolved()
+    ```
+    """
+    # Rows have a fixed height, so the position of any row is known without rendering it. Texts 
+    # that do not fit scroll inside their row
+    ROW_HEIGHT = 300
+    ROW_PADDING = 5
+    SCROLL_STEP = 60  # Pixels scrolled per mouse wheel step
 
-    def _scroll_to_bottom(self):
-        self._parent_canvas.yview_moveto(1)
+    def __init__(self, master, on_choice : Callable[[Mismatch, str], None] | None = None, row_height : int = ROW_HEIGHT, **kwargs):
+        super().__init__(master, **kwargs)
+        self.model = MismatchListModel()
+        self.on_choice = on_choice
+        self.row_height = row_height
+
+        self._offset = 0    # Pixels scrolled from the top
+        self._current = -1  # Index of the last jumped to mismatch
+        self._rows : List[_MismatchItem] = []
+        self._render_pending = False
+
+        self._viewport = ctk.CTkFrame(self, fg_color="transparent")
+        self._scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self._scrollbar.pack(side="right", fill="y", padx=(0, 3), pady=3)
+        self._viewport.pack(side="left", fill="both", expand=True)
+
+        self._viewport.bind("<Configure>", lambda e: self._schedule_render())
+
+        # The mouse wheel is only bound while the pointer is over the list, bound on the tk
+        # frame itself since it also gets these events when the pointer is over a row
+        self._wheel_bindings : Dict[str, str] = {} # Sequence -> command id
+        tkinter.Frame.bind(self, "<Enter>", self._bind_mouse_wheel, add="+")
+        tkinter.Frame.bind(self, "<Leave>", self._unbind_mouse_wheel, add="+")
+
+    def add_mismatch(self, mismatch : Mismatch):
+        self.model.append(mismatch)
+        self._schedule_render()
+
+    def refresh(self):
+        """
+        Redraw the visible rows, e.g. after mismatches were resolved.
+        """
+        self._schedule_render()
+
+    def set_choice(self, mismatch : Mismatch, choice : str | None):
+        self.model.set_choice(mismatch, choice)
+        self._schedule_render()
+
+    def clear(self):
+        self.model.clear()
+        for row in self._rows:
+            row.shown = None # Ids of the old mismatches can be reused
+        self._offset = 0
+        self._current = -1
+        self._schedule_render()
+
+    def scroll_to(self, indx : int):
+        self._offset = indx * self.row_height
+        self._schedule_render()
+
+    def jump_to_next_unresolved(self) -> bool:
+        """
+        Scroll to the next mismatch without a choice. Returns False if all mismatches are resolved.
+        """
+        indx = self.model.next_unresolved(self._current)
+        if indx is None:
+            return False
+        self._current = indx
+        self.scroll_to(indx)
+        return True
+
+    def _on_choice(self, mismatch : Mismatch, choice : str):
+        self.model.set_choice(mismatch, choice)
+        if self.on_choice:
+            self.on_choice(mismatch, choice)
+        self._schedule_render()
+
+    def _schedule_render(self):
+        # Many changes, e.g. adding a batch of mismatches, are drawn in a single render
+        if not self._render_pending:
+            self._render_pending = True
+            self.after_idle(self._render)
+
+    def _render(self):
+        self._render_pending = False
+        view_height = max(self._viewport.winfo_height(), 1)
+        total_height = len(self.model) * self.row_height
+        self._offset = max(0, min(self._offset, total_height - view_height))
+
+        first = self._offset // self.row_height
+        y = -(self._offset % self.row_height)
+
+        # Only create as many rows as fit in the view
+        num_rows = min(view_height // self.row_height + 2, len(self.model) - first)
+        while len(self._rows) < num_rows:
+            self._rows.append(_MismatchItem(self._viewport, on_choice=self._on_choice))
+
+        for i, row in enumerate(self._rows):
+            indx = first + i
+            if i >= num_rows:
+                row.place_forget()
+                continue
+            mismatch = self.model[indx]
+            choice = self.model.get_choice(mismatch)
+            # Rows are only updated when they show something new, not on every scroll step
+            if row.shown != (id(mismatch), mismatch.decision, choice):
+                row.set_mismatch(mismatch, choice)
+            row.place(
+                x=self.ROW_PADDING, 
+                y=y + i * self.row_height + self.ROW_PADDING, 
+                relwidth=1,
+                width=-2 * self.ROW_PADDING, 
+                height=self.row_height - 2 * self.ROW_PADDING
+                )
 
-    def get_choice(self):
-        if self._last:
-            return self._last.get_choice()
-        return "s" # skip command
\ No newline at end of file
+        if total_height > view_height:
+            self._scrollbar.set(self._offset / total_height, (self._offset + view_height) / total_height)
+        else:
+            self._scrollbar.set(0, 1)
+
+    def _scroll_by(self, pixels : int):
+        self._offset += pixels
+        self._schedule_render()
+
+    def _on_scrollbar(self, *args):
+        # Same arguments as the command of a tkinter scrollbar
+        match args:
+            case ("moveto", fraction):
+                self._offset = int(float(fraction) * len(self.model) * self.row_height)
+                self._schedule_render()
+            case ("scroll", steps, "pages"):
+                self._scroll_by(int(steps) * self._viewport.winfo_height())
+            case ("scroll", steps, *_):
+                self._scroll_by(int(float(steps)) * self.SCROLL_STEP)
+
+    def _bind_mouse_wheel(self, event=None):
+        if self._wheel_bindings:
+            return
+        # <Button-4>/<Button-5> are the scroll up/down events on Linux
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self._wheel_bindings[sequence] = self.bind_all(sequence, self._on_mouse_wheel, add="+")
+
+    def _unbind_mouse_wheel(self, event=None):
+        # Also sent when the pointer moves from the list onto one of its rows
+        if event is not None:
+            x, y = self.winfo_pointerxy()
+            under_pointer = self.winfo_containing(x, y)
+            if under_pointer is not None and str(under_pointer).startswith(str(self)):
+                return
+        for sequence, funcid in self._wheel_bindings.items():
+            unbind_all_command(self, sequence, funcid)
+        self._wheel_bindings = {}
+
+    def destroy(self):
+        self._unbind_mouse_wheel()
+        super().destroy()
+
+    def _on_mouse_wheel(self, event):
+        if not str(event.widget).startswith(str(self._viewport)):
+            return
+        # Text boxes with more text than fits scroll themselves
+        if isinstance(event.widget, tkinter.Text) and event.widget.yview() != (0.0, 1.0):
+            return
+        if event.num == 4:
+            steps = -1
+        elif event.num == 5:
+            steps = 1
+        elif abs(event.delta) >= 120:
+            steps = -event.delta // 120 # Windows
+        else:
+            steps = -event.delta # macOS
+        self._scroll_by(steps * self.SCROLL_STEP)
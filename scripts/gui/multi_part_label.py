@@ -5,7 +5,18 @@ class MultiPartTextBox(ctk.CTkTextbox):
         super().__init__(master, wrap="word", **kwargs)
 
         # Make it behave like a label
-        self.configure(state="normal", fg_color="transparent", border_width=0)
+        self.configure(fg_color="transparent", border_width=0)
+        self.set_parts(parts)
+
+    def set_parts(self, parts):
+        """
+        Replace the text with new styled parts, used when the text box is reused.
+        """
+        self.configure(state="normal")
+        self.delete("1.0", "end")
+        for tag in self.tag_names():
+            if tag.startswith("part"):
+                self.tag_delete(tag)
 
         # Insert styled parts
         for i, part in enumerate(parts):
@@ -0,0 +1,35 @@
+"""
+Preview the table of a component without building a Word document. Run from the repository root:
+
+    python scripts/preview.py <workbook.xlsx> <component id> [-f html|csv|json] [-o output] [--dsl table.dsl] [--open]
+
+The table is written to stdout, or to `output` (the format is then taken from the extension
+unless `-f` is given). With `--open` an HTML preview is opened in the browser.
+"""
+import argparse
+import sys
+
+from table_generation.export import EXPORTERS, export_table
+from table_generation.preview import DSL_FILE_PATH, preview_component, open_html_preview
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Preview the table of a component as HTML, CSV or JSON.")
+    arg_parser.add_argument("xls_path", help="Excel workbook (.xlsx)")
+    arg_parser.add_argument("component_id", help="Component id, e.g. Ge01")
+    arg_parser.add_argument("-f", "--format", choices=list(EXPORTERS), default=None, help="Output format, html by default")
+    arg_parser.add_argument("-o", "--output", default=None, help="Output file, stdout if not given")
+    arg_parser.add_argument("--dsl", default=DSL_FILE_PATH, help="Table DSL file")
+    arg_parser.add_argument("--open", action="store_true", help="Open an HTML preview in the browser")
+    args = arg_parser.parse_args()
+
+    table_state = preview_component(args.xls_path, args.component_id, args.dsl)
+
+    if args.open:
+        print(f"Preview written to {open_html_preview(table_state, args.component_id)}")
+    elif args.output is not None:
+        export_table(table_state, args.output, args.format)
+    else:
+        sys.stdout.write(EXPORTERS[args.format or "html"](table_state))
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import queue
 
 import customtkinter as ctk
 from customtkinter import ThemeManager, BOTTOM, RIGHT
@@ -13,7 +14,9 @@ from gui import (
     PopUpWindow,
     ProgressBar
     )
-from word_sync import WordExcelSyncer
+from word_sync import WordExcelSyncer, SyncWorker, AutoResolver
+from word_sync import sync_worker
+from word_sync.sync_files import Mismatch
 from utils.gui_utils import (
     open_folder, 
     wrong_files_popup, 
@@ -24,6 +27,8 @@ from utils.gui_utils import (
 from utils.files import resource_path
 from utils.redirect_manager import redirect_stdout_to, StringRedirector
 
+SYNC_RULES_PATH = resource_path("config/sync_rules.json")
+
 class App(ctk.CTkFrame):
     ASPECT_RATIO = 9 / 16
     RES_X = 720
@@ -39,6 +44,8 @@ class App(ctk.CTkFrame):
         self._fg_color = "transparent"
 
         self.sync_done = False
+        self.sync_worker : SyncWorker | None = None
+        self.decisions_path : str | None = None
 
     def save_files(self):
         try:
@@ -69,44 +76,87 @@ class App(ctk.CTkFrame):
     def set_sync_done_false(self):
         self.sync_done = False
 
+        # Going back aborts the running sync, the worker closes the syncer once its thread exits
+        if self.sync_worker is not None:
+            self.sync_worker.stop()
+            self.sync_worker = None
+        else:
+            self.file_syncer.close()
+
     def sync(self):
-        assert isinstance(self.master, Tk)
-        original_protocol = self.master.protocol("WM_DELETE_WINDOW")
-
-        with redirect_stdout_to(self.error_log):
-            try:
-                doc_path = self.word_file_handler.first_path()
-                xls_paths = list(self.excel_file_handler.selected_file_paths)
-                self.frame_manager.go_to_frame(1)
-                self.frame_manager.frames[self.frame_manager.current_frame].update_idletasks()
-                gen = self.file_syncer.sync_files(doc_path, xls_paths, progress_var=self.progress_var) #type: ignore
-
-                # Set WM_DELETE_WINDOW protocol to break the while loop
-                def stop_loop():
-                    self.mismatch_container._last.result_var.set("EXIT") #type: ignore
-                self.master.protocol("WM_DELETE_WINDOW", stop_loop)
-
-                mismatch = next(gen)  # Start the generator
-                while True:
-                    self.mismatch_container.update_idletasks()
-                    self.mismatch_container.add_mismatch(mismatch, fill="both", expand=True, padx=5, pady=5)
-
-                    if int(mismatch.similarity) != 100:            
-                        decision =self. mismatch_container.get_choice()
-                    else:
-                        decision = "s"
-
-                    if decision == "EXIT":
-                        break
-                    mismatch = gen.send(decision)
-
-                # Only reached when WM_DELETE_WINODW is called
-                self.master.protocol("WM_DELETE_WINDOW", lambda: self.master.tk.call(original_protocol))
-                self.master.tk.call(original_protocol)
-            except StopIteration:
-                # restore WM_DELETE_WINDOW protocol
-                self.master.protocol("WM_DELETE_WINDOW", lambda: self.master.tk.call(original_protocol))
-                self.sync_done = True
+        doc_path = self.word_file_handler.first_path()
+        xls_paths = list(self.excel_file_handler.selected_file_paths)
+        self.frame_manager.go_to_frame(1)
+
+        self.progress_var.set(0.0)
+        self.mismatch_container.clear()
+
+        try:
+            resolver = AutoResolver.from_files(
+                SYNC_RULES_PATH if self.auto_resolve_var.get() else None, 
+                self.decisions_path
+                )
+        except (OSError, ValueError, KeyError) as e:
+            self.show_sync_fail(f"Could not load auto-resolve rules or decisions: {e}")
+            return
+
+        # Files are loaded and scanned on a worker thread, the UI polls for mismatches. 
+        # The previous syncer was closed when going back
+        self.file_syncer = WordExcelSyncer()
+        self.sync_worker = SyncWorker(self.file_syncer, stdout_redirect=self.error_log, resolver=resolver)
+        self.sync_worker.start(doc_path, xls_paths) #type: ignore
+        self._poll_sync_events(self.sync_worker)
+
+    def _poll_sync_events(self, worker : SyncWorker, poll_rate_ms=50):
+        # Stop polling if the sync was aborted or restarted
+        if worker is not self.sync_worker:
+            return
+
+        # Checked before draining, so events posted right before the thread exits are not missed
+        running = worker.is_running()
+        try:
+            while True:
+                event, value = worker.events.get_nowait()
+                match event:
+                    case sync_worker.PROGRESS:
+                        self.progress_var.set(value) #type: ignore
+                    case sync_worker.MISMATCH:
+                        self.mismatch_container.add_mismatch(value) #type: ignore
+                    case sync_worker.RESOLVED:
+                        self.mismatch_container.refresh()
+                    case sync_worker.INVALID:
+                        self.mismatch_container.set_choice(value, None) #type: ignore Ask again
+                    case sync_worker.DONE:
+                        self.sync_done = True
+                    case sync_worker.FAILED:
+                        with redirect_stdout_to(self.error_log):
+                            print(f"Sync failed: {value}")
+                        self.show_sync_fail(value)
+        except queue.Empty:
+            pass
+
+        if running:
+            self.after(poll_rate_ms, lambda: self._poll_sync_events(worker, poll_rate_ms))
+
+    def _on_choice(self, mismatch : Mismatch, choice : str):
+        if self.sync_worker is None:
+            return
+        self.sync_worker.decide(mismatch, choice)
+        self.mismatch_container.jump_to_next_unresolved()
+
+    def select_decisions_file(self):
+        file_path = ctk.filedialog.askopenfilename(
+            title="Select decisions file",
+            filetypes=[("Decisions", "*.csv *.json"), ("All files", "*.*")]
+            )
+        # Cancelling the dialog clears the decisions file
+        self.decisions_path = file_path or None
+        name = os.path.basename(file_path) if file_path else "None"
+        self.decisions_label.configure(text=f"Decisions: {name}")
+
+    def show_sync_fail(self, err):
+        fail_win = PopUpWindow(self, "Sync Failed", f"Could not sync files:\n{err}")
+        fail_win.set_right("Ok", fail_win.destroy)
 
     def _disable_sync_while(self) -> bool:
         # Keep sync button disabled while missing word or excel files
@@ -206,10 +256,34 @@ class App(ctk.CTkFrame):
             )
         disable_button_while(self.sync_button, self._disable_sync_while)
 
+        # Automatic resolution of trivial mismatches and previously recorded decisions
+        auto_resolve_frame = ctk.CTkFrame(selection_frame, fg_color="transparent")
+        self.auto_resolve_var = ctk.BooleanVar(value=False)
+        self.auto_resolve_checkbox = ctk.CTkCheckBox(
+            auto_resolve_frame,
+            text="Auto-resolve trivial differences",
+            variable=self.auto_resolve_var
+        )
+        _hover3 = OnHover(self.auto_resolve_checkbox, "Resolve whitespace, quote, case and trailing period differences using config/sync_rules.json")
+        self.decisions_button = ctk.CTkButton(
+            auto_resolve_frame,
+            text="Decisions file",
+            width=120,
+            command=self.select_decisions_file
+        )
+        self.decisions_label = ctk.CTkLabel(auto_resolve_frame, text="Decisions: None", text_color="gray")
+
         self.word_file_handler.add_ui(selection_frame)
         self.excel_file_handler.add_ui(selection_frame)
 
-        self.mismatch_container = MismatchContainer(syncing_frame)
+        self.mismatch_container = MismatchContainer(syncing_frame, on_choice=self._on_choice)
+
+        self.next_unresolved_button = ctk.CTkButton(
+            syncing_frame,
+            text="Next unresolved",
+            width=120,
+            command=self.mismatch_container.jump_to_next_unresolved
+        )
 
         self.progress_var = ctk.DoubleVar(value=0.0)
         self.progress_bar = ProgressBar(syncing_frame, self.progress_var, fg_color="transparent")
@@ -255,6 +329,10 @@ class App(ctk.CTkFrame):
         self.word_file_handler.ui.grid(row=1, column=0, sticky="nsew", padx=5, pady=5)
         self.excel_file_handler.ui.grid(row=1, column=1, sticky="nsew", padx=5, pady=5)
         self.sync_button.grid(row=2, column=1, sticky="nse", padx=5, pady=(5, 10))
+        auto_resolve_frame.grid(row=2, column=0, sticky="nsw", padx=5, pady=(5, 10))
+        self.auto_resolve_checkbox.grid(row=0, column=0, columnspan=2, sticky="w", pady=(0, 5))
+        self.decisions_button.grid(row=1, column=0, sticky="w")
+        self.decisions_label.grid(row=1, column=1, sticky="w", padx=5)
 
         syncing_frame.grid_columnconfigure(0, weight=1)
         syncing_frame.grid_columnconfigure(1, weight=0)
@@ -265,5 +343,6 @@ class App(ctk.CTkFrame):
 
         self.mismatch_container.grid(row=0, column=0, columnspan=2, sticky="nsew", padx=5, pady=5)
         self.show_log_button.grid(row=1, column=0, sticky="w", padx=5, pady=(5, 0))
+        self.next_unresolved_button.grid(row=1, column=0, sticky="e", padx=5, pady=(5, 0))
         self.progress_bar.grid(row=2, column=0, sticky="sew", padx=5, pady=5)
         self.save_button.grid(row=1, rowspan=2, column=1, sticky="nsew", padx=5, pady=5)
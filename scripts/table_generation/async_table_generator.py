@@ -1,3 +1,4 @@
+import os
 import queue
 import sys
 import threading
@@ -8,21 +9,35 @@ from docx import Document
 import docx.document
 from docx.text.paragraph import Paragraph
 
-from table_generation.table_generator import generate_table_in_document
+from table_generation.table_generator import generate_table_in_document, build_table_state
 from table_generation.table import TableCollection
 from table_generation.component import Component
+from table_generation.table_cache import table_cache
+from table_generation.dry_run import (
+    TableChange,
+    ADDED,
+    CHANGED,
+    UNCHANGED,
+    MISSING_MAPPING,
+    FAILED,
+    compare_table,
+    format_changes
+    )
 from word_sync.heading_tree import build_heading_tree
 from utils.redirect_manager import redirect_stdout_to
 from utils.formatting import copy_document_styles
-from utils.xml import remove_table_after_paragraph, parse_mappings
+from utils.xml import remove_table_after_paragraph, get_table_after_paragraph, parse_mappings
 from utils.xls_parsing import (
     parse_components, 
     parse_variables,
-    get_xls_from_component_id, 
     parse_excel_cached, 
     get_component_by_id
     )
-from utils.files import ExcelFileManager, resource_path
+from utils.workbook_registry import workbook_registry, component_prefix
+from utils.files import resource_path
+from utils.instrumentation import RunReport, record_run
+from utils.profiling import profile_run, profile_section
+from utils.tracing import span, flush_trace
 
 DSL_FILE_PATH = resource_path("config/table.dsl")
 
@@ -32,9 +47,10 @@ class _ComponentElement:
     Wrapper class to encapsulate a Component and the paragraph where this component should
     be placed in a word file.
     """
-    def __init__(self, component : Component, paragraph : Paragraph):
+    def __init__(self, component : Component, paragraph : Paragraph, heading : str = ""):
         self.component = component
         self.paragraph = paragraph
+        self.heading = heading # "<process type> - <component name>", used in messages
 
 class AsyncTableGenerator:
     """
@@ -60,26 +76,46 @@ class AsyncTableGenerator:
         self.stop_event = threading.Event()
         self._code = "" # Code file will be read at runtime
 
+        # Timings of the latest run, see `utils.instrumentation`
+        self.run_report : RunReport | None = None
+
+        # Tables that would be added or changed, set by a dry run of `generate_and_insert_tables`
+        self.changes : List[TableChange] = []
+
     def is_done(self) -> bool:
         is_running = self.thread is not None and self.thread.is_alive()
 
         # If the thread is running or was stopped return false
         return (not is_running) and (not self.stop_event.is_set())
 
-    def generate_and_insert_tables(self, xls_paths: Iterable[str], doc : docx.document.Document):
+    def generate_and_insert_tables(self, xls_paths: Iterable[str], doc : docx.document.Document, dry_run=False):
         """
         Start a thread for generating tables. 
+
+        ### Parameters
+        xls_paths : excel files with the components \n
+        doc : document to insert the tables into \n
+        dry_run : only compare the generated tables with the tables in `doc` and store the result
+        in `changes`, the document is not modified
         """
+        self.run_report = RunReport("dry_run" if dry_run else "insert")
+        self.changes = []
+
         def task():
             try:
                 with open(DSL_FILE_PATH, "r") as f:
                     self._code = f.read()
 
                 # Using context manager to redirect stdout
-                with redirect_stdout_to(self.stdout_redirect):
+                with redirect_stdout_to(self.stdout_redirect), record_run(self.run_report), profile_run("insert"), span("generate_and_insert_tables"):
                     print("Parsing word document...")
-                    component_elements, variable_descriptions = self._parse_document(doc, xls_paths)
+                    missing = []
+                    with profile_section("parse_document"), span("parse_document"):
+                        component_elements, variable_descriptions = self._parse_document(doc, xls_paths, missing=missing)
                     print("Done.")
+                    if dry_run:
+                        self._find_changes(component_elements, variable_descriptions, missing)
+                        return
                     print("Generating Word tables...")
                     for ce in component_elements:
                         if self.stop_event.is_set():
@@ -96,6 +132,8 @@ class AsyncTableGenerator:
             except Exception as e:
                 if self.on_fail:
                     self.on_fail(e)
+            finally:
+                flush_trace("insert")
 
         self.thread = threading.Thread(target=task)
         self.thread.start()
@@ -104,18 +142,23 @@ class AsyncTableGenerator:
         """
         Start a thread for generating tables. 
         """
+        self.run_report = RunReport("generate")
+
         def task():
             try:
                 with open(DSL_FILE_PATH, "r") as f:
                     self._code = f.read()
 
                 # Using context manager to redirect stdout
-                with redirect_stdout_to(self.stdout_redirect):
+                with redirect_stdout_to(self.stdout_redirect), record_run(self.run_report), profile_run("generate"), span("generate_tables"):
                     for xls_path in xls_paths:
-                        self._process_file(xls_path)
+                        with span("process_file", workbook=os.path.basename(xls_path)):
+                            self._process_file(xls_path)
             except Exception as e:
                 if self.on_fail:
                     self.on_fail(e)
+            finally:
+                flush_trace("generate")
 
         self.thread = threading.Thread(target=task)
         self.thread.start()
@@ -123,10 +166,11 @@ class AsyncTableGenerator:
     def _process_file(self, xls_path: str):
         print(f"Parsing {xls_path}...")
 
-        file_manager = ExcelFileManager(xls_path)
+        with profile_section(f"{os.path.basename(xls_path)}_parse"):
+            file_manager = parse_excel_cached(xls_path)
 
-        components = parse_components(file_manager)
-        variable_names = parse_variables(file_manager)
+            components = parse_components(file_manager)
+            variable_names = parse_variables(file_manager)
 
         print("Done.")
         print("Generating Word tables...")
@@ -159,7 +203,9 @@ class AsyncTableGenerator:
         # Try generating table in the document
         try:
             start = time.time()
-            generate_table_in_document(doc, component, variable_names, self._code, insert_after=insert_after, generate_heading=generate_heading)
+            workbook = os.path.basename(component.file_manager.file_path)
+            with profile_section(f"{workbook}_{component.id}"), span("generate_table", workbook=workbook, component=component.id):
+                generate_table_in_document(doc, component, variable_names, self._code, insert_after=insert_after, generate_heading=generate_heading, table_cache=table_cache)
             end = time.time()
             print(f"    Generated table for {component.id} : Success | {end - start:.2f}s")
             return True
@@ -167,10 +213,42 @@ class AsyncTableGenerator:
             print(f"    Failed to generate table for {component.id} : {e}")
             return False
         
-    def _parse_document(self, doc : docx.document.Document,  xls_paths: Iterable[str]) -> Tuple[List[_ComponentElement], Dict[str, str]]:
+    def _find_changes(self, component_elements : List[_ComponentElement], variable_names : Dict[str, str], missing : List[TableChange]):
+        """
+        Compare the table of each component with the table after its paragraph, without modifying the document.
+        """
+        print("Comparing tables...")
+        changes = []
+        for ce in component_elements:
+            if self.stop_event.is_set():
+                print("Operation terminated.")
+                return
+
+            component = ce.component
+            try:
+                with span("dry_run_table", component=component.id):
+                    table_state = build_table_state(component, variable_names, self._code, table_cache=table_cache)
+                    tbl = get_table_after_paragraph(ce.paragraph)
+                    if tbl is None:
+                        change = TableChange(ADDED, ce.heading, component.id)
+                    else:
+                        detail = compare_table(table_state, tbl)
+                        change = TableChange(CHANGED if detail else UNCHANGED, ce.heading, component.id, detail)
+            except Exception as e:
+                change = TableChange(FAILED, ce.heading, component.id, str(e))
+            changes.append(change)
+
+        self.changes = changes + missing
+        print(format_changes(self.changes))
+
+    def _parse_document(self, doc : docx.document.Document,  xls_paths: Iterable[str], missing : List[TableChange] | None = None) -> Tuple[List[_ComponentElement], Dict[str, str]]:
         """
-        Parse a word document for table insertion.
+        Parse a word document for table insertion. Headings that cannot be mapped to a component
+        are added to `missing` if given.
         """
+        if missing is None:
+            missing = []
+
         root = build_heading_tree(doc)
         mappings = parse_mappings(doc)
         # Headings under which the tables should be generated
@@ -178,6 +256,7 @@ class AsyncTableGenerator:
         
         parsed_paths = {} # Cache parsed xls files
         variables = {}    # Variable names
+        xls_index = workbook_registry.index(xls_paths) # Component id prefix -> xls path
 
         filtered_components = []
         for heading in headings:
@@ -190,17 +269,20 @@ class AsyncTableGenerator:
                 components =  mappings[process_type]
             except KeyError:
                 print(f"WARNING: Missing mapping for '{process_type}', malformed mapping table?")
+                missing.append(TableChange(MISSING_MAPPING, f"{process_type} - {component_name}", detail="no mapping table for the process type"))
                 continue # Trying to find a component id for non-process-type, skip iteration
 
             try:
                 component_id = components[component_name]
             except KeyError:
                 print(f"WARNING: Missing mapping for '{process_type}' - '{component_name}'.")
+                missing.append(TableChange(MISSING_MAPPING, f"{process_type} - {component_name}", detail="not in the mapping table"))
                 continue # Trying to find a component id for non-process-type, skip iteration
 
             # Ignore component if it is not defined in the excel files
-            if (xls_path := get_xls_from_component_id(component_id, xls_paths)) is None:
+            if (xls_path := xls_index.get(component_prefix(component_id))) is None:
                 print(f"    Could not find {component_id} in the proved excel files, skipping")
+                missing.append(TableChange(MISSING_MAPPING, f"{process_type} - {component_name}", component_id, "not in the excel files"))
                 continue
             
             # Parse variable descriptions for new xls paths
@@ -216,6 +298,6 @@ class AsyncTableGenerator:
             para = heading.get_last_nonempty_paragraph()
             if para is None:
                 para = heading.heading # No paragraphs under heading, insert tables directly after heading
-            component_element = _ComponentElement(component, para) #type: ignore
+            component_element = _ComponentElement(component, para, f"{process_type} - {component_name}") #type: ignore
             filtered_components.append(component_element)
         return filtered_components, variables
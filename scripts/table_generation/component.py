@@ -1,12 +1,15 @@
+from collections import Counter
 from dataclasses import dataclass
-from functools import cache
-from typing import List
+from typing import Dict, List, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 
 from utils.formatting import format_raw_value
 from utils.dataframes import get_non_null_values_from_row, excel_to_indx, make_first_row_headers
 from utils.files import ExcelFileManager
+from utils.instrumentation import stage
+from utils.caching import per_object_cache
 
 VAR_COL = "C" # Column where variables are e.g. VarGe01
 DESC_ROW = 18 # Row of Yes/No, Description, How, Rationale
@@ -17,6 +20,9 @@ VIP_ROW = 17  # Row of conditional domains for "Variable influence on process"
 VAR_INF_COL = "F"
 VAR_INF_ROW = VAR_ROW
 
+# Applies `format_raw_value` to every element of an array
+_format_array = np.frompyfunc(format_raw_value, 1, 1)
+
 def var_to_offset(var : str) -> int:
     number = int(var[-2:])
     return number - 1
@@ -34,7 +40,8 @@ class Component:
 class ComponentInfo:
     def __init__(self, id : str, file_manager : ExcelFileManager):
         from utils.xls_parsing import get_filtered_by_id
-        self.df = file_manager.xls.parse(f"{id}_INF", header=None) # Drop headers since excel file is not structured like a dataframe
+        with stage("inf_parse", component=id):
+            self.df = file_manager.xls.parse(f"{id}_INF", header=None) # Drop headers since excel file is not structured like a dataframe
         self.variables = get_filtered_by_id(file_manager, "Var").iloc[:, 0].values.tolist()
     
     @property
@@ -69,7 +76,7 @@ class ComponentInfo:
             case _:
                 raise ValueError(f"Level {level} is not a valid index.")
     
-    @cache
+    @per_object_cache()
     def _get_l0_df(self, l0) -> pd.DataFrame:
         n = var_to_offset(l0)
         # i, j is the index of the "top-left" item for the given variable
@@ -88,7 +95,7 @@ class ComponentInfo:
         df = self.df.iloc[row_indices, list(col_range - col_exclude)]
         return df
     
-    @cache
+    @per_object_cache()
     def _get_l1_df(self, l0, l1) -> pd.DataFrame:
         l0_df = self._get_l0_df(l0)
         match l1:
@@ -99,7 +106,7 @@ class ComponentInfo:
             case _:
                 raise ValueError(f"Invalid level 1 index {l1}, valid values are {self.indicies(1)}")
 
-    @cache
+    @per_object_cache()
     def _get_l2_df(self, l0, l1, l2) -> pd.DataFrame:
         l1_df = self._get_l1_df(l0, l1)
         try:
@@ -121,7 +128,7 @@ class ComponentInfo:
         except IndexError:
             raise ValueError(f"\nInvalid level 2 index {l2}, valid values are {self.indicies(2)}")
 
-    @cache
+    @per_object_cache()
     def _get_l3_df(self, l0, l1, l2, l3) -> pd.DataFrame:
         l2_df = self._get_l2_df(l0, l1, l2)
         if l3 not in self.indicies(3):
@@ -141,3 +148,98 @@ class ComponentInfo:
         """
         df = self._get_l3_df(l0, l1, l2, l3)
         return format_raw_value(df.iat[0])
+
+    def get_values(self, keys : Sequence[Tuple]) -> List[str | None]:
+        """
+        Same as `get_value` for many 4-component indices at once. The cells are gathered from the
+        sheet with a single indexing operation. Indices that cannot be resolved this way give None,
+        use `get_value` for those to get the value or the error.
+
+        ## Examples
+        ```
+        get_values([
+            ("VarGe01", "Variable influence on process", "Influence present?", "Yes/No"),
+            ("VarGe01", "Variable influence on process", "Temperate", "Rationale"),
+        ])
+        ```
+        """
+        rows = self._row_index()
+        columns = self._column_index()
+        num_rows = self.df.shape[0]
+
+        positions = [] # Position in `keys` of each gathered cell
+        cell_rows = []
+        cell_cols = []
+        for n, key in enumerate(keys):
+            if len(key) != 4:
+                continue
+            l0, l1, l2, l3 = key
+            try:
+                row = rows.get((l0, l1))
+                col = columns.get((l2, l3))
+            except TypeError:
+                continue # Unhashable index
+            if row is None or col is None or not 0 <= row < num_rows:
+                continue
+            positions.append(n)
+            cell_rows.append(row)
+            cell_cols.append(col)
+
+        values : List[str | None] = [None] * len(keys)
+        if positions:
+            cells = self.df.to_numpy(dtype=object)[cell_rows, cell_cols]
+            for n, value in zip(positions, _format_array(cells)):
+                values[n] = value
+        return values
+
+    @per_object_cache()
+    def _row_index(self) -> Dict[Tuple[str, str], int]:
+        """
+        Row of each (level 0, level 1) index pair, see `_get_l0_df`.
+        """
+        _, i = excel_to_indx(VAR_INF_COL, VAR_INF_ROW)
+        piv_offset = self.num_variables() + 4
+        rows = {}
+        for var in self.variables:
+            try:
+                n = var_to_offset(var)
+            except ValueError:
+                continue
+            rows[(var, "Variable influence on process")] = i + n
+            rows[(var, "Process influence on variable")] = i + n + piv_offset
+        return rows
+
+    @per_object_cache()
+    def _column_index(self) -> Dict[Tuple, int]:
+        """
+        Column of each (level 2, level 3) index pair, the same for all variables. Mirrors the
+        column selection of `_get_l0_df`, `_get_l2_df` and `_get_l3_df`. Pairs found in more than one
+        of the selected columns are left out, `get_value` fails for those.
+        """
+        j, i = excel_to_indx(VAR_INF_COL, VAR_INF_ROW)
+        num_domains = self.num_domains()
+        col_range = set(range(j, j + 3 * num_domains + 2))
+        col_exclude = set([j + 2 + 3*k for k in range(num_domains)])
+        cols = [c for c in list(col_range - col_exclude) if c < self.df.shape[1]]
+        if i - 2 < 0 or i - 1 >= self.df.shape[0] or len(cols) != len(col_range - col_exclude):
+            return {} # Sheet too small, every lookup goes through `get_value`
+
+        l2_headers = self.df.iloc[i - 2, cols].tolist()
+        l3_headers = self.df.iloc[i - 1, cols].tolist()
+        valid_l3 = set(self.indicies(3))
+
+        columns = {}
+        for l2 in dict.fromkeys(h for h in l2_headers if not pd.isna(h)):
+            kept = []
+            for p, header in enumerate(l2_headers):
+                if header == l2:
+                    kept.extend([p, p + 1])
+            if kept[-1] >= len(cols):
+                continue # `_get_l2_df` fails for headers in the last column
+            # `_get_l3_df` gives a DataFrame instead of a column for a level 3 header selected twice
+            l3_counts = Counter(l3_headers[p] for p in kept)
+            for p in kept:
+                l3 = l3_headers[p]
+                if l3 in valid_l3 and l3_counts[l3] == 1:
+                    columns[(l2, l3)] = cols[p]
+        return columns
@@ -0,0 +1,64 @@
+from dataclasses import dataclass
+from typing import List
+
+from table_generation.export import word_layout
+from table_generation.parser import TableState
+from utils.xml import read_table_layout
+
+# Change types
+ADDED = "added"                     # No table after the paragraph yet, a new one would be inserted
+CHANGED = "changed"                 # The existing table would be replaced by a different one
+UNCHANGED = "unchanged"             # The existing table has the same text and merges
+MISSING_MAPPING = "missing mapping" # The heading could not be mapped to a component
+FAILED = "failed"                   # The table could not be generated
+
+@dataclass
+class TableChange:
+    status : str
+    heading : str           # "<process type> - <component name>"
+    component_id : str = ""
+    detail : str = ""
+
+def compare_table(table_state : TableState, tbl) -> str:
+    """
+    Compare a generated table with an existing `w:tbl` element on the normalized cell text and
+    merge structure, styles are not compared.
+
+    ### Returns
+    Description of the first difference, or an empty string if the tables are the same.
+    """
+    expected = word_layout(table_state)
+    existing = read_table_layout(tbl)
+
+    if len(expected) != len(existing):
+        return f"{len(existing)} -> {len(expected)} rows"
+
+    for i, (expected_row, existing_row) in enumerate(zip(expected, existing)):
+        if expected_row == existing_row:
+            continue
+        if [cell[:3] for cell in expected_row] != [cell[:3] for cell in existing_row]:
+            return f"merged cells differ in row {i + 1}"
+        for (col, _, _, expected_text), (_, _, _, existing_text) in zip(expected_row, existing_row):
+            if expected_text != existing_text:
+                return f"text differs in row {i + 1}, column {col + 1}: '{_shorten(existing_text)}' -> '{_shorten(expected_text)}'"
+    return ""
+
+def _shorten(text : str, length=40) -> str:
+    return text if len(text) <= length else text[:length - 3] + "..."
+
+def format_changes(changes : List[TableChange]) -> str:
+    """
+    One line per table, followed by the number of tables per change type.
+    """
+    lines = []
+    for change in changes:
+        line = f"    {change.status:<16}{change.component_id:<10}{change.heading}"
+        if change.detail:
+            line += f" ({change.detail})"
+        lines.append(line)
+
+    totals = {}
+    for change in changes:
+        totals[change.status] = totals.get(change.status, 0) + 1
+    lines.append(" | ".join(f"{status.capitalize()} {n}" for status, n in totals.items()) or "No tables found")
+    return "\n".join(lines)
@@ -0,0 +1,256 @@
+"""
+Export of tables built by the table DSL to HTML, CSV and JSON, without building a Word document.
+
+The cells are shown as in the generated Word table: values are formatted with `format_raw_value`,
+cells covered by a `!span` are empty and cells with identical text in consecutive rows are merged,
+see `compute_vertical_merges`.
+
+## Example
+
+```
+table_state = build_table_state(component, variable_names, code)
+export_table(table_state, "Ge01.html")
+```
+"""
+import csv
+from dataclasses import dataclass
+import html
+import io
+import json
+import os
+import re
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+from table_generation.parser.table_state import TableState
+from utils.formatting import format_raw_value
+from utils.xml import TableLayout, normalize_cell_text
+
+@dataclass(slots=True)
+class VerticalMerge:
+    col : int
+    start_row : int
+    end_row : int # Inclusive
+
+def merge_runs(texts : Sequence[str], force_cutoffs : Iterable[int] = ()) -> List[Tuple[int, int]]:
+    """
+    First and last index of each run of more than one identical text. A run is also ended
+    at the rows in `force_cutoffs`.
+    """
+    cutoffs = set(force_cutoffs)
+    runs = []
+    start = 0
+    for cur in range(1, len(texts)):
+        # Found a row with different text, or a forced cutoff
+        if texts[cur] != texts[start] or cur in cutoffs:
+            if cur - start > 1:
+                runs.append((start, cur - 1))
+            start = cur # Next sequence starts at cur
+
+    # Include the last sequence
+    if len(texts) - start > 1:
+        runs.append((start, len(texts) - 1))
+    return runs
+
+def cell_texts(table_state : TableState) -> List[List[str]]:
+    """
+    Text of each cell as shown in the Word table, before vertical merges.
+    """
+    texts = [[""] * table_state.cols for _ in range(table_state.rows)]
+    for i, j, text, _ in table_state.iter_cells():
+        texts[i][j] = format_raw_value(text)
+
+    for cell_span in table_state.spans:
+        i, j = cell_span.pos1
+        texts[i][j] = str(cell_span.text)
+        for col in range(j + 1, cell_span.pos2[1] + 1):
+            texts[i][col] = "" # Merged into the first cell of the span
+    return texts
+
+def compute_vertical_merges(table_state : TableState, texts : List[List[str]] | None = None) -> List[VerticalMerge]:
+    """
+    Cells that are merged with the cells below them, same as `merge_table_rows` does for the Word table.
+    """
+    if texts is None:
+        texts = cell_texts(table_state)
+
+    merges = []
+    for col in range(table_state.cols):
+        column = [row[col] for row in texts]
+        for start, end in merge_runs(column, table_state.force_cutoffs):
+            merges.append(VerticalMerge(col, start, end))
+    return merges
+
+def _layout(table_state : TableState, merges : List[VerticalMerge]) -> Tuple[Dict[Tuple[int, int], List[int]], set]:
+    # Cell -> [rowspan, colspan] for cells that are not covered by another cell
+    extents = {}
+    covered = set()
+    for cell_span in table_state.spans:
+        i, j = cell_span.pos1
+        extents[(i, j)] = [1, cell_span.pos2[1] - j + 1]
+        covered.update((i, col) for col in range(j + 1, cell_span.pos2[1] + 1))
+
+    for merge in merges:
+        rowspan, colspan = extents.get((merge.start_row, merge.col), (1, 1))
+        cells = [
+            (row, col)
+            for row in range(merge.start_row, merge.end_row + 1)
+            for col in range(merge.col, merge.col + colspan)
+            if (row, col) != (merge.start_row, merge.col)
+            ]
+        # Merges overlapping a span or another merge are left out, they have no single rectangle
+        if (merge.start_row, merge.col) in covered or any(cell in covered or cell in extents for cell in cells):
+            continue
+        extents[(merge.start_row, merge.col)] = [merge.end_row - merge.start_row + 1, colspan]
+        covered.update(cells)
+    return extents, covered
+
+def word_layout(table_state : TableState) -> TableLayout:
+    """
+    Cells of the Word table built from `table_state`, in the form of `utils.xml.read_table_layout`,
+    so a generated table can be compared with a table in a document without building it.
+    """
+    texts = cell_texts(table_state)
+    extents, _ = _layout(table_state, compute_vertical_merges(table_state, texts))
+    continued = {} # Cells continuing a vertical merge -> column span
+    for (i, j), (rowspan, colspan) in extents.items():
+        for row in range(i + 1, i + rowspan):
+            continued[(row, j)] = colspan
+
+    rows = []
+    for i in range(table_state.rows):
+        row = []
+        j = 0
+        while j < table_state.cols:
+            if (i, j) in continued:
+                colspan = continued[(i, j)]
+                row.append((j, colspan, "continue", ""))
+            else:
+                rowspan, colspan = extents.get((i, j), (1, 1))
+                row.append((j, colspan, "restart" if rowspan > 1 else "", normalize_cell_text(texts[i][j])))
+            j += colspan
+        rows.append(row)
+    return rows
+
+_CSS_PROPERTIES = {
+    "bold": lambda v: "font-weight:bold" if v == "True" else "",
+    "italic": lambda v: "font-style:italic" if v == "True" else "",
+    "underline": lambda v: "text-decoration:underline" if v == "True" else "",
+    "name": lambda v: "font-family:" + v.strip("'\""),
+    "size": lambda v: f"font-size:{m.group(1)}pt" if (m := re.fullmatch(r"Pt\(([\d.]+)\)", v)) else "",
+}
+
+def _css(cell_style : Any) -> str:
+    # Only the common font attributes are shown, the style string is not evaluated
+    if not isinstance(cell_style, str):
+        return ""
+    declarations = []
+    for pair in cell_style.split(","):
+        key, _, value = pair.partition("=")
+        if (to_css := _CSS_PROPERTIES.get(key.strip())) is not None and (declaration := to_css(value.strip())):
+            declarations.append(declaration)
+    return ";".join(declarations)
+
+def to_html(table_state : TableState, title : str = "") -> str:
+    """
+    Standalone HTML page with the table, styles are shown as far as they map to CSS.
+    """
+    texts = cell_texts(table_state)
+    extents, covered = _layout(table_state, compute_vertical_merges(table_state, texts))
+    cutoffs = set(table_state.force_cutoffs)
+
+    lines = [
+        "<!DOCTYPE html>",
+        "<html>",
+        "<head>",
+        '<meta charset="utf-8">',
+        f"<title>{html.escape(title)}</title>",
+        "<style>",
+        "table { border-collapse: collapse; }",
+        "td { border: 1px solid #444; padding: 2px 6px; vertical-align: top; }",
+        "tr.cutoff td { border-top: 2px solid #000; }",
+        "</style>",
+        "</head>",
+        "<body>",
+        f'<table data-format="{html.escape(str(table_state.format))}">',
+        ]
+    for i in range(table_state.rows):
+        lines.append('<tr class="cutoff">' if i in cutoffs else "<tr>")
+        for j in range(table_state.cols):
+            if (i, j) in covered:
+                continue
+            attributes = ""
+            rowspan, colspan = extents.get((i, j), (1, 1))
+            if rowspan > 1:
+                attributes += f' rowspan="{rowspan}"'
+            if colspan > 1:
+                attributes += f' colspan="{colspan}"'
+            if css := _css(table_state.style(i, j)):
+                attributes += f' style="{html.escape(css)}"'
+            text = html.escape(texts[i][j]).replace("\n", "<br>")
+            lines.append(f"<td{attributes}>{text}</td>")
+        lines.append("</tr>")
+    lines += ["</table>", "</body>", "</html>", ""]
+    return "\n".join(lines)
+
+def to_csv(table_state : TableState) -> str:
+    """
+    One line per row, cells covered by a span or a vertical merge are empty.
+    """
+    texts = cell_texts(table_state)
+    for merge in compute_vertical_merges(table_state, texts):
+        for row in range(merge.start_row + 1, merge.end_row + 1):
+            texts[row][merge.col] = ""
+
+    out = io.StringIO()
+    csv.writer(out, lineterminator="\n").writerows(texts)
+    return out.getvalue()
+
+def to_dict(table_state : TableState) -> Dict[str, Any]:
+    """
+    Cells, spans, forced cutoffs and vertical merges of a table as plain values.
+    """
+    texts = cell_texts(table_state)
+    return {
+        "rows": table_state.rows,
+        "cols": table_state.cols,
+        "format": str(table_state.format),
+        "cells": [
+            [{"text": texts[i][j], "style": str(table_state.style(i, j))} for j in range(table_state.cols)]
+            for i in range(table_state.rows)
+            ],
+        "spans": [
+            {"row": s.pos1[0], "col": s.pos1[1], "length": s.pos2[1] - s.pos1[1] + 1, "text": str(s.text)}
+            for s in table_state.spans
+            ],
+        "force_cutoffs": list(table_state.force_cutoffs),
+        "vertical_merges": [
+            {"col": m.col, "start_row": m.start_row, "end_row": m.end_row}
+            for m in compute_vertical_merges(table_state, texts)
+            ],
+        }
+
+def to_json(table_state : TableState) -> str:
+    return json.dumps(to_dict(table_state), indent=2, ensure_ascii=False)
+
+EXPORTERS : Dict[str, Callable[[TableState], str]] = {
+    "html": to_html,
+    "csv": to_csv,
+    "json": to_json,
+}
+
+def export_table(table_state : TableState, path : str, fmt : str | None = None) -> str:
+    """
+    Write a table to `path`, in the format given by `fmt` or by the file extension.
+
+    ### Returns
+    The written text.
+    """
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in EXPORTERS:
+        raise ValueError(f"Unknown export format '{fmt}', expected one of {', '.join(EXPORTERS)}")
+
+    text = EXPORTERS[fmt](table_state)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+    return text
@@ -1,4 +1,4 @@
-from .parser import Parser
+from .parser import Parser, get_default_parser
 from .table_state import TableState
 
-__all__ = ["Parser", "TableState"]
\ No newline at end of file
+__all__ = ["Parser", "TableState", "get_default_parser"]
\ No newline at end of file
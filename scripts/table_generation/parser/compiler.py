@@ -0,0 +1,414 @@
+"""
+Compiles the table DSL to a flat list of operations for a single component.
+
+The parse tree is first lowered to a small AST (`compile_tree`), once per DSL file. For each
+component the AST is then partially evaluated (`specialize`): `!influence`, `!domain` and
+`!variables` are constant for a component, so loops over them are unrolled, loop variables are
+replaced by their values and concatenations of constants are folded. What is left is a flat
+sequence of cell writes where only the values read from the workbook are computed at runtime.
+Identical lookups, e.g. the same value used in a condition and in the cell below it, are only
+read once.
+"""
+import ast
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from lark import Tree, Token
+
+from table_generation.component import ComponentInfo
+from .table_state import TableState
+
+# -------------------
+# AST
+# -------------------
+
+@dataclass(frozen=True)
+class Const:
+    value : Any
+
+@dataclass(frozen=True)
+class Var:
+    name : str
+
+@dataclass(frozen=True)
+class Builtin:
+    name : str # "!domain", "!influence" or "!variables"
+
+@dataclass(frozen=True)
+class Index:
+    keys : Tuple
+
+@dataclass(frozen=True)
+class Lookup:
+    slot : int # Index of the value in `SpecializedTable`, shared by all identical lookups
+    keys : Tuple # Values of the keys
+
+@dataclass(frozen=True)
+class Concat:
+    parts : Tuple
+
+@dataclass(frozen=True)
+class Description:
+    arg : Any
+
+@dataclass(frozen=True)
+class Equals:
+    a : Any
+    b : Any
+
+@dataclass(frozen=True)
+class Style:
+    arg : Any
+
+@dataclass(frozen=True)
+class NewLine:
+    pass
+
+@dataclass(frozen=True)
+class ForceCutoff:
+    pass
+
+@dataclass(frozen=True)
+class Span:
+    text : Any
+    length : int
+
+@dataclass(frozen=True)
+class Output:
+    items : Tuple
+
+@dataclass(frozen=True)
+class ForEach:
+    iterable : Any
+    var : str
+    body : Tuple
+
+@dataclass(frozen=True)
+class If:
+    cond : Any
+    then : Any
+    otherwise : Any | None
+
+# Builtins writing to the table instead of producing a value
+EFFECTS = (Style, NewLine, ForceCutoff, Span)
+
+@dataclass
+class Program:
+    statements : Tuple
+    format : Any | None = None # Argument of the last !format, applied before the table is built
+
+# -------------------
+# Lowering
+# -------------------
+
+def compile_tree(tree : Tree) -> Program:
+    """
+    Lower a parse tree of the table DSL to a `Program`.
+    """
+    formats = []
+    statements = tuple(_lower(stmt, formats) for stmt in tree.children)
+    return Program(statements, formats[-1] if formats else None)
+
+def _lower(node, formats : List):
+    if isinstance(node, Token):
+        if node.type == "INT":
+            return Const(int(node.value))
+        return Const(node.value)
+
+    children = node.children
+    match node.data:
+        case "statement" | "term":
+            return _lower(children[0], formats)
+        case "output_stmt":
+            return Output(tuple(_lower(c, formats) for c in children))
+        case "foreach_stmt":
+            iterable, var_token, *body = children
+            return ForEach(_lower(iterable, formats), var_token.value, tuple(_lower(s, formats) for s in body))
+        case "if_stmt":
+            if len(children) not in (2, 3):
+                raise ValueError("Unexpected structure for if_stmt")
+            otherwise = _lower(children[2], formats) if len(children) == 3 else None
+            return If(_lower(children[0], formats), _lower(children[1], formats), otherwise)
+        case "expression":
+            if len(children) == 1:
+                return _lower(children[0], formats)
+            return Concat(tuple(_lower(c, formats) for c in children))
+        case "index_access":
+            return Index(tuple(_lower(c, formats) for c in children))
+        case "var":
+            return Var(children[0].value)
+        case "quoted_string":
+            # use literal eval to evaluate escape sequences
+            return Const(ast.literal_eval(children[0].value))
+        case "builtin_function":
+            return _lower_builtin(children[0].value, [_lower(c, formats) for c in children[1:]], formats)
+        case _:
+            raise ValueError(f"Unexpected node '{node.data}' in table DSL")
+
+def _lower_builtin(name : str, args : List, formats : List):
+    match name:
+        case "!domain" | "!influence" | "!variables":
+            return Builtin(name)
+        case "!newline":
+            return NewLine()
+        case "!force_cutoff":
+            return ForceCutoff()
+        case "!description":
+            return Description(args[0])
+        case "!style":
+            return Style(args[0])
+        case "!span":
+            return Span(args[0], args[1].value)
+        case "!equals":
+            return Equals(args[0], args[1])
+        case "!format":
+            formats.append(args[0])
+            return Const(None) # Not written to the table
+        case _:
+            raise ValueError(f"Unknown builtin '{name}'")
+
+# -------------------
+# Specialization
+# -------------------
+
+# Operations of a specialized table, tuples of (opcode, *operands)
+TEXT = "text"           # (TEXT, value) write a constant to the current cell and move to the next column
+TEXT_EVAL = "text_eval" # (TEXT_EVAL, node) same as TEXT, but the value is computed at runtime
+STYLE = "style"         # (STYLE, node) style of the following cells
+NEWLINE = "newline"     # (NEWLINE,)
+SPAN = "span"           # (SPAN, node, length)
+CUTOFF = "cutoff"       # (CUTOFF,)
+BRANCH = "branch"       # (BRANCH, cond, then_ops, else_ops) for conditions depending on workbook values
+LOOP = "loop"           # (LOOP, iterable, var, body_ops) for loops over workbook values
+SET_VAR = "set_var"     # (SET_VAR, var, node) keeps a variable bound inside a branch or loop usable after it
+
+_UNBOUND = object()
+
+class _Specializer:
+    def __init__(self, info : ComponentInfo, variable_names : Dict[str, str]):
+        self.info = info
+        self.variable_names = variable_names
+        self.constants : Dict[str, Const] = {} # Builtins are read once per component
+        self.lookups : Dict[Tuple, Lookup] = {} # Constant lookup keys -> lookup, see `Lookup`
+
+    def statements(self, statements, env : Dict[str, Any], ops : List):
+        for stmt in statements:
+            self.statement(stmt, env, ops)
+
+    def statement(self, stmt, env : Dict[str, Any], ops : List):
+        kind = type(stmt)
+        if kind is Output:
+            for item in stmt.items:
+                self.item(item, env, ops)
+
+        elif kind is ForEach:
+            iterable = self.fold(stmt.iterable, env)
+            var, body = stmt.var, stmt.body
+            if type(iterable) is Const:
+                # Unroll, the loop variable is a constant in each copy of the body
+                for value in iterable.value:
+                    env[var] = Const(value)
+                    for s in body:
+                        self.statement(s, env, ops)
+            else:
+                before = dict(env)
+                env[var] = Var(var)
+                body_ops = []
+                self.statements(body, env, body_ops)
+                self._sync_vars([(env, body_ops)], before, env)
+                ops.append((LOOP, iterable, var, body_ops))
+
+        elif kind is If:
+            cond = self.fold(stmt.cond, env)
+            if type(cond) is Const:
+                if cond.value:
+                    self.statement(stmt.then, env, ops)
+                elif stmt.otherwise is not None:
+                    self.statement(stmt.otherwise, env, ops)
+            else:
+                then_env, then_ops = dict(env), []
+                else_env, else_ops = dict(env), []
+                self.statement(stmt.then, then_env, then_ops)
+                if stmt.otherwise is not None:
+                    self.statement(stmt.otherwise, else_env, else_ops)
+                self._sync_vars([(then_env, then_ops), (else_env, else_ops)], env, env)
+                ops.append((BRANCH, cond, then_ops, else_ops))
+
+        else:
+            raise ValueError(f"Unexpected statement {stmt}")
+
+    def item(self, item, env : Dict[str, Any], ops : List):
+        kind = type(item)
+        if kind is Style:
+            ops.append((STYLE, self.fold(item.arg, env)))
+        elif kind is NewLine:
+            ops.append((NEWLINE,))
+        elif kind is ForceCutoff:
+            ops.append((CUTOFF,))
+        elif kind is Span:
+            ops.append((SPAN, self.fold(item.text, env), item.length))
+        else:
+            value = self.fold(item, env)
+            if type(value) is Const:
+                if value.value is not None:
+                    ops.append((TEXT, value.value))
+            else:
+                ops.append((TEXT_EVAL, value))
+
+    def fold(self, node, env : Dict[str, Any]):
+        """
+        Evaluate as much of an expression as possible, returns a `Const` if nothing is left for runtime.
+        """
+        # Called for every expression in every unrolled iteration, so dispatch on the type directly
+        kind = type(node)
+        if kind is Const:
+            return node
+
+        if kind is Var:
+            return env.get(node.name, node) # Unbound variables fail at runtime, if they are reached
+
+        if kind is Index:
+            # Workbook values are read at runtime, once for each distinct set of keys
+            keys = []
+            constant = True
+            for k in node.keys:
+                kind = type(k)
+                if kind is Var:
+                    k = env.get(k.name, k)
+                elif kind is not Const:
+                    k = self.fold(k, env)
+                constant = constant and type(k) is Const
+                keys.append(k)
+            if not constant:
+                return Index(tuple(keys))
+            values = tuple([k.value for k in keys])
+            try:
+                lookup = self.lookups.get(values)
+            except TypeError:
+                return Index(tuple(keys)) # Unhashable keys, e.g. a list
+            if lookup is None:
+                lookup = Lookup(len(self.lookups), values)
+                self.lookups[values] = lookup
+            return lookup
+
+        if kind is Concat:
+            folded = []
+            for part in node.parts:
+                part = self.fold(part, env)
+                if type(part) is Const:
+                    if folded and type(folded[-1]) is Const:
+                        part = Const(folded.pop().value + str(part.value))
+                    else:
+                        part = Const(str(part.value))
+                folded.append(part)
+            return folded[0] if len(folded) == 1 else Concat(tuple(folded))
+
+        if kind is Equals:
+            a, b = self.fold(node.a, env), self.fold(node.b, env)
+            if type(a) is Const and type(b) is Const:
+                return Const(a.value == b.value)
+            return Equals(a, b)
+
+        if kind is Description:
+            arg = self.fold(node.arg, env)
+            if type(arg) is Const and arg.value in self.variable_names:
+                return Const(self.variable_names[arg.value])
+            return Description(arg)
+
+        if kind is Builtin:
+            name = node.name
+            if name not in self.constants:
+                match name:
+                    case "!domain":
+                        self.constants[name] = Const(self.info.domains)
+                    case "!influence":
+                        self.constants[name] = Const(self.info.influences)
+                    case "!variables":
+                        self.constants[name] = Const(self.info.variables)
+            return self.constants[name]
+
+        if isinstance(node, EFFECTS):
+            raise ValueError(f"{kind.__name__} cannot be used as a value in the table DSL")
+        raise ValueError(f"Unexpected expression {node}")
+
+    def _sync_vars(self, paths : List[Tuple[Dict, List]], before : Dict, env : Dict[str, Any]):
+        """
+        Variables bound differently depending on the path taken at runtime are stored at the end
+        of each path, and read at runtime after the branch or loop.
+        """
+        changed = {name for path_env, _ in paths for name, b in path_env.items() if before.get(name, _UNBOUND) is not b}
+        for name in changed:
+            for path_env, path_ops in paths:
+                binding = path_env.get(name, _UNBOUND)
+                if binding is not _UNBOUND and binding != Var(name):
+                    path_ops.append((SET_VAR, name, binding))
+            env[name] = Var(name)
+
+@dataclass
+class SpecializedTable:
+    """
+    Table DSL specialized for a single component, see `specialize`.
+    """
+    ops : List[tuple]
+    format : Any
+    info : ComponentInfo
+    variable_names : Dict[str, str]
+    lookup_keys : List[Tuple] = field(default_factory=list) # Keys of each `Lookup` slot
+
+    @property
+    def size_hint(self) -> Tuple[int, int]:
+        """
+        Expected (rows, columns) of the table, the largest branch is assumed and loops over
+        workbook values are counted once.
+        """
+        rows, _, cols = _estimate_size(self.ops, 1, 0, 1)
+        return rows, cols
+
+    def execute(self) -> TableState:
+        """
+        Build the table by running the specialized program, see `interpreter`.
+        """
+        from .interpreter import assemble, Interpreter
+        return Interpreter(assemble(self.ops), self).run()
+
+def _estimate_size(ops : List[tuple], rows : int, col : int, max_cols : int) -> Tuple[int, int, int]:
+    for op in ops:
+        kind = op[0]
+        if kind == TEXT or kind == TEXT_EVAL:
+            col += 1
+        elif kind == SPAN:
+            col += op[2]
+        elif kind == NEWLINE:
+            rows, col = rows + 1, 0
+        elif kind == BRANCH:
+            then_size = _estimate_size(op[2], rows, col, max_cols)
+            else_size = _estimate_size(op[3], rows, col, max_cols)
+            rows, col, max_cols = (max(a, b) for a, b in zip(then_size, else_size))
+        elif kind == LOOP:
+            rows, col, max_cols = _estimate_size(op[3], rows, col, max_cols)
+        max_cols = max(max_cols, col)
+    return rows, col, max_cols
+
+def specialize(program : Program, info : ComponentInfo, variable_names : Dict[str, str]) -> SpecializedTable:
+    """
+    Partially evaluate a program for a component.
+
+    ## Example
+
+    ```
+    program = compile_tree(parser.parse(code))
+    table_state = specialize(program, info, variable_names).execute()
+    ```
+    """
+    specializer = _Specializer(info, variable_names)
+
+    table_format = None
+    if program.format is not None:
+        table_format = specializer.fold(program.format, {})
+        if not isinstance(table_format, Const):
+            raise ValueError("!format only accepts constant arguments")
+        table_format = table_format.value
+
+    ops = []
+    specializer.statements(program.statements, {}, ops)
+    return SpecializedTable(ops, table_format, info, variable_names, list(specializer.lookups))
@@ -0,0 +1,283 @@
+"""
+Stack machine running specialized table DSL programs.
+
+The nested operations of a `SpecializedTable` are assembled into a flat list of
+`(opcode, argument)` instructions, with jumps for branches and loops, and run by a single loop
+without recursion. Values are passed on a stack, e.g. `"a" + [$var]["b"]["c"]["d"]` becomes
+
+```
+PUSH_CONST  "a"
+LOAD_VAR    "var"
+PUSH_CONST  "b"
+PUSH_CONST  "c"
+PUSH_CONST  "d"
+INDEX       4
+CONCAT      2
+EMIT
+```
+"""
+from typing import Any, List, Tuple
+
+from utils.instrumentation import count
+from utils.tracing import span
+from . import compiler
+from .compiler import SpecializedTable, Const, Var, Index, Lookup, Concat, Description, Equals
+from .table_state import TableState
+
+# Opcodes, the argument of each instruction is shown in parentheses
+PUSH_CONST = 0      # (value) push a constant
+LOOKUP = 1          # ((slot, keys)) push a workbook value with constant keys, gathered once per table
+INDEX = 2           # (number of keys) pop the keys and push the workbook value
+LOAD_VAR = 3        # (name) push the value of a loop variable
+STORE_VAR = 4       # (name) pop a value into a variable
+CONCAT = 5          # (number of parts) pop the parts and push them joined as text
+EQUALS = 6          # pop two values and push whether they are equal
+DESCRIBE = 7        # pop a variable id and push its description
+EMIT = 8            # pop a value and write it to the current cell, unless it is None
+EMIT_CONST = 9      # (value) write a constant to the current cell
+SET_STYLE = 10      # pop the style of the following cells
+NEW_ROW = 11        # move to the first column of the next row
+ADD_SPAN = 12       # (length) pop a text and write it to a cell spanning `length` columns
+FORCE_CUTOFF = 13   # stop vertical merges at the current row
+JUMP = 14           # (target)
+JUMP_IF_FALSE = 15  # (target) pop a condition, jump if it is false
+LOOP_BEGIN = 16     # ((name, end)) pop an iterable, bind the first item or jump to `end` if empty
+LOOP_END = 17       # ((name, body)) bind the next item and jump back to `body`, or leave the loop
+
+OPCODE_NAMES = {value: name for name, value in globals().copy().items() if name.isupper() and isinstance(value, int)}
+
+Instruction = Tuple[int, Any]
+
+_UNSET = object()
+_DONE = object()
+
+def assemble(ops : List[tuple]) -> List[Instruction]:
+    """
+    Flatten the operations of a `SpecializedTable` to a list of instructions.
+    """
+    code : List[Instruction] = []
+    _assemble_ops(ops, code)
+    return code
+
+def _assemble_ops(ops : List[tuple], code : List[Instruction]):
+    for op in ops:
+        match op[0]:
+            case compiler.TEXT:
+                code.append((EMIT_CONST, op[1]))
+            case compiler.TEXT_EVAL:
+                _assemble_expr(op[1], code)
+                code.append((EMIT, None))
+            case compiler.STYLE:
+                _assemble_expr(op[1], code)
+                code.append((SET_STYLE, None))
+            case compiler.NEWLINE:
+                code.append((NEW_ROW, None))
+            case compiler.SPAN:
+                _assemble_expr(op[1], code)
+                code.append((ADD_SPAN, op[2]))
+            case compiler.CUTOFF:
+                code.append((FORCE_CUTOFF, None))
+            case compiler.BRANCH:
+                _, cond, then_ops, else_ops = op
+                _assemble_expr(cond, code)
+                jump_to_else = len(code)
+                code.append((JUMP_IF_FALSE, None)) # Target is patched once known
+                _assemble_ops(then_ops, code)
+                if else_ops:
+                    jump_to_end = len(code)
+                    code.append((JUMP, None))
+                    code[jump_to_else] = (JUMP_IF_FALSE, len(code))
+                    _assemble_ops(else_ops, code)
+                    code[jump_to_end] = (JUMP, len(code))
+                else:
+                    code[jump_to_else] = (JUMP_IF_FALSE, len(code))
+            case compiler.LOOP:
+                _, iterable, var, body_ops = op
+                _assemble_expr(iterable, code)
+                begin = len(code)
+                code.append((LOOP_BEGIN, None))
+                _assemble_ops(body_ops, code)
+                code.append((LOOP_END, (var, begin + 1)))
+                code[begin] = (LOOP_BEGIN, (var, len(code)))
+            case compiler.SET_VAR:
+                _assemble_expr(op[2], code)
+                code.append((STORE_VAR, op[1]))
+            case _:
+                raise ValueError(f"Unexpected operation {op}")
+
+def _assemble_expr(node, code : List[Instruction]):
+    kind = type(node)
+    if kind is Const:
+        code.append((PUSH_CONST, node.value))
+    elif kind is Lookup:
+        code.append((LOOKUP, (node.slot, node.keys)))
+    elif kind is Index:
+        for key in node.keys:
+            _assemble_expr(key, code)
+        code.append((INDEX, len(node.keys)))
+    elif kind is Var:
+        code.append((LOAD_VAR, node.name))
+    elif kind is Concat:
+        for part in node.parts:
+            _assemble_expr(part, code)
+        code.append((CONCAT, len(node.parts)))
+    elif kind is Equals:
+        _assemble_expr(node.a, code)
+        _assemble_expr(node.b, code)
+        code.append((EQUALS, None))
+    elif kind is Description:
+        _assemble_expr(node.arg, code)
+        code.append((DESCRIBE, None))
+    else:
+        raise ValueError(f"Unexpected expression {node}")
+
+def disassemble(code : List[Instruction]) -> str:
+    """
+    Readable listing of instructions, for debugging templates.
+    """
+    lines = []
+    for pc, (op, arg) in enumerate(code):
+        lines.append(f"{pc:>5}  {OPCODE_NAMES[op]:<14}{'' if arg is None else repr(arg)}")
+    return "\n".join(lines)
+
+class Interpreter:
+    """
+    Runs assembled instructions for a specialized table.
+
+    ## Example
+
+    ```
+    table = specialize(program, info, variable_names)
+    table_state = Interpreter(assemble(table.ops), table).run()
+    ```
+    """
+    def __init__(self, code : List[Instruction], table : SpecializedTable):
+        self.code = code
+        self.table = table
+        self.steps = 0   # Instructions executed by the last run
+        self.lookups = 0 # Values read from the workbook one at a time
+        self.gathered = 0 # Values used from the bulk read, see `ComponentInfo.get_values`
+        self.reused = 0  # Lookups answered by an earlier identical lookup
+
+    def run(self) -> TableState:
+        table = self.table
+        info = table.info
+        variable_names = table.variable_names
+
+        table_state = TableState(size_hint=table.size_hint)
+        if table.format is not None:
+            table_state.format = table.format
+
+        code = self.code
+        end = len(code)
+        # All lookups with constant keys are read from the sheet at once, lookups in branches
+        # that are not taken are read as well but only fail (like `get_value`) if reached
+        gathered = []
+        if table.lookup_keys:
+            with span("gather_lookups", cells=len(table.lookup_keys)):
+                gathered = info.get_values(table.lookup_keys)
+        values : List[Any] = [_UNSET] * len(table.lookup_keys) # Values of `LOOKUP`s used so far
+        dynamic = {} # Values of `INDEX` by keys
+        variables = {}
+        loops = [] # Iterators of the loops being run
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        style = ""
+        steps = lookups = num_gathered = reused = 0
+
+        pc = 0
+        while pc < end:
+            op, arg = code[pc]
+            pc += 1
+            steps += 1
+
+            if op == PUSH_CONST:
+                push(arg)
+            elif op == LOOKUP:
+                value = values[arg[0]]
+                if value is _UNSET:
+                    value = gathered[arg[0]]
+                    if value is None:
+                        value = info.get_value(*arg[1])
+                        lookups += 1
+                    else:
+                        num_gathered += 1
+                    values[arg[0]] = value
+                else:
+                    reused += 1
+                push(value)
+            elif op == EMIT_CONST:
+                table_state.emit(arg, style)
+            elif op == EMIT:
+                value = pop()
+                if value is not None:
+                    table_state.emit(value, style)
+            elif op == CONCAT:
+                parts = stack[-arg:]
+                del stack[-arg:]
+                push("".join([str(p) for p in parts]))
+            elif op == EQUALS:
+                b = pop()
+                push(pop() == b)
+            elif op == JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == LOAD_VAR:
+                push(variables[arg])
+            elif op == INDEX:
+                keys = tuple(stack[-arg:])
+                del stack[-arg:]
+                try:
+                    value = dynamic.get(keys, _UNSET)
+                except TypeError: # Unhashable keys are not reused
+                    value = info.get_value(*keys)
+                    lookups += 1
+                else:
+                    if value is _UNSET:
+                        value = info.get_value(*keys)
+                        dynamic[keys] = value
+                        lookups += 1
+                    else:
+                        reused += 1
+                push(value)
+            elif op == NEW_ROW:
+                table_state.next_row()
+                table_state.reset_col()
+            elif op == SET_STYLE:
+                style = pop()
+            elif op == ADD_SPAN:
+                table_state.set_style(style)
+                table_state.add_span(pop(), arg)
+            elif op == FORCE_CUTOFF:
+                table_state.force_cutoff()
+            elif op == DESCRIBE:
+                push(variable_names[pop()])
+            elif op == STORE_VAR:
+                variables[arg] = pop()
+            elif op == LOOP_BEGIN:
+                iterator = iter(pop())
+                value = next(iterator, _DONE)
+                if value is _DONE:
+                    pc = arg[1]
+                else:
+                    variables[arg[0]] = value
+                    loops.append(iterator)
+            elif op == LOOP_END:
+                value = next(loops[-1], _DONE)
+                if value is _DONE:
+                    loops.pop()
+                else:
+                    variables[arg[0]] = value
+                    pc = arg[1]
+            else:
+                raise ValueError(f"Unknown opcode {op} at {pc - 1}")
+
+        self.steps, self.lookups, self.gathered, self.reused = steps, lookups, num_gathered, reused
+        count("dsl_instructions", steps)
+        count("dsl_lookups", lookups)
+        count("dsl_lookups_gathered", num_gathered)
+        count("dsl_lookups_reused", reused)
+        return table_state
@@ -1,8 +1,19 @@
 from lark import Lark, Transformer, Tree, Token, v_args
 from table_generation.component import ComponentInfo
 from .table_state import TableState
+from .compiler import Program, compile_tree, specialize
+from utils.caching import LRUCache
+from utils.files import resource_path
+
 from typing import Dict
 import ast
+import os
+import threading
+
+# Serialized LALR tables of the grammar, created by build.py or on first use. Lark stores a hash
+# of the grammar, the Lark version and the Python version in the file and rebuilds the tables
+# (overwriting the file if possible) when any of them changed
+PARSER_CACHE_PATH = resource_path("config/table_dsl.lark_cache")
 
 GRAMMAR = r"""
 start: statement+
@@ -70,28 +81,63 @@ EQUALS : "!equals"
 
 
 class Parser():
-    def __init__(self):
-        self.parser = Lark(GRAMMAR, parser="lalr")
+    def __init__(self, cache_path : str | None = PARSER_CACHE_PATH):
+        """
+        ### Parameters
+        cache_path : file with the serialized parser tables, None to always build the tables
+        """
+        self.parser = Lark(GRAMMAR, parser="lalr", cache=cache_path if cache_path is not None else False)
         self.tree = None
-        self._cached = {}
+        self.program : Program | None = None
+        self._cached = LRUCache(maxsize=16, name="parsed_dsl") # DSL code -> (parse tree, compiled program)
 
     def parse(self, code : str):
-        if code in self._cached:
-            self.tree = self._cached[code]
-        
+        self.tree, self.program = self._cached.get_or_set(code, lambda: self._parse(code))
+
+    def _parse(self, code : str):
         tree = self.parser.parse(code)
-        self._cached[code] = tree
-        self.tree = tree
+        return tree, compile_tree(tree)
 
-    def execute(self, info : ComponentInfo, variable_names : Dict[str, str]) -> TableState:
-        executor = TableExecutor(info, variable_names)
+    def execute(self, info : ComponentInfo, variable_names : Dict[str, str], compiled : bool = True) -> TableState:
+        """
+        Build the table for a component.
 
-        if self.tree is not None:
-            executor.transform(self.tree)
-        else:
+        ### Parameters
+        compiled : specialize the compiled program for the component (see `compiler.specialize`),
+        otherwise the parse tree is interpreted by `TableExecutor`
+        """
+        if self.tree is None or self.program is None:
             raise ValueError("No parse tree found. Perhaps you forgot to parse before executing?")
-        
+
+        if compiled:
+            return specialize(self.program, info, variable_names).execute()
+
+        executor = TableExecutor(info, variable_names)
+        executor.transform(self.tree)
         return executor.table_state
+
+def build_parser_cache(cache_path : str = PARSER_CACHE_PATH):
+    """
+    Build the parser tables and write them to `cache_path`, replacing any existing cache.
+    """
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+    Parser(cache_path)
+    print(f"Parser cache saved in {os.path.normpath(cache_path)}")
+
+_default_parser : Parser | None = None
+_default_parser_lock = threading.Lock()
+
+def get_default_parser() -> Parser:
+    """
+    Parser shared by all table generation. Built on first use, since building the 
+    LALR tables is slow and should not happen at import.
+    """
+    global _default_parser
+    with _default_parser_lock:
+        if _default_parser is None:
+            _default_parser = Parser()
+        return _default_parser
     
 class TableExecutor(Transformer):
     def __init__(self, info : ComponentInfo, variable_names : Dict[str, str]):
@@ -1,41 +1,133 @@
-from dataclasses import dataclass, field
-from typing import Tuple, List, Dict, Any
+from array import array
+from dataclasses import dataclass
+from typing import Tuple, List, Dict, Any, Iterator
 
-@dataclass
+# Rows and columns are added in chunks, so growing the grid does not copy it for every row
+ROW_CHUNK = 64
+COL_CHUNK = 8
+
+@dataclass(slots=True)
 class Span:
     pos1 : Tuple[int, int]
     pos2 : Tuple[int, int]
     text : str
 
-@dataclass
+@dataclass(slots=True)
 class Text:
     text : str = ""
     style : str = ""
 
 class TableState:
-    def __init__(self):
+    """
+    Grid of cell texts and styles built by the table DSL. Texts and style ids are stored in two
+    flat row-major arrays with room for `_row_capacity` x `_col_capacity` cells, and each distinct
+    style is stored once in `styles`. Use `text`, `style` or `cell` to read a cell.
+
+    ### Parameters
+    size_hint : expected (rows, columns), the grid is allocated with this size up front
+    """
+    def __init__(self, size_hint : Tuple[int, int] | None = None):
         self._cur_i = 0
         self._cur_j = 0
         self.rows = 1
         self.cols = 1
-        self.arr : List[List[Text]] = [[Text()]]
         self.force_cutoffs = []
         self.spans = []
         self.format = ""
 
+        hint_rows, hint_cols = size_hint if size_hint is not None else (1, 1)
+        self._row_capacity = max(hint_rows, 1)
+        self._col_capacity = max(hint_cols, 1)
+        self._texts : List[Any] = [""] * (self._row_capacity * self._col_capacity)
+        self._style_ids = array("I", [0]) * (self._row_capacity * self._col_capacity)
+        self.styles : List[Any] = [""] # Style id -> style
+        self._style_lookup : Dict[Any, int] = {"": 0}
+
+    def text(self, i : int, j : int) -> Any:
+        return self._texts[self._index(i, j)]
+
+    def style(self, i : int, j : int) -> Any:
+        return self.styles[self._style_ids[self._index(i, j)]]
+
+    def cell(self, i : int, j : int) -> Text:
+        index = self._index(i, j)
+        return Text(self._texts[index], self.styles[self._style_ids[index]])
+
+    def iter_cells(self) -> Iterator[Tuple[int, int, Any, Any]]:
+        """
+        Yields `(i, j, text, style)` for every cell, row by row.
+        """
+        texts, style_ids, styles = self._texts, self._style_ids, self.styles
+        for i in range(self.rows):
+            start = i * self._col_capacity
+            for j in range(self.cols):
+                yield i, j, texts[start + j], styles[style_ids[start + j]]
+
+    def _index(self, i : int, j : int) -> int:
+        if not (0 <= i < self.rows and 0 <= j < self.cols):
+            raise IndexError(f"Cell ({i}, {j}) is outside the table of size ({self.rows}, {self.cols})")
+        return i * self._col_capacity + j
+
     def _expand(self):
-        while self._cur_i >= self.rows:
-            self._append_row()
-        while self._cur_j >= self.cols:
-            self._append_col()
+        if self._cur_i >= self.rows:
+            self.rows = self._cur_i + 1
+        if self._cur_j >= self.cols:
+            self.cols = self._cur_j + 1
+        if self.rows > self._row_capacity or self.cols > self._col_capacity:
+            self._reserve(self.rows, self.cols)
+
+    def _reserve(self, rows : int, cols : int):
+        """
+        Make room for at least `rows` x `cols` cells.
+        """
+        if cols > self._col_capacity:
+            # Rows are laid out one after another, so adding columns moves every row
+            new_cols = max(cols, self._col_capacity + COL_CHUNK)
+            old_cols = self._col_capacity
+            texts : List[Any] = [""] * (self._row_capacity * new_cols)
+            style_ids = array("I", [0]) * (self._row_capacity * new_cols)
+            for i in range(self._row_capacity):
+                texts[i * new_cols:i * new_cols + old_cols] = self._texts[i * old_cols:(i + 1) * old_cols]
+                style_ids[i * new_cols:i * new_cols + old_cols] = self._style_ids[i * old_cols:(i + 1) * old_cols]
+            self._texts, self._style_ids, self._col_capacity = texts, style_ids, new_cols
+
+        if rows > self._row_capacity:
+            new_rows = max(rows, self._row_capacity + max(ROW_CHUNK, self._row_capacity // 2))
+            added = (new_rows - self._row_capacity) * self._col_capacity
+            self._texts.extend([""] * added)
+            self._style_ids.extend(array("I", [0]) * added)
+            self._row_capacity = new_rows
+
+    def _style_id(self, style) -> int:
+        try:
+            style_id = self._style_lookup.get(style)
+        except TypeError: # Unhashable styles are not shared
+            self.styles.append(style)
+            return len(self.styles) - 1
+
+        if style_id is None:
+            style_id = len(self.styles)
+            self.styles.append(style)
+            self._style_lookup[style] = style_id
+        return style_id
 
     def set_text(self, text):
         self._expand()
-        self.arr[self._cur_i][self._cur_j].text = text
+        self._texts[self._cur_i * self._col_capacity + self._cur_j] = text
+
+    def set_style(self, style=""):
+        self._expand()
+        self._style_ids[self._cur_i * self._col_capacity + self._cur_j] = self._style_id(style)
 
-    def set_style(self, style={}):
+    def emit(self, text, style=""):
+        """
+        Write a cell and move to the next column, same as `set_style`, `set_text` and `next_col`.
+        """
         self._expand()
-        self.arr[self._cur_i][self._cur_j].style = style
+        index = self._cur_i * self._col_capacity + self._cur_j
+        self._texts[index] = text
+        self._style_ids[index] = self._style_id(style)
+        self._cur_j += 1
 
     def reset_col(self):
         self._cur_j = 0
@@ -51,21 +143,11 @@ class TableState:
 
     def add_span(self, text, length):
         extend_by = length - 1
-        while self._cur_j + extend_by >= self.cols:
-            self._append_col()
+        if self._cur_j + extend_by >= self.cols:
+            self.cols = self._cur_j + extend_by + 1
+            self._reserve(self.rows, self.cols)
 
         span = Span((self._cur_i, self._cur_j), (self._cur_i, self._cur_j + extend_by), text)
         self.spans.append(span)
 
         self._cur_j += length
-
-    def _append_row(self):
-        # Add empty row to the end
-        self.arr.append([Text() for _ in range(self.cols)])
-        self.rows += 1
-
-    def _append_col(self):
-        # Add an empty element to each row
-        for l in self.arr:
-            l.append(Text())
-        self.cols += 1
\ No newline at end of file
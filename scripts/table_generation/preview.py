@@ -0,0 +1,47 @@
+import os
+import tempfile
+from typing import Iterable
+import webbrowser
+
+from table_generation.async_table_generator import DSL_FILE_PATH
+from table_generation.export import to_html
+from table_generation.parser import TableState
+from table_generation.table_generator import build_table_state
+from utils.workbook_registry import workbook_registry, component_prefix
+from utils.xls_parsing import parse_excel_cached, get_component_by_id, parse_variables
+
+def preview_component(xls_paths : str | Iterable[str], component_id : str, dsl_path : str = DSL_FILE_PATH) -> TableState:
+    """
+    Build the table of a component without a Word document, see `export` for writing it.
+
+    ### Parameters
+    xls_paths : workbook, or workbooks to find the component in by its id prefix \n
+    component_id : e.g. "Ge01" \n
+    dsl_path : table DSL file
+    """
+    if isinstance(xls_paths, str):
+        xls_path = xls_paths
+    else:
+        xls_path = workbook_registry.index(xls_paths).get(component_prefix(component_id))
+        if xls_path is None:
+            raise ValueError(f"Could not find {component_id} in the selected excel files")
+
+    with open(dsl_path, "r") as f:
+        code = f.read()
+
+    file_manager = parse_excel_cached(xls_path)
+    component = get_component_by_id(file_manager, component_id)
+    return build_table_state(component, parse_variables(file_manager), code)
+
+def open_html_preview(table_state : TableState, title : str) -> str:
+    """
+    Write an HTML preview to a temporary file and open it in the browser.
+
+    ### Returns
+    Path of the written file.
+    """
+    fd, path = tempfile.mkstemp(prefix=f"{title}_", suffix=".html")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(to_html(table_state, title=title))
+    webbrowser.open(f"file://{os.path.abspath(path)}")
+    return path
@@ -3,6 +3,8 @@ import os
 
 from docx.document import Document
 
+from utils.instrumentation import stage
+
 @dataclass
 class TableCollection:
     doc : Document
@@ -21,4 +23,5 @@ class TableCollection:
         save_path = os.path.join(full_subfolder_path, f"tables.docx")
         save_path = os.path.normpath(save_path)
         print(f"Saved table in {save_path}")
-        self.doc.save(save_path)
\ No newline at end of file
+        with stage("save"):
+            self.doc.save(save_path)
\ No newline at end of file
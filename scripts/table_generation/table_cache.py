@@ -0,0 +1,281 @@
+import hashlib
+from importlib import metadata
+import os
+import pickle
+import sys
+import threading
+from typing import Dict, Tuple
+import xml.etree.ElementTree as ET
+import zipfile
+
+from table_generation.component import Component
+from table_generation.parser.table_state import TableState
+from utils.caching import CacheStats, LRUCache, register_cache
+from utils.tracing import span
+
+TABLE_CACHE_DIR = "table_cache"
+TABLE_CACHE_ENV_VAR = "TABLEGEN_TABLE_CACHE"        # Set to 0 to disable the cache
+TABLE_CACHE_SIZE_ENV_VAR = "TABLEGEN_TABLE_CACHE_MB" # Size limit of the cache folder
+DEFAULT_MAX_MB = 64
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_SHARED_PARTS = ("xl/workbook.xml", "xl/sharedStrings.xml", "xl/styles.xml") # Used by every sheet
+
+# Sources that build tables, relative to scripts/, any change to them gives new cache keys
+_SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_CODE_SOURCES = ("table_generation", os.path.join("utils", "formatting.py"))
+
+_code_version : str | None = None
+_environment : str | None = None
+
+def code_version() -> str:
+    """
+    Hash of the sources of `table_generation/` (including the DSL grammar) and `utils/formatting.py`.
+    In a frozen build the sources are not shipped, the executable's size and modification time are used instead.
+    """
+    global _code_version
+    if _code_version is None:
+        sources = []
+        for source in _CODE_SOURCES:
+            path = os.path.join(_SCRIPTS_DIR, source)
+            if os.path.isfile(path):
+                sources.append(path)
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+                sources += [os.path.join(root, name) for name in sorted(files) if name.endswith(".py")]
+
+        digest = hashlib.sha256()
+        if sources:
+            for path in sources:
+                digest.update(os.path.relpath(path, _SCRIPTS_DIR).replace(os.sep, "/").encode())
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+        else:
+            stat = os.stat(sys.executable)
+            digest.update(f"{os.path.basename(sys.executable)};{stat.st_size};{stat.st_mtime_ns}".encode())
+        _code_version = digest.hexdigest()[:16]
+    return _code_version
+
+def _environment_key() -> str:
+    """
+    Versions affecting how cells are read and formatted.
+    """
+    global _environment
+    if _environment is None:
+        versions = [code_version(), sys.version.split()[0]]
+        for package in ("pandas", "openpyxl"):
+            try:
+                versions.append(f"{package}={metadata.version(package)}")
+            except metadata.PackageNotFoundError:
+                versions.append(f"{package}=?")
+        _environment = ";".join(versions)
+    return _environment
+
+class _WorkbookParts:
+    """
+    Digests of the parts of an .xlsx file, the parts shared by all sheets are hashed up front and
+    sheets when first needed.
+    """
+    def __init__(self, xls_path : str):
+        self.xls_path = xls_path
+        self.sheet_digests : Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        with zipfile.ZipFile(xls_path) as zf:
+            members = set(zf.namelist())
+            shared = hashlib.sha256()
+            for part in _SHARED_PARTS:
+                if part in members:
+                    shared.update(part.encode())
+                    shared.update(zf.read(part))
+            self.shared_digest = shared.hexdigest()
+            self.sheet_members = self._read_sheet_members(zf, members)
+
+    @staticmethod
+    def _read_sheet_members(zf : zipfile.ZipFile, members) -> Dict[str, str]:
+        # Sheet name -> relationship id -> file in the archive
+        workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+        targets = {}
+        if "xl/_rels/workbook.xml.rels" in members:
+            for rel in ET.fromstring(zf.read("xl/_rels/workbook.xml.rels")):
+                target = rel.get("Target", "")
+                targets[rel.get("Id")] = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+
+        sheet_members = {}
+        for sheet in workbook.iter(f"{_MAIN_NS}sheet"):
+            member = targets.get(sheet.get(f"{_REL_NS}id"), f"xl/worksheets/sheet{sheet.get('sheetId')}.xml")
+            if member in members:
+                sheet_members[sheet.get("name")] = member
+        return sheet_members
+
+    def sheet_digest(self, sheet_name : str) -> str | None:
+        with self._lock:
+            if sheet_name not in self.sheet_digests:
+                member = self.sheet_members.get(sheet_name)
+                if member is None:
+                    return None
+                with zipfile.ZipFile(self.xls_path) as zf:
+                    self.sheet_digests[sheet_name] = hashlib.sha256(zf.read(member)).hexdigest()
+            return self.sheet_digests[sheet_name]
+
+class TableStateCache:
+    """
+    Tables built from the DSL, stored on disk so a component whose inputs did not change is not
+    read from the workbook or executed again in the next run. Entries are keyed by a hash of
+    the component's `_INF` sheet, its row and the variables in the FEP list, the variable
+    descriptions, the DSL code, the table generation sources (see `code_version`) and the versions
+    of Python, pandas and openpyxl.
+    The least recently used entries are removed when the folder grows beyond `max_bytes`.
+    Statistics are registered as "table_states", see `utils.caching.cache_stats`.
+
+    ## Example
+
+    ```
+    key = table_cache.key(component, variable_names, code)
+    table_state = table_cache.get(key)
+    if table_state is None:
+        table_state = parser.execute(component.get_info(), variable_names)
+        table_cache.put(key, table_state)
+    ```
+    """
+    def __init__(self, directory : str = TABLE_CACHE_DIR, max_bytes : int | None = None):
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get(TABLE_CACHE_SIZE_ENV_VAR, DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = os.environ.get(TABLE_CACHE_ENV_VAR, "") != "0"
+        self.stats = CacheStats()
+        self._entries : Dict[str, Tuple[int, float]] | None = None # key -> (size, last used), read on first use
+        self._workbooks = LRUCache(maxsize=16) # (path, mtime, size) -> _WorkbookParts
+        self._lock = threading.Lock()
+        register_cache("table_states", lambda: {**self.stats.to_dict(), "size": len(self._entries or {})})
+
+    def key(self, component : Component, variable_names : Dict[str, str], code : str) -> str | None:
+        """
+        Key of the table for a component, or None if the workbook cannot be hashed (e.g. not an .xlsx file).
+        """
+        from utils.xls_parsing import get_filtered_by_id
+
+        xls_path = component.file_manager.file_path
+        with span("table_cache_key", component=component.id):
+            try:
+                stat = os.stat(xls_path)
+                parts = self._workbooks.get_or_set((xls_path, stat.st_mtime_ns, stat.st_size), lambda: _WorkbookParts(xls_path))
+                sheet_digest = parts.sheet_digest(f"{component.id}_INF")
+            except (OSError, KeyError, zipfile.BadZipFile, ET.ParseError):
+                return None
+            if sheet_digest is None:
+                return None
+
+            variables = get_filtered_by_id(component.file_manager, "Var").iloc[:, 0].tolist()
+
+            h = hashlib.sha256()
+            for part in (
+                    _environment_key(),
+                    parts.shared_digest,
+                    sheet_digest,
+                    repr((component.id, component.name, component.system_component)),
+                    repr(variables),
+                    repr(sorted(variable_names.items(), key=lambda kv: str(kv[0]))),
+                    code,
+                    ):
+                h.update(part.encode("utf-8"))
+                h.update(b"\0")
+            return h.hexdigest()
+
+    def get(self, key : str | None) -> TableState | None:
+        if key is None or not self.enabled:
+            return None
+
+        file_path = self._path(key)
+        with self._lock:
+            entries = self._load_entries()
+            if key not in entries:
+                self.stats.misses += 1
+                return None
+
+        try:
+            with open(file_path, "rb") as f:
+                version, table_state = pickle.load(f)
+            if version != code_version() or not isinstance(table_state, TableState):
+                raise ValueError(f"Outdated table cache entry {key}")
+        except Exception as e:
+            print(f"WARNING: Ignoring table cache entry {key}: {e}")
+            with self._lock:
+                self._remove(key)
+                self.stats.invalidations += 1
+                self.stats.misses += 1
+            return None
+
+        with self._lock:
+            self.stats.hits += 1
+            size, _ = entries.get(key, (0, 0.0))
+            entries[key] = (size, _now(file_path))
+        return table_state
+
+    def put(self, key : str | None, table_state : TableState):
+        if key is None or not self.enabled:
+            return
+
+        file_path = self._path(key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{file_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump((code_version(), table_state), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, file_path) # Readers never see a partly written entry
+        except OSError as e:
+            print(f"WARNING: Could not write table cache entry: {e}")
+            return
+
+        with self._lock:
+            entries = self._load_entries()
+            entries[key] = (os.path.getsize(file_path), _now(file_path))
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._load_entries()):
+                self._remove(key)
+                self.stats.invalidations += 1
+
+    def _path(self, key : str) -> str:
+        return os.path.join(self.directory, f"{key}.pickle")
+
+    def _load_entries(self) -> Dict[str, Tuple[int, float]]:
+        if self._entries is None:
+            self._entries = {}
+            if os.path.isdir(self.directory):
+                for entry in os.scandir(self.directory):
+                    if entry.name.endswith(".pickle"):
+                        stat = entry.stat()
+                        self._entries[entry.name[:-len(".pickle")]] = (stat.st_size, stat.st_mtime)
+        return self._entries
+
+    def _evict(self):
+        entries = self._load_entries()
+        total = sum(size for size, _ in entries.values())
+        for key, (size, _) in sorted(entries.items(), key=lambda kv: kv[1][1]):
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            self.stats.evictions += 1
+            total -= size
+
+    def _remove(self, key : str):
+        self._load_entries().pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+def _now(file_path : str) -> float:
+    # The modification time doubles as last use, so the order survives restarts
+    try:
+        os.utime(file_path)
+        return os.path.getmtime(file_path)
+    except OSError:
+        return 0.0
+
+table_cache = TableStateCache()
@@ -4,35 +4,17 @@ from docx.table import _Cell
 import docx.document
 
 from table_generation import Component, FixedTable
-from table_generation.parser import Parser
+from table_generation.export import merge_runs
+from table_generation.parser import Parser, TableState, get_default_parser
+from table_generation.table_cache import TableStateCache
 from utils.formatting import format_raw_value, style, format_table, add_table_heading
+from utils.instrumentation import stage
+from utils.tracing import span
 
 def _get_col_sequences(table : FixedTable, col : int, force_cutoffs) -> List[Tuple[_Cell, _Cell]]:
-    start = 0
-    cur = 1
-    start_cell = table.cell(start, col)
-    seqs = []
-
-    # Iterate over rows
-    while cur < table.num_rows:
-        cell = table.cell(cur, col)
-
-        # Found a row with different text, or a forced cutoff
-        if cell.text != start_cell.text or cur in force_cutoffs:
-            # If more than 1 consecutive cell with identical text, merge
-            if cur - start > 1:
-                end_cell = table.cell(cur - 1, col)
-                seqs.append((start_cell, end_cell))
-            start = cur # Next sequence starts at cur
-            start_cell = cell
-        cur += 1
-
-    # Run one more check to include last sequence
-    if cur - start > 1:
-        end_cell = table.cell(cur - 1, col)
-        seqs.append((start_cell, end_cell))
-
-    return seqs
+    # Texts are read per column since merging a column can change the cells of the next one
+    texts = [table.cell(row, col).text for row in range(table.num_rows)]
+    return [(table.cell(start, col), table.cell(end, col)) for start, end in merge_runs(texts, force_cutoffs)]
 
 def merge_table_rows(table : FixedTable, force_cutoffs=[]):
     """
@@ -45,57 +27,86 @@ def merge_table_rows(table : FixedTable, force_cutoffs=[]):
             start_cell.merge(end_cell)
             start_cell.text = text_before_merge
 
+def build_table_state(
+        component : Component, 
+        variable_names : Dict[str, str], 
+        code : str, 
+        parser : Parser | None = None,
+        table_cache : TableStateCache | None = None
+        ) -> TableState:
+    """
+    Runs the table DSL for a component. Uses the shared parser from `get_default_parser` if no 
+    parser is given. If a `table_cache` is given and has the table for unchanged inputs, the 
+    workbook and DSL are not read at all.
+    """
+    if parser is None:
+        parser = get_default_parser()
+
+    cache_key = None
+    if table_cache is not None and table_cache.enabled:
+        with stage("table_cache", component=component.id):
+            cache_key = table_cache.key(component, variable_names, code)
+            table_state = table_cache.get(cache_key)
+        if table_state is not None:
+            return table_state
+
+    with span("component_info", component=component.id):
+        info = component.get_info()
+
+    # Parse and execute table dsl file
+    with stage("dsl_execute", component=component.id):
+        parser.parse(code)
+        table_state = parser.execute(info, variable_names)
+
+    if cache_key is not None:
+        table_cache.put(cache_key, table_state) #type: ignore
+    return table_state
+
 def generate_table_in_document(
         word_document : docx.document.Document, 
         component : Component, 
         variable_names : Dict[str, str], 
         code : str, 
-        parser=Parser(),
+        parser : Parser | None = None,
         insert_after=None,
-        generate_heading=True
+        generate_heading=True,
+        table_cache : TableStateCache | None = None
         ):
     """
     Generates a word document with a table specifying information for the given component. 
+    See `build_table_state` for `parser` and `table_cache`.
     """
-
-    info = component.get_info()
-
-    # Parse and execute table dsl file
-    parser.parse(code)
-    table_state = parser.execute(info, variable_names)
+    table_state = build_table_state(component, variable_names, code, parser=parser, table_cache=table_cache)
 
     if generate_heading:
-        heading_para = add_table_heading(word_document, component, insert_after=insert_after)
+        with stage("caption", component=component.id):
+            heading_para = add_table_heading(word_document, component, insert_after=insert_after)
 
         if insert_after is not None:
             # If we are relying on `insert_after` for positioning, update it with the added heading
             insert_after = heading_para
 
-    # Using fixed table class since the table shape is known after execution
-    table = FixedTable(word_document, table_state.rows, table_state.cols, insert_after=insert_after)
-
-    # Text needs to be added before merging
-    for i in range(table_state.rows):
-        for j in range(table_state.cols):
-            cell = table.cell(i, j)
-            text_obj = table_state.arr[i][j]
-            cell.text = format_raw_value(text_obj.text)
+    with stage("table_xml_build", component=component.id):
+        # Using fixed table class since the table shape is known after execution
+        table = FixedTable(word_document, table_state.rows, table_state.cols, insert_after=insert_after)
 
-    for span in table_state.spans:
-        cell1 = table.cell(*span.pos1)
-        cell2 = table.cell(*span.pos2)
-        cell1.merge(cell2)
-        cell1.text = span.text
+        # Text needs to be added before merging
+        for i, j, text, _ in table_state.iter_cells():
+            table.cell(i, j).text = format_raw_value(text)
 
-    merge_table_rows(table, force_cutoffs=table_state.force_cutoffs)
+        for cell_span in table_state.spans:
+            cell1 = table.cell(*cell_span.pos1)
+            cell2 = table.cell(*cell_span.pos2)
+            cell1.merge(cell2)
+            cell1.text = cell_span.text
 
-    # Styling needs to be done after mergin
-    for i in range(table_state.rows):
-        for j in range(table_state.cols):
-            cell = table.cell(i, j)
-            text_obj = table_state.arr[i][j]
+    with stage("vertical_merge", component=component.id):
+        merge_table_rows(table, force_cutoffs=table_state.force_cutoffs)
 
-            style(cell, text_obj.style)
+    with stage("styling", component=component.id):
+        # Styling needs to be done after mergin
+        for i, j, _, cell_style in table_state.iter_cells():
+            style(table.cell(i, j), cell_style)
 
-    # Apply table-wide configuration
-    format_table(table, table_state.format)
\ No newline at end of file
+        # Apply table-wide configuration
+        format_table(table, table_state.format)
\ No newline at end of file
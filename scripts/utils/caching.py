@@ -1,16 +1,201 @@
+from collections import OrderedDict
 from functools import wraps
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable
+import weakref
 
-def cache_on_attr(attr_name):
-    cache_dict = {}
+_MISSING = object()
 
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+# Named caches whose statistics are shown in the run report, see `cache_stats`
+_registry : Dict[str, Callable[[], Dict[str, int]]] = {}
+
+def register_cache(name : str, stats : Callable[[], Dict[str, int]]):
+    """
+    Register a cache under `name`, `stats` is called whenever the statistics are collected.
+    """
+    _registry[name] = stats
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Hits, misses, evictions, invalidations and current size of all registered caches.
+    """
+    return {name: stats() for name, stats in sorted(_registry.items())}
+
+class LRUCache:
+    """
+    Thread safe least recently used cache with an optional size limit and time to live.
+
+    ### Parameters
+    maxsize : maximum number of entries, None for unbounded \n
+    ttl : seconds after which an entry expires, None to never expire \n
+    name : register the cache under this name, see `cache_stats` \n
+    on_evict : called with `(key, value)` when an entry is evicted, expires or is invalidated
+    """
+    def __init__(
+            self,
+            maxsize : int | None = None,
+            ttl : float | None = None,
+            name : str | None = None,
+            on_evict : Callable[[Hashable, Any], None] | None = None,
+            stats : CacheStats | None = None
+            ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.stats = stats if stats is not None else CacheStats()
+        self._entries : OrderedDict[Hashable, tuple[Any, float]] = OrderedDict() # key -> (value, time stored)
+        self._lock = threading.RLock()
+        if name is not None:
+            register_cache(name, lambda: {**self.stats.to_dict(), "size": len(self)})
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key : Hashable) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key : Hashable, default=None, count : bool = True):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and self.ttl is not None and time.monotonic() - entry[1] > self.ttl: #type: ignore
+                self._remove(key, "evictions")
+                entry = _MISSING
+
+            if entry is _MISSING:
+                if count:
+                    self.stats.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            if count:
+                self.stats.hits += 1
+            return entry[0] #type: ignore
+
+    def set(self, key : Hashable, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while self.maxsize is not None and len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)), "evictions")
+
+    def get_or_set(self, key : Hashable, compute : Callable[[], Any]):
+        """
+        Return the cached value for `key`, computing and storing it on a miss.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key : Hashable = _MISSING):
+        """
+        Remove an entry, or all entries if no key is given.
+        """
+        with self._lock:
+            keys = list(self._entries) if key is _MISSING else [key]
+            for k in keys:
+                if k in self._entries:
+                    self._remove(k, "invalidations")
+
+    def clear(self):
+        self.invalidate()
+
+    def _remove(self, key : Hashable, reason : str):
+        value, _ = self._entries.pop(key)
+        setattr(self.stats, reason, getattr(self.stats, reason) + 1)
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+def _make_key(args : tuple, kwargs : dict) -> Hashable:
+    if kwargs:
+        return args + (_MISSING,) + tuple(sorted(kwargs.items()))
+    return args
+
+def lru_cache(maxsize : int | None = 128, ttl : float | None = None, name : str | None = None):
+    """
+    Decorator caching the results of a function by its arguments in an `LRUCache`.
+    The cache is available as `func.cache`.
+
+    ## Example
+
+    ```
+    @lru_cache(maxsize=32, name="parsed_dsl")
+    def parse(code : str):
+        ...
+    ```
+    """
+    def decorator(func):
+        cache = LRUCache(maxsize, ttl, name or func.__qualname__)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return cache.get_or_set(_make_key(args, kwargs), lambda: func(*args, **kwargs))
+        wrapper.cache = cache #type: ignore
+        return wrapper
+    return decorator
+
+def per_object_cache(maxsize : int | None = None, ttl : float | None = None, name : str | None = None):
+    """
+    Decorator for methods, or functions taking an object as the first argument. Results are cached
+    per object by the remaining arguments, and the cache of an object is dropped together with the
+    object (weak keys), so cached values do not keep it alive. Statistics are shared by all objects.
+
+    Use `func.invalidate(obj)` to drop the cached values of an object.
+
+    ## Example
+
+    ```
+    class ComponentInfo:
+        @per_object_cache()
+        def _get_l0_df(self, l0):
+            ...
+    ```
+    """
     def decorator(func):
+        caches : weakref.WeakKeyDictionary[Any, LRUCache] = weakref.WeakKeyDictionary()
+        stats = CacheStats()
+        lock = threading.Lock()
+
+        def object_cache(obj) -> LRUCache:
+            with lock:
+                cache = caches.get(obj)
+                if cache is None:
+                    cache = LRUCache(maxsize, ttl, stats=stats)
+                    caches[obj] = cache
+                return cache
+
         @wraps(func)
         def wrapper(obj, *args, **kwargs):
-            key = getattr(obj, attr_name)
-            if key in cache_dict:
-                return cache_dict[key]
-            result = func(obj, *args, **kwargs)
-            cache_dict[key] = result
-            return result
+            return object_cache(obj).get_or_set(_make_key(args, kwargs), lambda: func(obj, *args, **kwargs))
+
+        def invalidate(obj=None):
+            with lock:
+                targets = list(caches.values()) if obj is None else [c for c in [caches.get(obj)] if c is not None]
+            for cache in targets:
+                cache.invalidate()
+
+        def size() -> int:
+            with lock:
+                return sum(len(c) for c in caches.values())
+
+        register_cache(name or func.__qualname__, lambda: {**stats.to_dict(), "objects": len(caches), "size": size()})
+        wrapper.invalidate = invalidate #type: ignore
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
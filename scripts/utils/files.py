@@ -7,11 +7,21 @@ from abc import ABC, abstractmethod
 import zipfile
 import shutil
 import re
+import threading
+import weakref
+from collections import OrderedDict
 from pathlib import Path
+from typing import Dict, List, Tuple, TYPE_CHECKING
 
-from docx import Document
-import openpyxl
-import pandas as pd
+# pandas, openpyxl and docx are imported when a file is opened, this module is 
+# also imported by the GUI at startup for `resource_path`
+if TYPE_CHECKING:
+    import openpyxl
+    import pandas as pd
+
+from utils.caching import CacheStats, register_cache
+from utils.instrumentation import stage
+from utils.tracing import span
 
 class FileManager(ABC):
     def __init__(self, file_path : str):
@@ -25,21 +35,271 @@ class FileManager(ABC):
         create_backup(self.file_path)
         self.save()
 
+MAX_OPEN_ENV_VAR = "TABLEGEN_MAX_OPEN_WORKBOOKS"
+MAX_OPEN_WORKBOOKS = int(os.environ.get(MAX_OPEN_ENV_VAR, 8)) # Idle workbooks beyond this are closed
+
+def _file_stamp(file_path : str) -> Tuple[int, int]:
+    # Modification time and size, a workbook is reopened when either changed on disk
+    stat = os.stat(file_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+class _ExcelHandles:
+    __slots__ = ("file_path", "stamp", "xls", "wb", "users", "detached", "closed")
+
+    def __init__(self, file_path : str, stamp : Tuple[int, int]):
+        self.file_path = file_path
+        self.stamp = stamp
+        self.users = 0
+        self.detached = False # Replaced in the pool, closed once the last user releases it
+        self.closed = False
+        import openpyxl
+        import pandas as pd
+
+        with stage("workbook_open"), span("excel_file_manager_open", workbook=os.path.basename(file_path)):
+            self.xls = pd.ExcelFile(file_path)
+            # Workbook only used for reading, using data_only=True, the workbook will overwrite all formulas
+            # Using data_only=False will overwrite all cached values on save, making pandas read NaN
+            # For this reason workbook cannot be used for writing to the excel file
+            self.wb = openpyxl.load_workbook(file_path, data_only=True, read_only=True)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.xls.close()
+            self.wb.close()
+
+class ExcelHandlePool:
+    """
+    Shares open pandas/openpyxl handles between all `ExcelFileManager`s of the same file, e.g. 
+    the table generator and the syncer. Handles that are no longer used are kept open for reuse,
+    at most `max_open` workbooks are kept open at the same time. Handles in use are only closed
+    by `discard`, before the file is overwritten.
+
+    The pool also keeps one shared `ExcelFileManager` per file, see `shared`. Its handles count
+    as idle, the least recently used shared managers are closed when the limit is reached.
+    """
+    def __init__(self, max_open : int = MAX_OPEN_WORKBOOKS):
+        self.max_open = max_open
+        self._handles : OrderedDict[str, _ExcelHandles] = OrderedDict()
+        self._detached : set[_ExcelHandles] = set() # Replaced handles that are still in use
+        self._shared : Dict[str, Tuple[Tuple[int, int], 'ExcelFileManager']] = {} # file -> (stamp, manager)
+        self._lock = threading.RLock() # Closing a shared manager releases its handles
+        self.stats = CacheStats()
+        register_cache("excel_handles", lambda: {**self.stats.to_dict(), "size": len(self._handles)})
+
+    def shared(self, file_path : str) -> 'ExcelFileManager':
+        """
+        Manager of a file shared by all callers, a new one is returned if the file changed 
+        on disk since it was opened, so values cached per manager are not reused.
+        """
+        stamp = _file_stamp(file_path)
+        stale = None
+        with self._lock:
+            entry = self._shared.get(file_path)
+            if entry is not None and entry[0] == stamp:
+                self.stats.hits += 1
+                self._touch(file_path)
+                return entry[1]
+            if entry is not None:
+                stale = self._shared.pop(file_path)[1] # File changed on disk
+        if stale is not None:
+            stale.close()
+
+        # Opened outside the lock, so other workbooks can be served meanwhile
+        manager = ExcelFileManager(file_path, pool=self)
+
+        with self._lock:
+            entry = self._shared.get(file_path)
+            if entry is None or entry[0] != stamp:
+                self._shared[file_path] = (stamp, manager)
+                return manager
+        manager.close() # Opened by another thread meanwhile
+        return entry[1]
+
+    def acquire(self, file_path : str) -> _ExcelHandles:
+        stamp = _file_stamp(file_path)
+
+        with self._lock:
+            handles = self._handles.get(file_path)
+            if handles is not None and handles.stamp == stamp:
+                self.stats.hits += 1
+                handles.users += 1
+                self._handles.move_to_end(file_path)
+                return handles
+            self.stats.misses += 1
+
+        # Opened outside the lock, so other workbooks can be served meanwhile
+        opened = _ExcelHandles(file_path, stamp)
+
+        with self._lock:
+            handles = self._handles.get(file_path)
+            if handles is not None and handles.stamp == stamp:
+                opened.close() # Opened by another thread meanwhile
+            else:
+                if handles is not None:
+                    self._detach(handles) # File changed on disk
+                handles = opened
+                self._handles[file_path] = handles
+            handles.users += 1
+            self._handles.move_to_end(file_path)
+            idle = self._close_idle()
+        for manager in idle:
+            manager.close()
+        return handles
+
+    def release(self, handles : _ExcelHandles):
+        with self._lock:
+            handles.users -= 1
+            if handles.detached and handles.users == 0:
+                handles.close()
+                self._detached.discard(handles)
+            idle = self._close_idle()
+        for manager in idle:
+            manager.close()
+
+    def discard(self, file_path : str):
+        """
+        Close all handles of a file before it is overwritten, including handles that are still in use
+        and the shared manager. Managers holding closed handles open the file again when it is read.
+        """
+        with self._lock:
+            entry = self._shared.pop(file_path, None)
+        if entry is not None:
+            entry[1].close()
+
+        with self._lock:
+            handles = self._handles.get(file_path)
+            if handles is not None:
+                self._detach(handles)
+            for handles in [h for h in self._detached if h.file_path == file_path]:
+                handles.close() # Released by its users later
+                self._detached.discard(handles)
+
+    def close(self):
+        with self._lock:
+            shared = [manager for _, manager in self._shared.values()]
+            self._shared.clear()
+        for manager in shared:
+            manager.close()
+
+        with self._lock:
+            for handles in list(self._handles.values()):
+                self._detach(handles)
+
+    def _touch(self, file_path : str):
+        if file_path in self._handles:
+            self._handles.move_to_end(file_path)
+
+    def _detach(self, handles : _ExcelHandles):
+        del self._handles[handles.file_path]
+        handles.detached = True
+        self.stats.invalidations += 1
+        if handles.users == 0:
+            handles.close()
+        else:
+            self._detached.add(handles)
+
+    def _is_idle(self, handles : _ExcelHandles) -> bool:
+        # Not in use, or only by the shared manager of the file
+        if handles.users == 0:
+            return True
+        entry = self._shared.get(handles.file_path)
+        return handles.users == 1 and entry is not None and entry[1]._handles is handles
+
+    def _close_idle(self) -> List['ExcelFileManager']:
+        # Close least recently used idle handles until within the limit. Shared managers are 
+        # returned to be closed outside the lock, their handles are closed when released.
+        idle = []
+        num_open = len(self._handles)
+        for handles in list(self._handles.values()):
+            if num_open <= self.max_open:
+                break
+            if not self._is_idle(handles):
+                continue
+            num_open -= 1
+            if handles.users == 0:
+                del self._handles[handles.file_path]
+                handles.close()
+                self.stats.evictions += 1
+            else:
+                idle.append(self._shared.pop(handles.file_path)[1])
+        return idle
+
+excel_handle_pool = ExcelHandlePool()
+
 class ExcelFileManager(FileManager):
-    def __init__(self, file_path : str):
+    """
+    Reads an excel file with pandas and openpyxl, and collects writes that are patched into
+    the file on save. Handles are shared through `excel_handle_pool`, and released with
+    `close()` or by using the manager as a context manager.
+
+    ## Example
+
+    ```
+    with ExcelFileManager("data.xlsx") as file_manager:
+        components = parse_components(file_manager)
+    ```
+    """
+    def __init__(self, file_path : str, pool : ExcelHandlePool | None = None):
         super().__init__(file_path)
-        self.xls = pd.ExcelFile(file_path)
-        # Workbook only used for reading, using data_only=True, the workbook will overwrite all formulas
-        # Using data_only=False will overwrite all cached values on save, making pandas read NaN
-        # For this reason workbook cannot be used for writing to the excel file
-        self.wb = openpyxl.load_workbook(file_path, data_only=True, read_only=True)
+        self._pool = pool if pool is not None else excel_handle_pool
+        self._handles : _ExcelHandles | None = None
+        self._release : weakref.finalize | None = None
+        self._lock = threading.Lock()
+        self._open()
         self.updates = {}
 
+    def __enter__(self) -> 'ExcelFileManager':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @property
+    def xls(self) -> 'pd.ExcelFile':
+        return self._open().xls
+
+    @property
+    def wb(self) -> 'openpyxl.Workbook':
+        return self._open().wb
+
+    @property
+    def is_open(self) -> bool:
+        return self._handles is not None
+
+    def _open(self) -> _ExcelHandles:
+        with self._lock:
+            # Reopened if the manager was closed, e.g. when evicted from the pool, or its handles
+            # were closed before the file was saved
+            if self._handles is None or self._handles.closed:
+                if self._release is not None:
+                    self._release()
+                self._handles = self._pool.acquire(self.file_path)
+                # Handles are released if the manager is garbage collected without being closed
+                self._release = weakref.finalize(self, self._pool.release, self._handles)
+            return self._handles
+
+    def close(self):
+        """
+        Release the pandas and openpyxl handles. Pending writes are kept,
+        and the handles are acquired again if the workbook is read again.
+        """
+        with self._lock:
+            if self._release is not None:
+                self._release() # Releases at most once
+            self._handles = None
+            self._release = None
+
     def write(self, sheet_name : str, cell : str, value):
         self.updates[(sheet_name, cell)] = value
 
     def save(self):
-        self._patch_excel_values()
+        with span("excel_save", workbook=os.path.basename(self.file_path)):
+            # Open handles keep the file locked on Windows, including those of other managers
+            self.close()
+            self._pool.discard(self.file_path)
+            self._patch_excel_values()
 
     def _patch_excel_values(self):
         """
@@ -115,6 +375,7 @@ class ExcelFileManager(FileManager):
 class WordFileManager(FileManager):
     def __init__(self, file_path : str):
         super().__init__(file_path)
+        from docx import Document
         self.doc = Document(file_path)
 
     def save(self):
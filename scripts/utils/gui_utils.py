@@ -125,4 +125,15 @@ def display_ui_element(elm : CTkBaseClass, **kwargs):
 def hide_ui_element(elm):
     elm.pack_forget()
     elm.place_forget()
-    elm.grid_forget()
\ No newline at end of file
+    elm.grid_forget()
+
+
+def unbind_all_command(widget, sequence : str, funcid : str):
+    """
+    Remove a single command added with `bind_all(..., add="+")`, other commands bound to
+    the same sequence are kept (`unbind_all` removes all of them).
+    """
+    script = widget.tk.call("bind", "all", sequence)
+    kept = [line for line in script.split("\n") if line and funcid not in line]
+    widget.tk.call("bind", "all", sequence, "\n".join(kept))
+    widget.deletecommand(funcid)
@@ -0,0 +1,219 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+from utils.tracing import span
+from utils.caching import cache_stats
+
+@dataclass
+class StageTiming:
+    stage : str
+    component : str | None
+    wall : float
+    cpu : float
+    thread : str
+
+def _percentile(sorted_values : List[float], p : float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+class RunReport:
+    """
+    Collects wall and cpu time per stage and per component for a single run,
+    e.g. one click on "Generate". Timings are added through `stage()` while the
+    report is active, see `record_run()`.
+    """
+    def __init__(self, name : str):
+        self.name = name
+        self.started = datetime.now()
+        self.timings : List[StageTiming] = []
+        self.counters : Dict[str, int] = {}
+        self.caches : Dict[str, Dict[str, int]] = {} # Cache hits, misses etc. during the run and size at the end, see `utils.caching`
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, timing : StageTiming):
+        with self._lock:
+            self.timings.append(timing)
+
+    def count(self, name : str, n : int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        walls : Dict[str, List[float]] = {}
+        cpus : Dict[str, float] = {}
+        for t in self.timings:
+            walls.setdefault(t.stage, []).append(t.wall)
+            cpus[t.stage] = cpus.get(t.stage, 0.0) + t.cpu
+
+        summary = {}
+        for stage_name, values in walls.items():
+            values.sort()
+            summary[stage_name] = {
+                "count": len(values),
+                "wall_total": sum(values),
+                "cpu_total": cpus[stage_name],
+                "wall_p50": _percentile(values, 50),
+                "wall_p90": _percentile(values, 90),
+                "wall_p99": _percentile(values, 99),
+                "wall_max": values[-1],
+            }
+        return summary
+
+    def slowest_components(self, n : int = 10) -> List[Dict]:
+        components : Dict[str, Dict] = {}
+        for t in self.timings:
+            if t.component is None:
+                continue
+            entry = components.setdefault(t.component, {"component": t.component, "wall": 0.0, "cpu": 0.0, "stages": {}})
+            entry["wall"] += t.wall
+            entry["cpu"] += t.cpu
+            entry["stages"][t.stage] = entry["stages"].get(t.stage, 0.0) + t.wall
+
+        return sorted(components.values(), key=lambda c: c["wall"], reverse=True)[:n]
+
+    def to_dict(self, slowest : int = 10) -> Dict:
+        return {
+            "name": self.name,
+            "started": self.started.isoformat(timespec="seconds"),
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "stages": self.stage_summary(),
+            "slowest_components": self.slowest_components(slowest),
+            "counters": dict(self.counters),
+            "caches": self.caches,
+        }
+
+    def write(self, file_path : str) -> str:
+        file_path = os.path.normpath(file_path)
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        print(f"Run report saved in {file_path}")
+        return file_path
+
+    def format_summary(self, slowest : int = 10) -> str:
+        """
+        Human readable version of the report, used for displaying the report in the GUI.
+        """
+        lines = [f"Run '{self.name}' started {self.started:%Y-%m-%d %H:%M:%S}"]
+        lines.append(f"Total: {self.wall_time:.2f}s wall | {self.cpu_time:.2f}s cpu")
+        lines.append("")
+        lines.append(f"{'Stage':<18}{'Count':>7}{'Wall':>9}{'CPU':>9}{'p50':>9}{'p90':>9}{'p99':>9}")
+
+        stages = sorted(self.stage_summary().items(), key=lambda kv: kv[1]["wall_total"], reverse=True)
+        for stage_name, s in stages:
+            lines.append(
+                f"{stage_name:<18}{s['count']:>7}{s['wall_total']:>8.2f}s{s['cpu_total']:>8.2f}s"
+                f"{s['wall_p50']:>8.3f}s{s['wall_p90']:>8.3f}s{s['wall_p99']:>8.3f}s"
+            )
+
+        components = self.slowest_components(slowest)
+        if components:
+            lines.append("")
+            lines.append(f"Slowest {len(components)} component(s):")
+            for c in components:
+                lines.append(f"    {c['component']:<12}{c['wall']:>8.2f}s wall {c['cpu']:>8.2f}s cpu")
+
+        if self.counters:
+            lines.append("")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name}: {value}")
+
+        if self.caches:
+            lines.append("")
+            lines.append(f"{'Cache':<32}{'Hits':>8}{'Misses':>8}{'Evicted':>9}{'Size':>7}")
+            for name, s in self.caches.items():
+                lines.append(f"{name:<32}{s['hits']:>8}{s['misses']:>8}{s['evictions'] + s['invalidations']:>9}{s['size']:>7}")
+
+        return "\n".join(lines)
+
+# Report that `stage()` and `count()` record into, None when no run is being recorded
+_active_report : RunReport | None = None
+
+@contextmanager
+def record_run(report : RunReport):
+    """
+    Context manager for recording a run. Every `stage()` entered within the context, on
+    any thread, is added to `report`. Total wall/cpu time of the context is added to the report.
+
+    ## Example
+
+    ```
+    report = RunReport("generate")
+    with record_run(report):
+        with stage("dsl_execute", component="Ge01"):
+            ...
+    report.write("run_report.json")
+    ```
+    """
+    global _active_report
+    previous = _active_report
+    _active_report = report
+
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    start_caches = cache_stats()
+    try:
+        yield report
+    finally:
+        report.wall_time += time.perf_counter() - start_wall
+        report.cpu_time += time.thread_time() - start_cpu
+        report.caches = _cache_stats_since(start_caches)
+        _active_report = previous
+
+_CACHE_COUNTERS = ("hits", "misses", "evictions", "invalidations")
+
+def _cache_stats_since(start : Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, int]]:
+    # Counters of the caches are kept for the whole process, only the part of this run is reported.
+    # Other values such as the size are current.
+    caches = {}
+    for name, stats in cache_stats().items():
+        before = start.get(name, {})
+        caches[name] = {key: value - before.get(key, 0) if key in _CACHE_COUNTERS else value for key, value in stats.items()}
+    return caches
+
+@contextmanager
+def stage(name : str, component : str | None = None):
+    """
+    Time the enclosed block as stage `name`, optionally attributed to a component.
+    The stage is also recorded as a span if tracing is enabled, see `utils.tracing`.
+    Does nothing if no run is being recorded.
+    """
+    report = _active_report
+    with span(name, cat="stage", component=component):
+        if report is None:
+            yield
+            return
+
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            report.add(StageTiming(
+                name,
+                component,
+                time.perf_counter() - start_wall,
+                time.thread_time() - start_cpu,
+                threading.current_thread().name
+            ))
+
+def count(name : str, n : int = 1):
+    """
+    Increment a counter in the active run report, if any.
+    """
+    report = _active_report
+    if report is not None:
+        report.count(name, n)
@@ -0,0 +1,123 @@
+from contextlib import contextmanager
+import cProfile
+from datetime import datetime
+import os
+import re
+import threading
+import tracemalloc
+
+PROFILE_ENV_VAR = "TABLEGEN_PROFILE"
+PROFILES_DIR = "profiles"
+TOP_ALLOCATIONS = 25 # Number of allocation sites written per section
+TRACEBACK_DEPTH = 10 # Frames stored by tracemalloc for each allocation
+
+# Ignore allocations made by the profilers themselves
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, cProfile.__file__),
+]
+
+_enabled = os.environ.get(PROFILE_ENV_VAR, "") not in ("", "0")
+_run_dir : str | None = None
+_local = threading.local()
+_active_lock = threading.Lock() # Held while a section is profiled
+
+def profiling_enabled() -> bool:
+    return _enabled
+
+def set_profiling(enabled : bool):
+    """
+    Enable or disable profiling, can also be enabled by setting the `TABLEGEN_PROFILE`
+    environment variable.
+    """
+    global _enabled
+    _enabled = enabled
+    if not enabled and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def _safe_label(label : str) -> str:
+    return re.sub(r"[^\w.-]+", "_", label).strip("_")
+
+def _output_dir() -> str:
+    global _run_dir
+    if _run_dir is None:
+        _run_dir = os.path.join(PROFILES_DIR, datetime.now().strftime('%Y%m%d_%H%M%S'))
+    os.makedirs(_run_dir, exist_ok=True)
+    return _run_dir
+
+@contextmanager
+def profile_run(name : str, folder : str | None = None):
+    """
+    Group all sections profiled within the context in a timestamped folder,
+    e.g. `profiles/20250101_120000_generate/`, which is returned by the context manager.
+    Pass the folder of an earlier run as `folder` to add more sections to it.
+    Does nothing (and returns None) if profiling is disabled.
+    """
+    global _run_dir
+    if not _enabled:
+        yield None
+        return
+
+    previous = _run_dir
+    if folder is None:
+        folder = os.path.join(PROFILES_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{_safe_label(name)}")
+    _run_dir = folder
+    try:
+        yield folder
+    finally:
+        print(f"Profiles saved in {os.path.normpath(_run_dir)}")
+        _run_dir = previous
+
+@contextmanager
+def profile_section(label : str):
+    """
+    Profile the enclosed block with `cProfile` and `tracemalloc`. Writes `<label>.pstats` and
+    `<label>_alloc.txt` (top allocation sites) to the current profile folder.
+    Sections do not nest, an inner section on the same thread is included in the outer one.
+    Only one section can run at a time (`cProfile` allows a single active profiler from
+    Python 3.12), sections started while another one is running are not profiled. Work done
+    by thread pools is profiled as one section around the pool on the calling thread.
+
+    ## Example
+
+    ```
+    with profile_section("data.xlsx_Ge01"):
+        generate_table(...)
+    ```
+    """
+    if not _enabled or getattr(_local, "active", False) or not _active_lock.acquire(blocking=False):
+        yield
+        return
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEBACK_DEPTH)
+
+    _local.active = True
+    before = tracemalloc.take_snapshot()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        after = tracemalloc.take_snapshot()
+        _local.active = False
+        _active_lock.release()
+        _dump(label, profiler, before, after)
+
+def _dump(label : str, profiler : cProfile.Profile, before : tracemalloc.Snapshot, after : tracemalloc.Snapshot):
+    try:
+        base_path = os.path.join(_output_dir(), _safe_label(label))
+        profiler.dump_stats(f"{base_path}.pstats")
+
+        current, peak = tracemalloc.get_traced_memory()
+        after = after.filter_traces(_SNAPSHOT_FILTERS)
+        before = before.filter_traces(_SNAPSHOT_FILTERS)
+        diff = after.compare_to(before, "lineno")
+        with open(f"{base_path}_alloc.txt", "w", encoding="utf-8") as f:
+            f.write(f"Allocations for '{label}'\n")
+            f.write(f"Traced memory: current {current / 1024**2:.1f} MiB | peak {peak / 1024**2:.1f} MiB\n\n")
+            for stat in diff[:TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+    except OSError as e:
+        print(f"WARNING: Could not write profile for '{label}': {e}")
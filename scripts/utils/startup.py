@@ -0,0 +1,117 @@
+from contextlib import contextmanager
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Callable, Dict, List
+
+STARTUP_REPORT_FILE = "startup_report.json"
+
+# Imported on a background thread once the window is shown, so the generation and sync
+# views open without delay. Heavy third party modules first, then the views using them
+WARM_UP_MODULES = [
+    "pandas",
+    "openpyxl",
+    "docx",
+    "lark",
+    "rapidfuzz",
+    "table_generation.async_table_generator",
+    "word_sync",
+    "generation_gui",
+    "sync_gui",
+]
+
+class StartupTimer:
+    """
+    Records how long the steps of starting the program take, e.g. importing modules
+    or building the window. Times are relative to when this module was imported.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.steps : List[Dict] = []  # {"step", "seconds", "thread"}
+        self.marks : Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, label : str):
+        """
+        Record the time since start, e.g. when the window is first shown.
+        """
+        with self._lock:
+            self.marks[label] = time.perf_counter() - self.start
+
+    @contextmanager
+    def measure(self, step : str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.steps.append({
+                    "step": step, 
+                    "seconds": time.perf_counter() - start, 
+                    "thread": threading.current_thread().name
+                    })
+
+    def import_module(self, name : str) -> ModuleType:
+        """
+        Import a module and record the time it took, if it was not already imported.
+        """
+        # Always imported through the import lock, a module in sys.modules may still be 
+        # initializing on another thread
+        if name in sys.modules:
+            return importlib.import_module(name)
+        with self.measure(f"import {name}"):
+            return importlib.import_module(name)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {"marks": dict(self.marks), "steps": list(self.steps)}
+
+    def format_report(self) -> str:
+        report = self.to_dict()
+        lines = ["Startup report"]
+        for label, seconds in sorted(report["marks"].items(), key=lambda kv: kv[1]):
+            lines.append(f"    {label:<48}{seconds:>8.3f}s after start")
+        lines.append("")
+        for step in sorted(report["steps"], key=lambda s: s["seconds"], reverse=True):
+            lines.append(f"    {step['step']:<48}{step['seconds']:>8.3f}s ({step['thread']})")
+        return "\n".join(lines)
+
+    def write(self, file_path : str = STARTUP_REPORT_FILE) -> str:
+        file_path = os.path.normpath(file_path)
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        print(f"Startup report saved in {file_path}")
+        return file_path
+
+startup_timer = StartupTimer()
+
+def warm_up(modules : List[str] = WARM_UP_MODULES, on_done : Callable[[], None] | None = None) -> threading.Thread:
+    """
+    Import `modules` and build the table DSL parser on a background thread.
+    `on_done` is called on the background thread, it must not touch the GUI.
+    """
+    def run():
+        for name in modules:
+            try:
+                startup_timer.import_module(name)
+            except Exception as e:
+                print(f"WARNING: Could not import {name} during warm-up: {e}")
+
+        try:
+            from table_generation.parser import get_default_parser
+            with startup_timer.measure("build table DSL parser"):
+                get_default_parser()
+        except Exception as e:
+            print(f"WARNING: Could not build parser during warm-up: {e}")
+
+        startup_timer.mark("warm-up done")
+        if on_done:
+            on_done()
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
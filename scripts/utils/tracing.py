@@ -0,0 +1,136 @@
+import atexit
+from datetime import datetime
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+TRACE_ENV_VAR = "TABLEGEN_TRACE"
+TRACES_DIR = "traces"
+
+class Tracer:
+    """
+    Collects spans in the Chrome Trace Event format. The written files can be opened
+    offline in Perfetto (https://ui.perfetto.dev) or chrome://tracing.
+    """
+    def __init__(self):
+        self.events : List[Dict] = []
+        self._named_threads = set()
+        self._lock = threading.Lock()
+
+    def add_complete(self, name : str, cat : str, start_ns : int, end_ns : int, args : Dict):
+        pid = os.getpid()
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": start_ns / 1000, # Trace format uses microseconds
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": pid,
+            "tid": thread.ident,
+        }
+        if args:
+            event["args"] = args
+
+        with self._lock:
+            # Name the thread the first time it is seen so the rows in the viewer are labeled
+            if (pid, thread.ident) not in self._named_threads:
+                self._named_threads.add((pid, thread.ident))
+                self.events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread.ident, "args": {"name": thread.name}})
+            self.events.append(event)
+
+    def flush(self, name : str) -> str | None:
+        """
+        Write all collected events to `traces/trace_<timestamp>_<name>.json` and clear them.
+        Events are not kept per run, spans of a run in the other tab end up in the same file.
+        """
+        with self._lock:
+            events = self.events
+            self.events = []
+            self._named_threads = set()
+
+        if not events:
+            return None
+
+        os.makedirs(TRACES_DIR, exist_ok=True)
+        file_path = os.path.join(TRACES_DIR, f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{name}.json")
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        print(f"Trace saved in {os.path.normpath(file_path)}")
+        return file_path
+
+class _Span:
+    __slots__ = ("tracer", "name", "cat", "args", "start")
+
+    def __init__(self, tracer : Tracer, name : str, cat : str, args : Dict):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.add_complete(self.name, self.cat, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+_tracer : Tracer | None = Tracer() if os.environ.get(TRACE_ENV_VAR, "") not in ("", "0") else None
+
+def tracing_enabled() -> bool:
+    return _tracer is not None
+
+def set_tracing(enabled : bool):
+    """
+    Enable or disable tracing, can also be enabled by setting the `TABLEGEN_TRACE` environment variable.
+    """
+    global _tracer
+    if enabled and _tracer is None:
+        _tracer = Tracer()
+    elif not enabled:
+        _tracer = None
+
+def span(name : str, cat : str = "generation", **args):
+    """
+    Record the enclosed block as a span. When tracing is disabled a shared no-op
+    object is returned, so spans can be left in hot paths.
+
+    ## Example
+
+    ```
+    with span("dsl_execute", component="Ge01"):
+        ...
+    ```
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return _Span(tracer, name, cat, {k: v for k, v in args.items() if v is not None})
+
+def flush_trace(name : str) -> str | None:
+    """
+    Write the spans collected so far to a trace file, if tracing is enabled.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return None
+    try:
+        return tracer.flush(name)
+    except OSError as e:
+        print(f"WARNING: Could not write trace: {e}")
+
+# Spans recorded after the last flush, e.g. when saving, are written on exit
+atexit.register(lambda: flush_trace("exit"))
@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+import openpyxl
+
+from utils.tracing import span
+
+# Sheet names of the FEP list, older workbooks use the second one
+FEP_LIST_SHEETS = ("PSAR SFK FEP list", "SFK FEP list")
+PREFIX_CELL = "B8" # Cell in the FEP list holding the component id prefix of the workbook
+
+def _file_stamp(xls_path : str) -> Tuple[int, int]:
+    stat = os.stat(xls_path)
+    return stat.st_mtime_ns, stat.st_size
+
+def component_prefix(component_id : str) -> str:
+    return component_id[0]
+
+def read_workbook_prefix(xls_path : str) -> str | None:
+    """
+    Read the component id prefix of a workbook, e.g. "G" for a workbook containing Ge01, Ge02 etc.
+    """
+    with span("read_workbook_prefix", workbook=os.path.basename(xls_path)):
+        wb = openpyxl.load_workbook(xls_path, data_only=True, read_only=True)
+        try:
+            for sheet_name in FEP_LIST_SHEETS:
+                if sheet_name in wb.sheetnames:
+                    return wb[sheet_name][PREFIX_CELL].value
+            return None
+        finally:
+            wb.close() # Read only workbooks keep the file open until closed
+
+class WorkbookRegistry:
+    """
+    Maps component id prefixes to the workbook containing the components. The prefix of each
+    workbook is read once and reread only if the file changes on disk (modification time or size).
+
+    ## Example
+
+    ```
+    index = workbook_registry.index(xls_paths)
+    xls_path = index.get(component_prefix("Ge01"))
+    ```
+    """
+    def __init__(self):
+        self._prefixes : Dict[str, Tuple[Tuple[int, int], str | None]] = {} # path -> (file stamp, prefix)
+        self._lock = threading.Lock()
+
+    def update(self, xls_paths : Iterable[str]):
+        """
+        Read the prefixes of new or changed workbooks, in parallel.
+        """
+        stale = []
+        for pth in dict.fromkeys(xls_paths):
+            try:
+                stamp = _file_stamp(pth)
+            except OSError as e:
+                print(f"WARNING: Could not read {pth}: {e}")
+                continue
+            with self._lock:
+                entry = self._prefixes.get(pth)
+            if entry is None or entry[0] != stamp:
+                stale.append((pth, stamp))
+
+        if not stale:
+            return
+
+        def read(item : Tuple[str, Tuple[int, int]]):
+            pth, stamp = item
+            try:
+                return pth, stamp, read_workbook_prefix(pth)
+            except Exception as e:
+                print(f"WARNING: Could not read prefix of {pth}: {e}")
+                return pth, stamp, None
+
+        with ThreadPoolExecutor(max_workers=min(len(stale), os.cpu_count() or 1)) as executor:
+            results = list(executor.map(read, stale))
+
+        with self._lock:
+            for pth, stamp, prefix in results:
+                self._prefixes[pth] = (stamp, prefix)
+
+    def index(self, xls_paths : Iterable[str]) -> Dict[str, str]:
+        """
+        Dictionary from prefix to workbook path for the given workbooks. If several workbooks have
+        the same prefix the first one is used, and a warning is printed.
+        """
+        xls_paths = list(dict.fromkeys(xls_paths))
+        self.update(xls_paths)
+
+        index = {}
+        for prefix, paths in self._paths_by_prefix(xls_paths).items():
+            if len(paths) > 1:
+                print(f"WARNING: Prefix '{prefix}' is used by several workbooks, using {paths[0]}. Also found in: {', '.join(paths[1:])}")
+            index[prefix] = paths[0]
+        return index
+
+    def conflicts(self, xls_paths : Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Prefixes used by more than one of the given workbooks.
+        """
+        xls_paths = list(dict.fromkeys(xls_paths))
+        self.update(xls_paths)
+        return {prefix: paths for prefix, paths in self._paths_by_prefix(xls_paths).items() if len(paths) > 1}
+
+    def lookup(self, component_id : str, xls_paths : Iterable[str]) -> str | None:
+        return self.index(xls_paths).get(component_prefix(component_id))
+
+    def invalidate(self, xls_path : str | None = None):
+        """
+        Forget the prefix of a workbook, or of all workbooks if no path is given.
+        """
+        with self._lock:
+            if xls_path is None:
+                self._prefixes.clear()
+            else:
+                self._prefixes.pop(xls_path, None)
+
+    def _paths_by_prefix(self, xls_paths : List[str]) -> Dict[str, List[str]]:
+        paths_by_prefix : Dict[str, List[str]] = {}
+        with self._lock:
+            for pth in xls_paths:
+                entry = self._prefixes.get(pth)
+                if entry is not None and entry[1] is not None:
+                    paths_by_prefix.setdefault(entry[1], []).append(pth)
+        return paths_by_prefix
+
+# Shared by the table generator and the syncer, so each workbook is only read once per session
+workbook_registry = WorkbookRegistry()
@@ -1,17 +1,20 @@
-from functools import cache
 from typing import List, Dict, Iterable
 
-import openpyxl
 import pandas as pd
 
 from table_generation import Component
 from utils.dataframes import make_first_row_headers
-from utils.caching import cache_on_attr
-from utils.files import ExcelFileManager
+from utils.caching import per_object_cache
+from utils.files import ExcelFileManager, excel_handle_pool
+from utils.instrumentation import stage
+from utils.workbook_registry import workbook_registry
 
-@cache
 def parse_excel_cached(xls_path : str) -> ExcelFileManager:
-    return ExcelFileManager(xls_path)
+    """
+    Open a workbook, reusing it if it was opened earlier and has not changed on disk.
+    See `files.ExcelHandlePool.shared`.
+    """
+    return excel_handle_pool.shared(xls_path)
 
 def get_description(file_manager : ExcelFileManager, component_id : str) -> str:
     ws = file_manager.wb[component_id]
@@ -20,7 +23,13 @@ def get_description(file_manager : ExcelFileManager, component_id : str) -> str:
 def set_description(file_manager : ExcelFileManager, component_id : str, description : str):
     file_manager.write(component_id, "C14", description)
 
+# Parsed once per workbook, the FEP list is read for every component
+@per_object_cache(name="fep_list")
 def get_filtered_by_id(file_manager : ExcelFileManager, prefix="") -> pd.DataFrame:
+    with stage("fep_list_parse"):
+        return _get_filtered_by_id(file_manager, prefix)
+
+def _get_filtered_by_id(file_manager : ExcelFileManager, prefix="") -> pd.DataFrame:
     # Get main sheet
     xls = file_manager.xls
     try:
@@ -96,18 +105,9 @@ def parse_variables(file_manager : ExcelFileManager) -> Dict[str, str]:
 
     return variables
 
-@cache
-def _xls_matches_prefix(prefix: str, xls_file_path : str) -> bool:
-    wb = openpyxl.load_workbook(xls_file_path, data_only=True, read_only=True)
-    try:
-        ws = wb["PSAR SFK FEP list"]
-    except:
-        ws = wb["SFK FEP list"]
-    return ws["B8"].value == prefix
-
 def get_xls_from_component_id(component_id : str, xls_files : Iterable[str]) -> str | None: 
-    process_prefix = component_id[0]
-
-    for pth in xls_files:
-        if _xls_matches_prefix(process_prefix, pth):
-            return pth
\ No newline at end of file
+    """
+    Find the workbook containing a component. When looking up many components, use 
+    `workbook_registry.index` once instead.
+    """
+    return workbook_registry.lookup(component_id, xls_files)
\ No newline at end of file
@@ -1,4 +1,5 @@
-from typing import cast, Union, Dict, Iterable, Tuple
+import copy
+from typing import cast, Union, Dict, Iterable, List, Tuple
 
 import docx.document
 from docx.oxml import OxmlElement
@@ -27,25 +28,23 @@ def insert_table_after(rows : int, cols : int, insert_after) -> Table:
 
     # Add table grid (optional)
     tblGrid = OxmlElement('w:tblGrid')
+    gridCol = OxmlElement('w:gridCol')
     for _ in range(cols):
-        gridCol = OxmlElement('w:gridCol')
-        tblGrid.append(gridCol)
+        tblGrid.append(copy.deepcopy(gridCol))
     tbl.append(tblGrid)
 
-    # Add rows
+    # Add rows, copies of a single row since building each element with `OxmlElement` is slow
+    tc = OxmlElement('w:tc')
+    tc.append(OxmlElement('w:p'))
+    tr = OxmlElement('w:tr')
+    for _ in range(cols):
+        tr.append(copy.deepcopy(tc))
     for _ in range(rows):
-        tr = OxmlElement('w:tr')
-        for _ in range(cols):
-            tc = OxmlElement('w:tc')
-            p = OxmlElement('w:p')
-            tc.append(p)
-            tr.append(tc)
-        tbl.append(tr)
-
-    # Insert into document
-    parent = insert_after._element.getparent()
-    index = parent.index(insert_after._element)
-    parent.insert(index + 1, tbl)
+        tbl.append(copy.deepcopy(tr))
+
+    # Insert into document, linked in right after `insert_after` without looking up its index
+    # in the body, which is a scan over all preceding elements
+    insert_after._element.addnext(tbl)
     tbl = cast(CT_Tbl, tbl)
     return Table(tbl, insert_after._parent)
 
@@ -219,17 +218,64 @@ def _iter_block_items(parent):
         elif child.tag.endswith('}tbl'):  # Table
             yield Table(child, parent)
 
+def get_table_after_paragraph(paragraph):
+    """
+    The `w:tbl` element immediately following the given paragraph, or None if the very next 
+    block item is not a table.
+    """
+    next_element = paragraph._element.getnext()
+    if next_element is not None and next_element.tag.endswith('tbl'):
+        return next_element
+    return None
+
 def remove_table_after_paragraph(paragraph):
     """
     Removes the table immediately following the given paragraph,
     if and only if the very next block item is a table.
     """
-    p_element = paragraph._element
-    next_element = p_element.getnext()
+    tbl = get_table_after_paragraph(paragraph)
 
-    if next_element is not None and next_element.tag.endswith('tbl'):
-        parent = next_element.getparent()
-        parent.remove(next_element)
+    if tbl is not None:
+        parent = tbl.getparent()
+        parent.remove(tbl)
         return True  # Removed
     
     return False  # Nothing removed
+
+TableLayout = List[List[Tuple[int, int, str, str]]]
+
+def normalize_cell_text(text : str) -> str:
+    # Line breaks, tabs and repeated spaces are not compared
+    return " ".join(text.split())
+
+def _cell_text(tc) -> str:
+    parts = []
+    for el in tc.iter(qn('w:t'), qn('w:br'), qn('w:cr'), qn('w:tab')):
+        parts.append((el.text or "") if el.tag == qn('w:t') else " ")
+    return normalize_cell_text("".join(parts))
+
+def read_table_layout(tbl) -> TableLayout:
+    """
+    Rows of `(column, column span, vertical merge, text)` for each cell of a `w:tbl` element, where
+    vertical merge is "restart", "continue" or "". The text is normalized with `normalize_cell_text`
+    and empty for cells continuing a vertical merge. Reads the XML directly, without python-docx objects.
+    """
+    rows = []
+    for tr in tbl.iterchildren(qn('w:tr')):
+        row = []
+        col = 0
+        for tc in tr.iterchildren(qn('w:tc')):
+            colspan = 1
+            v_merge = ""
+            tcPr = tc.find(qn('w:tcPr'))
+            if tcPr is not None:
+                grid_span = tcPr.find(qn('w:gridSpan'))
+                if grid_span is not None:
+                    colspan = int(grid_span.get(qn('w:val'), 1))
+                v_merge_el = tcPr.find(qn('w:vMerge'))
+                if v_merge_el is not None:
+                    v_merge = "restart" if v_merge_el.get(qn('w:val')) == "restart" else "continue"
+            row.append((col, colspan, v_merge, "" if v_merge == "continue" else _cell_text(tc)))
+            col += colspan
+        rows.append(row)
+    return rows
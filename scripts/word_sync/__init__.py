@@ -1,3 +1,5 @@
 from .sync_files import WordExcelSyncer
+from .sync_worker import SyncWorker
+from .auto_resolve import AutoResolver
 
-__all__ = ["WordExcelSyncer"]
\ No newline at end of file
+__all__ = ["WordExcelSyncer", "SyncWorker", "AutoResolver"]
\ No newline at end of file
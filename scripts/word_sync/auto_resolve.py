@@ -0,0 +1,204 @@
+import csv
+from dataclasses import dataclass, fields
+import json
+import os
+import re
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from .sync_files import Mismatch, WordExcelSyncer, CHOICES, normalize_description
+
+_QUOTES = str.maketrans({
+    "‘": "'", "’": "'", "‚": "'", "′": "'",
+    "“": '"', "”": '"', "„": '"', "″": '"',
+})
+
+# Kinds of differences a rule can ignore, each maps a text to a form where that kind of difference is gone
+DIFFERENCE_KINDS : Dict[str, Callable[[str], str]] = {
+    "whitespace": lambda s: re.sub(r"\s+", " ", normalize_description(s)),
+    "case": str.casefold,
+    "quotes": lambda s: s.translate(_QUOTES),
+    "trailing_period": lambda s: s.rstrip().rstrip("."),
+}
+
+def equal_ignoring(a : str, b : str, kinds : Iterable[str]) -> bool:
+    """
+    Check if two texts are equal when the given kinds of differences are ignored,
+    see `DIFFERENCE_KINDS`.
+    """
+    for kind in kinds:
+        normalize = DIFFERENCE_KINDS[kind]
+        a, b = normalize(a), normalize(b)
+    return a == b
+
+@dataclass
+class Rule:
+    """
+    Choice made automatically for every mismatch matching all set conditions.
+
+    ### Parameters
+    choice : choice to apply, see `sync_files.CHOICES` \n
+    mismatch_type : only match "mapping" or "description" mismatches, None matches both \n
+    min_similarity : only match mismatches at least this similar (0-100) \n
+    ignore : only match if the texts are equal when ignoring these kinds of differences, see `DIFFERENCE_KINDS` \n
+    name : shown in the log when the rule is used
+    """
+    choice : str
+    mismatch_type : str | None = None
+    min_similarity : float | None = None
+    ignore : Tuple[str, ...] = ()
+    name : str = ""
+
+    def __post_init__(self):
+        self.ignore = tuple(self.ignore)
+        for kind in self.ignore:
+            if kind not in DIFFERENCE_KINDS:
+                raise ValueError(f"Unknown difference '{kind}' in rule '{self.name}', expected one of {list(DIFFERENCE_KINDS)}")
+        if self.mismatch_type is not None and self.mismatch_type not in tuple(CHOICES):
+            raise ValueError(f"Unknown mismatch type '{self.mismatch_type}' in rule '{self.name}', expected one of {list(CHOICES)} or null")
+        types = [self.mismatch_type] if self.mismatch_type is not None else list(CHOICES)
+        for mismatch_type in types:
+            if self.choice not in CHOICES[mismatch_type]:
+                raise ValueError(f"Invalid choice '{self.choice}' for {mismatch_type} mismatches in rule '{self.name}'")
+
+    def matches(self, mismatch : Mismatch) -> bool:
+        if self.mismatch_type is not None and mismatch.mismatch_type != self.mismatch_type:
+            return False
+        if self.min_similarity is not None and mismatch.similarity < self.min_similarity:
+            return False
+        if self.ignore and not equal_ignoring(mismatch.in_word, mismatch.in_excel, self.ignore):
+            return False
+        return True
+
+@dataclass
+class Decision:
+    """
+    Choice recorded for a single component, e.g. from the previous sync.
+    `component` is either the component id or the component name in the document.
+    """
+    process_type : str
+    component : str
+    choice : str
+    mismatch_type : str = "description"
+
+class AutoResolver:
+    """
+    Decides mismatches without asking the user. Recorded decisions are used first,
+    then the first matching rule.
+
+    ## Example
+
+    ```
+    resolver = AutoResolver.from_files("config/sync_rules.json", "decisions.csv")
+    remaining = resolver.resolve(syncer, syncer.scan(doc_path, xls_paths).mismatches)
+    ```
+    """
+    def __init__(self, rules : Iterable[Rule] = (), decisions : Iterable[Decision] = ()):
+        self.rules = list(rules)
+        self.decisions : Dict[Tuple[str, str, str], Decision] = {}
+        for decision in decisions:
+            if decision.choice not in CHOICES[decision.mismatch_type]:
+                raise ValueError(f"Invalid choice '{decision.choice}' for {decision.process_type} - {decision.component}")
+            self.decisions[(decision.mismatch_type, decision.process_type.strip(), decision.component.strip())] = decision
+        self.num_resolved = 0
+
+    @classmethod
+    def from_files(cls, rules_path : str | None = None, decisions_path : str | None = None) -> 'AutoResolver':
+        rules = load_rules(rules_path) if rules_path else []
+        decisions = load_decisions(decisions_path) if decisions_path else []
+        return cls(rules, decisions)
+
+    def __bool__(self) -> bool:
+        return bool(self.rules or self.decisions)
+
+    def decide(self, mismatch : Mismatch) -> Tuple[str, str] | None:
+        """
+        Returns the `(choice, reason)` for a mismatch, or None if it has to be decided by the user.
+        """
+        process_type = mismatch.process_type.strip()
+        for component in (mismatch.component_id, mismatch.component_name):
+            if component is None:
+                continue
+            decision = self.decisions.get((mismatch.mismatch_type, process_type, component.strip()))
+            if decision is not None:
+                return decision.choice, "decisions file"
+
+        for rule in self.rules:
+            if rule.matches(mismatch):
+                return rule.choice, f"rule '{rule.name}'" if rule.name else "rule"
+        return None
+
+    def resolve(self, syncer : WordExcelSyncer, mismatches : Iterable[Mismatch]) -> List[Mismatch]:
+        """
+        Apply the choices for all mismatches that can be decided automatically.
+        Returns the mismatches that are left for the user.
+        """
+        return [m for m in mismatches if m.decision is None and not self.apply(syncer, m)]
+
+    def apply(self, syncer : WordExcelSyncer, mismatch : Mismatch) -> bool:
+        decided = self.decide(mismatch)
+        if decided is None:
+            return False
+
+        choice, reason = decided
+        print(f"Auto-resolved {mismatch.header} with '{choice}' ({reason})")
+        syncer.apply(mismatch, choice)
+        self.num_resolved += 1
+        return True
+
+def load_rules(file_path : str) -> List[Rule]:
+    """
+    Load rules from a JSON file of the form `{"rules": [{"name": ..., "choice": ..., ...}]}`,
+    with the same keys as `Rule`.
+    """
+    with open(file_path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    if not isinstance(data, dict) or not isinstance(data.get("rules", []), list):
+        raise ValueError(f"{file_path} must contain an object with a list of rules, e.g. {{\"rules\": [...]}}")
+
+    keys = {field.name for field in fields(Rule)}
+    rules = []
+    for i, rule in enumerate(data.get("rules", [])):
+        if not isinstance(rule, dict):
+            raise ValueError(f"Rule {i} in {file_path} must be an object, found {rule!r}")
+        if unknown := [k for k in rule if k not in keys]:
+            raise ValueError(f"Unknown key(s) {unknown} in rule {i} of {file_path}, expected {sorted(keys)}")
+        if "choice" not in rule:
+            raise ValueError(f"Rule {i} in {file_path} has no 'choice'")
+        for key in ("choice", "mismatch_type", "name"):
+            if rule.get(key) is not None and not isinstance(rule[key], str):
+                raise ValueError(f"'{key}' in rule {i} of {file_path} must be a string")
+        if not isinstance(rule.get("ignore", []), list) or not all(isinstance(kind, str) for kind in rule.get("ignore", [])):
+            raise ValueError(f"'ignore' in rule {i} of {file_path} must be a list of strings")
+        if not isinstance(rule.get("min_similarity", 0), (int, float)) and rule.get("min_similarity") is not None:
+            raise ValueError(f"'min_similarity' in rule {i} of {file_path} must be a number")
+        try:
+            rules.append(Rule(**rule))
+        except ValueError as e:
+            raise ValueError(f"Rule {i} in {file_path}: {e}") from e
+    return rules
+
+def load_decisions(file_path : str) -> List[Decision]:
+    """
+    Load recorded decisions from a CSV file with the columns `process_type`, `component`, `choice`
+    and optionally `mismatch_type`, or a JSON file containing a list of objects with the same keys.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".json":
+        with open(file_path, encoding="utf-8") as f:
+            rows = json.load(f)
+    elif ext == ".csv":
+        with open(file_path, encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        raise ValueError(f"Decisions file must be .csv or .json, found {file_path}")
+
+    return [
+        Decision(
+            row["process_type"],
+            row["component"],
+            row["choice"].strip(),
+            (row.get("mismatch_type") or "description").strip()
+            )
+        for row in rows
+        ]
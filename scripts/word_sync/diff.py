@@ -0,0 +1,69 @@
+from typing import List, Tuple
+
+from rapidfuzz.distance import Indel
+
+# A run of words present in both texts, or a (in a, in b) pair of differing runs where
+# a side is None if the words were only inserted in the other text
+DiffPart = str | Tuple[str | None, str | None]
+
+MAX_DIFF_WORDS = 20_000 # Longer middle sections (after trimming common words) are shown as one change
+
+def _join(words : List[str]) -> str | None:
+    return " ".join(words) if words else None
+
+def diff_words(a : str, b : str) -> List[DiffPart]:
+    """
+    Word level diff of two texts, based on the longest common subsequence of words,
+    so an inserted word only marks that word as different.
+
+    ## Example
+
+    ```
+    >>> diff_words("the quick fox", "the very quick dog")
+    ['the', (None, 'very'), 'quick', ('fox', 'dog')]
+    ```
+    """
+    words_a = a.split()
+    words_b = b.split()
+
+    # Fast path, descriptions mostly differ in a few words so the common start and end are trimmed first
+    prefix = 0
+    max_prefix = min(len(words_a), len(words_b))
+    while prefix < max_prefix and words_a[prefix] == words_b[prefix]:
+        prefix += 1
+
+    suffix = 0
+    max_suffix = max_prefix - prefix
+    while suffix < max_suffix and words_a[-1 - suffix] == words_b[-1 - suffix]:
+        suffix += 1
+
+    middle_a = words_a[prefix:len(words_a) - suffix]
+    middle_b = words_b[prefix:len(words_b) - suffix]
+
+    result : List[DiffPart] = []
+    if prefix:
+        result.append(" ".join(words_a[:prefix]))
+
+    if not middle_a and not middle_b:
+        pass
+    elif not middle_a or not middle_b or len(middle_a) + len(middle_b) > MAX_DIFF_WORDS:
+        result.append((_join(middle_a), _join(middle_b)))
+    else:
+        changed_a : List[str] = []
+        changed_b : List[str] = []
+        for op in Indel.opcodes(middle_a, middle_b):
+            if op.tag == "equal":
+                # Adjacent deletes and inserts are shown as one replaced run
+                if changed_a or changed_b:
+                    result.append((_join(changed_a), _join(changed_b)))
+                    changed_a, changed_b = [], []
+                result.append(" ".join(middle_a[op.src_start:op.src_end]))
+            else:
+                changed_a.extend(middle_a[op.src_start:op.src_end])
+                changed_b.extend(middle_b[op.dest_start:op.dest_end])
+        if changed_a or changed_b:
+            result.append((_join(changed_a), _join(changed_b)))
+
+    if suffix:
+        result.append(" ".join(words_a[len(words_a) - suffix:]))
+    return result
@@ -1,20 +1,28 @@
-from typing import List, Iterator, Generator, Dict
-from dataclasses import dataclass
+import os
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Iterator, Generator, Dict, Iterable, Tuple, Callable
+from dataclasses import dataclass, field
 
 import docx.document
 from docx.table import Table
+import numpy as np
 from rapidfuzz import process, fuzz
 
 from .heading_tree import HeadingTree, build_heading_tree
+from .diff import DiffPart, diff_words
 from table_generation import Component
 from utils.xls_parsing import (
     get_description,
     set_description, 
-    get_xls_from_component_id,
     get_component_by_id
     )
 from utils.files import WordFileManager, ExcelFileManager
+from utils.workbook_registry import workbook_registry, component_prefix
 from utils.xml import insert_paragraph_after, parse_mappings, get_mapping_tables
+from utils.profiling import profile_run, profile_section
+from utils.tracing import span, flush_trace
 
 def get_descriptions(doc : docx.document.Document) -> Iterator[HeadingTree]:
     root = build_heading_tree(doc)
@@ -30,6 +38,32 @@ def _replace_table_value(tbl : Table, s : str, replacement : str, col : int):
             cell.text = replacement
             return
 
+def normalize_description(text : str) -> str:
+    """
+    Normalize differences that are not visible in the document: unicode composition,
+    line endings, non-breaking spaces and surrounding whitespace.
+    """
+    text = unicodedata.normalize("NFC", text)
+    text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\xa0", " ")
+    return text.strip()
+
+NUM_MAPPING_CANDIDATES = 3 # Number of ranked candidates kept for each unmapped heading
+
+# Valid choices per mismatch type, an empty string is treated as skip
+CHOICES = {
+    "mapping": ("w", "t", "s", ""),
+    "description": ("w", "e", "s", ""),
+}
+
+class SyncStopped(Exception):
+    """
+    Raised by `WordExcelSyncer.scan` when its stop event is set.
+    """
+
+def _check_stopped(stop : threading.Event | None):
+    if stop is not None and stop.is_set():
+        raise SyncStopped()
+
 @dataclass
 class Mismatch:
     mismatch_type : str
@@ -37,6 +71,89 @@ class Mismatch:
     header : str
     in_word : str
     in_excel : str
+    # Ranked (value, similarity) alternatives, best first. Only used for mapping mismatches
+    candidates : List[Tuple[str, float]] = field(default_factory=list)
+    process_type : str = ""
+    component_id : str | None = None
+    component_name : str = "" # Component name in the document
+    # Mapping mismatch that has to be resolved before this mismatch can be applied
+    depends_on : 'Mismatch | None' = field(default=None, repr=False, compare=False)
+    # Choice applied to this mismatch, None while unresolved
+    decision : str | None = None
+    # Word diff between `in_word` and `in_excel`, see `diff.diff_words`
+    diff : List[DiffPart] = field(default_factory=list, repr=False, compare=False)
+    _apply : Callable[[str], None] | None = field(default=None, repr=False, compare=False)
+
+class SyncScan:
+    """
+    Result of `WordExcelSyncer.scan`, containing every mismatch found between the word
+    document and the excel files. Mapping mismatches come first, followed by description
+    mismatches in document order.
+    """
+    def __init__(self, mismatches : List[Mismatch], skipped : Dict[str, int] | None = None):
+        self.mismatches = mismatches
+        # Number of descriptions that were not reported, by reason ("identical", "normalized")
+        self.skipped = skipped if skipped is not None else {}
+
+    def __len__(self) -> int:
+        return len(self.mismatches)
+
+    def __iter__(self) -> Iterator[Mismatch]:
+        return iter(self.mismatches)
+
+    def filter(
+            self, 
+            mismatch_type : str | None = None, 
+            max_similarity : float | None = None, 
+            process_type : str | None = None,
+            unresolved : bool = False
+            ) -> List[Mismatch]:
+        return [
+            m for m in self.mismatches
+            if (mismatch_type is None or m.mismatch_type == mismatch_type)
+            and (max_similarity is None or m.similarity <= max_similarity)
+            and (process_type is None or m.process_type == process_type)
+            and (not unresolved or m.decision is None)
+        ]
+
+    def sorted_by_similarity(self) -> List[Mismatch]:
+        """
+        Mismatches ordered from least to most similar, mapping mismatches still come before 
+        the descriptions that depend on them.
+        """
+        return sorted(self.mismatches, key=lambda m: (m.mismatch_type != "mapping", m.similarity))
+
+def rank_mapping_candidates(
+        mappings : Dict[str, Dict[str, str]], 
+        unmapped : Iterable[Tuple[str, str]], 
+        k : int = NUM_MAPPING_CANDIDATES
+        ) -> Dict[Tuple[str, str], List[Tuple[str, float]]]:
+    """
+    Score all unmapped `(process_type, component_name)` pairs against the keys of the
+    corresponding mapping table in one batch.
+
+    ### Returns
+    Dictionary from `(process_type, component_name)` to the `k` best `(mapping key, similarity)` pairs, best first.
+    """
+    # Dictionaries used as ordered sets to drop duplicate headings
+    names_by_process : Dict[str, Dict[str, None]] = {}
+    for process_type, component_name in unmapped:
+        names_by_process.setdefault(process_type, {})[component_name] = None
+
+    ranked = {}
+    for process_type, unique_names in names_by_process.items():
+        names = list(unique_names)
+        choices = list(mappings[process_type].keys())
+        if not choices:
+            continue
+
+        # Similarity matrix of shape (len(names), len(choices)), scored on all cores
+        scores = process.cdist(names, choices, scorer=fuzz.ratio, workers=-1)
+        top_k = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+
+        for name, row, indices in zip(names, scores, top_k):
+            ranked[(process_type, name)] = [(choices[j], float(row[j])) for j in indices]
+    return ranked
 
 class _WordDescription:
     def __init__(self, node : HeadingTree):
@@ -44,6 +161,12 @@ class _WordDescription:
         self.process_type = self.node.get_parent_heading_absolute(1).text.strip() #type: ignore Top level heading is process type
         self.component_name = self.node.get_parent_heading_relative(1).text.strip() #type: ignore One step above is component name
 
+    def description_text(self) -> str:
+        """
+        Text of the description, or an empty string if there is no paragraph for it. Does not modify the document.
+        """
+        return self.node.paragraphs[0].text if len(self.node.paragraphs) > 0 else ""
+
     def description_paragraph(self):
         if len(self.node.paragraphs) > 0:
             # If there exist a description or a placeholder for it, return the paragraph
@@ -63,132 +186,304 @@ class WordExcelSyncer:
         self._process_to_xls_path = {}
         self._xls_managers = {}
         self._word_manager = None
+        self._profile_dir : str | None = None # Profiles of the last scan, the save is added to them
+        self._waiting : Dict[int, List[Tuple[Mismatch, str]]] = {} # Decisions waiting for a mapping to be resolved
 
     def sync_files(self, doc_path : str, xls_file_paths : List[str], progress_var=None) -> Generator[Mismatch, str, None]:
         """
         Sync descriptions between a word document and excel file. Also allows syncing of
         mismatched component names in headers. 
+
+        Scans the files up front, see `scan`, then yields the mismatches one at a time and
+        applies the choice sent back for each.
         """
-        self._word_manager = WordFileManager(doc_path)
-        mappings = parse_mappings(self._word_manager.doc)
-        mapping_tables = {h.text.strip() : tbl for h, tbl in get_mapping_tables(self._word_manager.doc)}
+        sync_scan = self.scan(doc_path, xls_file_paths)
+        num_mismatches = len(sync_scan)
+
+        for i, mismatch in enumerate(sync_scan):
+            # Descriptions of headings whose mapping was skipped can not be synced
+            if mismatch.depends_on is None or mismatch.depends_on.decision not in ("s", ""):
+                while not self.apply(mismatch, (yield mismatch)):
+                    pass # Unknown command, ask again
+
+            if progress_var:
+                progress_var.set((i+1) / num_mismatches)
+
+    def scan(
+            self, 
+            doc_path : str, 
+            xls_file_paths : List[str], 
+            on_progress : Callable[[float], None] | None = None,
+            on_mismatch : Callable[[Mismatch], None] | None = None,
+            stop : threading.Event | None = None
+            ) -> SyncScan:
+        """
+        Find all mismatches between a word document and excel files without modifying either.
+        Referenced workbooks are loaded in parallel and all description similarities are scored
+        in one batch. Use `apply` to execute a choice for a mismatch.
+
+        ### Parameters
+        on_progress : optional callback receiving the scan progress (0-1) \n
+        on_mismatch : optional callback receiving each mismatch as soon as it is found, 
+        mapping mismatches are found before any workbook is loaded \n
+        stop : optional event, checked between workbooks and descriptions. `SyncStopped` is raised
+        once it is set, workbooks that were already opened stay open until `close`
+        """
+        try:
+            with profile_run("sync") as self._profile_dir, span("sync_scan", cat="sync"):
+                return self._scan(doc_path, xls_file_paths, on_progress, on_mismatch, stop)
+        finally:
+            flush_trace("sync")
+
+    def _scan(
+            self, 
+            doc_path : str, 
+            xls_file_paths : List[str], 
+            on_progress : Callable[[float], None] | None = None,
+            on_mismatch : Callable[[Mismatch], None] | None = None,
+            stop : threading.Event | None = None
+            ) -> SyncScan:
+        with profile_section(f"sync_{os.path.basename(doc_path)}_parse"), span("sync_parse_document", cat="sync"):
+            self._word_manager = WordFileManager(doc_path)
+            mappings = parse_mappings(self._word_manager.doc)
+            mapping_tables = {h.text.strip() : tbl for h, tbl in get_mapping_tables(self._word_manager.doc)}
+            descriptions = [_WordDescription(desc) for desc in get_descriptions(self._word_manager.doc)]
         print(mapping_tables)
-        descriptions = list(get_descriptions(self._word_manager.doc))
-        num_descriptions = len(descriptions)
 
-        for i, desc in enumerate(descriptions):
-            description = _WordDescription(desc)
+        # Rank candidates for all unmapped headings in one batch
+        unmapped = [
+            (d.process_type, d.component_name) for d in descriptions 
+            if d.process_type in mappings and d.component_name not in mappings[d.process_type]
+            ]
+        mapping_candidates = rank_mapping_candidates(mappings, unmapped)
 
+        # Resolve component ids, using the best candidate for unmapped headings
+        mapping_mismatches = []
+        resolved : List[Tuple[_WordDescription, str, Mismatch | None]] = []
+        for description in descriptions:
+            _check_stopped(stop)
             try:
                 components =  mappings[description.process_type]
             except KeyError:
                 print(f"WARNING: Missing mapping for '{description.process_type}', malformed mapping table?")
-                if progress_var:
-                    progress_var.set((i+1) / num_descriptions)
                 continue # Trying to find a component id for non-process-type, skip iteration
 
-            try:
+            mapping_mismatch = None
+            if description.component_name in components:
                 component_id = components[description.component_name]
-            except KeyError:
-                component_id = yield from self._resolve_mapping_mismatch(mappings, mapping_tables, description)
+            else:
+                candidates = mapping_candidates.get((description.process_type, description.component_name), [])
+                if not candidates:
+                    continue # Empty mapping table, nothing to match against
 
-                if not component_id:
-                    if progress_var:
-                        progress_var.set((i+1) / num_descriptions)
-                    continue # Trying to find a component id for non-process-type, skip iteration
+                mapping_mismatch = self._mapping_mismatch(mappings, mapping_tables, description, candidates)
+                mapping_mismatches.append(mapping_mismatch)
+                component_id = mapping_mismatch.component_id
+                if on_mismatch:
+                    on_mismatch(mapping_mismatch)
 
-            xls_path = get_xls_from_component_id(component_id, xls_file_paths)
+            resolved.append((description, component_id, mapping_mismatch)) #type: ignore
+
+        # Load all referenced workbooks in parallel
+        xls_index = workbook_registry.index(xls_file_paths)
+        xls_paths = {component_id: xls_index.get(component_prefix(component_id)) for _, component_id, _ in resolved}
+        self._load_excel_files([pth for pth in xls_paths.values() if pth is not None], on_progress, stop)
+
+        # Read word and excel descriptions, descriptions that are already in sync are dropped here
+        pending = []
+        skipped = {"identical": 0, "normalized": 0}
+        for description, component_id, mapping_mismatch in resolved:
+            _check_stopped(stop)
+            xls_path = xls_paths[component_id]
             if xls_path is None:
                 print(f"Could not find excel file for {component_id}")
-                if progress_var:
-                    progress_var.set((i+1) / num_descriptions)
                 continue # Skip iteration if no matching xls file is found
-            
-            xls_manager = self._parse_excel(xls_path)
 
             try:
-                component = get_component_by_id(xls_manager, component_id)
-                yield from self._set_descriptions(description, component, xls_manager)
+                with span("sync_load_component", cat="sync", component=component_id):
+                    xls_manager = self._xls_managers[xls_path]
+                    component = get_component_by_id(xls_manager, component_id)
             except ValueError:
                 print(f"Could not parse component for {component_id}")
+                continue
 
-            if progress_var:
-                progress_var.set((i+1) / num_descriptions)
+            excel_description = get_description(xls_manager, component.id)
+
+            word_text, excel_text = description.description_text(), excel_description or ""
+            if word_text == excel_text:
+                skipped["identical"] += 1
+                continue
+            if normalize_description(word_text) == normalize_description(excel_text):
+                skipped["normalized"] += 1
+                continue
+            pending.append((description, component, xls_manager, word_text, excel_description, mapping_mismatch))
+
+        # Score all descriptions in one batch
+        _check_stopped(stop)
+        with span("sync_score_descriptions", cat="sync"):
+            similarities = process.cpdist(
+                [p[3] for p in pending], 
+                [p[4] or "" for p in pending], 
+                scorer=fuzz.ratio, 
+                workers=-1
+                ) if pending else []
+
+        description_mismatches = [
+            self._description_mismatch(description, component, xls_manager, word_text, excel_description, float(similarity), mapping_mismatch)
+            for (description, component, xls_manager, word_text, excel_description, mapping_mismatch), similarity in zip(pending, similarities)
+        ]
+
+        if on_mismatch:
+            for mismatch in description_mismatches:
+                on_mismatch(mismatch)
+        if on_progress:
+            on_progress(1.0)
+
+        print(
+            f"Found {len(description_mismatches)} mismatched description(s), skipped {skipped['identical']} identical "
+            f"and {skipped['normalized']} equal after normalizing whitespace"
+            )
+        return SyncScan(mapping_mismatches + description_mismatches, skipped)
+
+    def apply(self, mismatch : Mismatch, choice : str) -> bool:
+        """
+        Execute a choice for a mismatch found by `scan`. Returns False if the choice is not 
+        valid for the mismatch type.
+
+        Choices for descriptions that depend on an unresolved mapping mismatch are held back until 
+        the mapping is resolved, and dropped if the mapping is skipped.
+        """
+        if choice not in CHOICES[mismatch.mismatch_type]:
+            return False
+
+        dependency = mismatch.depends_on
+        if dependency is not None and dependency.decision is None:
+            self._waiting.setdefault(id(dependency), []).append((mismatch, choice))
+            return True
+        if dependency is not None and dependency.decision in ("s", ""):
+            print(f"Skipped {mismatch.header}, the mapping was not resolved")
+            mismatch.decision = "s"
+            return True
+
+        mismatch.decision = choice
+        if mismatch._apply is not None:
+            mismatch._apply(choice)
+
+        # Apply choices that were waiting for this mismatch
+        for waiting, waiting_choice in self._waiting.pop(id(mismatch), []):
+            self.apply(waiting, waiting_choice)
+        return True
 
     def save_files(self):
+        with profile_run("sync", folder=self._profile_dir), profile_section("sync_save"), span("sync_save", cat="sync"):
+            self._save_files()
+
+    def _save_files(self):
         if self._word_manager is not None:
             self._word_manager.backup_and_save()
         for xls_manager in self._xls_managers.values():
             xls_manager.backup_and_save()
 
-    def _resolve_mapping_mismatch(self, mapping : Dict[str, Dict[str, str]], mapping_tables : Dict[str, Table], description : _WordDescription) -> Generator[Mismatch, str, str | None]:
-        # Find key which most closely matches the description
+    def close(self):
+        """
+        Release the workbooks opened by the syncer. Unsaved changes are lost.
+        """
+        for xls_manager in self._xls_managers.values():
+            xls_manager.close()
+        self._xls_managers = {}
+
+    def _mapping_mismatch(
+            self, 
+            mapping : Dict[str, Dict[str, str]], 
+            mapping_tables : Dict[str, Table], 
+            description : _WordDescription,
+            candidates : List[Tuple[str, float]]
+            ) -> Mismatch:
+        # Key which most closely matches the description
         target = description.component_name
-        choices = mapping[description.process_type].keys()
-
-        best_match, similarity, _ = process.extractOne(
-            target,
-            choices,
-            scorer=fuzz.ratio
-        )
-
-        while True:
-            choice = yield Mismatch(
-                "mapping", 
-                similarity, 
-                description.process_type.strip(), 
-                target, 
-                best_match
-                )
-            
+        best_match, similarity = candidates[0]
+
+        def apply(choice : str):
             match choice:
                 case "w":
                     tbl = mapping_tables[description.process_type]
                     _replace_table_value(tbl, best_match, target, 1)
-                    return mapping[description.process_type][best_match]
                 case "t":
                     description.set_component_name_heading(best_match)
-                    return mapping[description.process_type][best_match]
-                case "s" | "": 
-                    return
-                case _:
-                    # Unkown command
-                    pass
-
-    def _set_descriptions(self, description : _WordDescription, component : Component, excel_file_manager : ExcelFileManager) -> Generator[Mismatch, str, None]:
-        paragraph = description.node.get_or_insert_paragraph(0)
-
-        word_description = paragraph.text
-        excel_description = get_description(excel_file_manager, component.id)
-
-        similarity = fuzz.ratio(word_description, excel_description)
-
-        while True:
-            choice = yield Mismatch(
-                "description", 
-                similarity, 
-                f"{description.process_type.strip()} - {description.component_name.strip()}", 
-                word_description, 
-                excel_description
-                )
 
+        return Mismatch(
+            "mapping", 
+            similarity, 
+            description.process_type.strip(), 
+            target, 
+            best_match,
+            candidates=candidates,
+            process_type=description.process_type,
+            component_id=mapping[description.process_type][best_match],
+            component_name=description.component_name,
+            diff=diff_words(target, best_match),
+            _apply=apply
+            )
+
+    def _description_mismatch(
+            self, 
+            description : _WordDescription, 
+            component : Component, 
+            excel_file_manager : ExcelFileManager, 
+            word_description : str,
+            excel_description : str,
+            similarity : float,
+            mapping_mismatch : Mismatch | None
+            ) -> Mismatch:
+        def apply(choice : str):
             match choice:
                 case "w":
                     set_description(excel_file_manager, component.id, word_description)
-                    return
                 case "e":
-                    paragraph.text = excel_description
-                    return
-                case "s" | "": 
-                    return
-                case _:
-                    # Unkown command
-                    pass
-
-    def _parse_excel(self, xls_path : str) -> ExcelFileManager:
-        if xls_path in self._xls_managers:
-            return self._xls_managers[xls_path]
-        
-        xls_manager = ExcelFileManager(xls_path)
-        self._xls_managers[xls_path] = xls_manager
-        return xls_manager
\ No newline at end of file
+                    # The paragraph is only added to the document when the excel text is written
+                    description.description_paragraph().text = excel_description
+
+        return Mismatch(
+            "description", 
+            similarity, 
+            f"{description.process_type.strip()} - {description.component_name.strip()}", 
+            word_description, 
+            excel_description,
+            process_type=description.process_type,
+            component_id=component.id,
+            component_name=description.component_name,
+            depends_on=mapping_mismatch,
+            diff=diff_words(word_description, excel_description or ""),
+            _apply=apply
+            )
+
+    def _load_excel_files(
+            self, 
+            xls_paths : Iterable[str], 
+            on_progress : Callable[[float], None] | None = None,
+            stop : threading.Event | None = None
+            ):
+        """
+        Open all workbooks that are not already loaded, in parallel. Workbooks that have not started
+        loading are skipped once `stop` is set.
+        """
+        to_load = [pth for pth in dict.fromkeys(xls_paths) if pth not in self._xls_managers]
+        if not to_load:
+            return
+
+        # Profiled as one section, a profiler per worker thread cannot run at the same time
+        with profile_section("sync_open_workbooks"), ThreadPoolExecutor(max_workers=min(len(to_load), os.cpu_count() or 1)) as executor:
+            futures = {executor.submit(self._open_excel, pth, stop): pth for pth in to_load}
+            for i, future in enumerate(as_completed(futures)):
+                # Kept even when stopped, so `close` releases them
+                if (xls_manager := future.result()) is not None:
+                    self._xls_managers[futures[future]] = xls_manager
+                if on_progress:
+                    on_progress((i + 1) / (len(to_load) + 1))
+        _check_stopped(stop)
+
+    def _open_excel(self, xls_path : str, stop : threading.Event | None = None) -> ExcelFileManager | None:
+        if stop is not None and stop.is_set():
+            return None
+        with span("sync_open_workbook", cat="sync", workbook=os.path.basename(xls_path)):
+            return ExcelFileManager(xls_path)
@@ -0,0 +1,144 @@
+import queue
+import sys
+import threading
+from typing import List, Tuple
+
+from .sync_files import WordExcelSyncer, Mismatch, SyncStopped
+from .auto_resolve import AutoResolver
+from utils.redirect_manager import redirect_stdout_to
+
+# Events posted by the worker, as (event, value) tuples
+PROGRESS = "progress" # value: overall progress (0-1)
+MISMATCH = "mismatch" # value: Mismatch to show to the user
+RESOLVED = "resolved" # value: Mismatch resolved without the user, e.g. when its mapping was skipped
+INVALID = "invalid"   # value: Mismatch that received an unknown choice
+DONE = "done"         # value: None, all mismatches are resolved
+FAILED = "failed"     # value: the raised Exception
+
+class SyncWorker:
+    """
+    Runs a `WordExcelSyncer` on a background thread so the GUI stays responsive while
+    files are loaded. Mismatches and progress are posted to `events`, choices are sent
+    back with `decide`. Workbooks keep loading while the user decides on mapping mismatches.
+    Mismatches that `resolver` can decide are applied in bulk after the scan and never posted.
+    After `stop` the syncer is closed by the worker thread once it exits, so workbooks are not
+    released while they are still being read.
+
+    ## Example
+
+    ```
+    worker = SyncWorker(WordExcelSyncer())
+    worker.start(doc_path, xls_paths)
+    event, value = worker.events.get()
+    if event == MISMATCH:
+        worker.decide(value, "s")
+    ```
+    """
+    def __init__(self, syncer : WordExcelSyncer, stdout_redirect=None, resolver : AutoResolver | None = None):
+        self.syncer = syncer
+        self.resolver = resolver
+        self.events : queue.Queue[Tuple[str, object]] = queue.Queue()
+        self.decisions : queue.Queue[Tuple[Mismatch, str] | None] = queue.Queue()
+        self.thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._exited = True # Not running, `stop` closes the syncer itself
+
+        if stdout_redirect is None:
+            self.stdout_redirect = sys.stdout
+        else:
+            self.stdout_redirect = stdout_redirect
+
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, doc_path : str, xls_paths : List[str]):
+        self._exited = False
+        # Daemon thread, the worker is blocked waiting for decisions if the window is closed mid-sync
+        self.thread = threading.Thread(target=self._run, args=(doc_path, xls_paths), daemon=True)
+        self.thread.start()
+
+    def decide(self, mismatch : Mismatch, choice : str):
+        self.decisions.put((mismatch, choice))
+
+    def stop(self):
+        """
+        Stop the scan between workbooks and descriptions, or the wait for decisions, and close the syncer.
+        """
+        with self._lock:
+            self._stop.set()
+            self.decisions.put(None)
+            if self._exited:
+                self.syncer.close()
+
+    def _run(self, doc_path : str, xls_paths : List[str]):
+        try:
+            with redirect_stdout_to(self.stdout_redirect):
+                # Scanning is the first half of the progress, resolving mismatches the second
+                auto_resolved = []
+                auto_skipped = set() # ids of mapping mismatches that will be skipped automatically
+
+                def on_mismatch(mismatch : Mismatch):
+                    decided = self.resolver.decide(mismatch) if self.resolver else None
+                    if decided is not None:
+                        auto_resolved.append(mismatch)
+                        if decided[0] in ("s", ""):
+                            auto_skipped.add(id(mismatch))
+                    elif id(mismatch.depends_on) not in auto_skipped:
+                        self.events.put((MISMATCH, mismatch))
+
+                sync_scan = self.syncer.scan(
+                    doc_path, 
+                    xls_paths,
+                    on_progress=lambda p: self.events.put((PROGRESS, 0.5 * p)),
+                    on_mismatch=on_mismatch,
+                    stop=self._stop
+                    )
+
+                if self.resolver and auto_resolved:
+                    self.resolver.resolve(self.syncer, auto_resolved)
+                    # Descriptions under an automatically skipped mapping are skipped with it
+                    for m in sync_scan.mismatches:
+                        if m.decision is None and id(m.depends_on) in auto_skipped:
+                            self.syncer.apply(m, "s")
+                    print(f"Auto-resolved {self.resolver.num_resolved} mismatch(es)")
+
+                self._resolve_all(sync_scan.mismatches)
+        except SyncStopped:
+            pass
+        except Exception as e:
+            self.events.put((FAILED, e))
+        finally:
+            with self._lock:
+                self._exited = True
+                if self._stop.is_set():
+                    self.syncer.close()
+
+    def _resolve_all(self, mismatches : List[Mismatch]):
+        total = len(mismatches)
+        while True:
+            unresolved = [m for m in mismatches if m.decision is None]
+            self.events.put((PROGRESS, 0.5 + 0.5 * (total - len(unresolved)) / max(total, 1)))
+            if not unresolved:
+                self.events.put((DONE, None))
+                return
+
+            item = self.decisions.get()
+            if item is None:
+                return # Stopped
+            
+            mismatch, choice = item
+            if mismatch.decision is not None:
+                continue # Already resolved, e.g. together with its mapping
+            if not self.syncer.apply(mismatch, choice):
+                self.events.put((INVALID, mismatch))
+                continue
+
+            # Descriptions under a skipped mapping can not be synced, they are resolved with it
+            for m in mismatches:
+                if m.depends_on is not mismatch:
+                    continue
+                if m.decision is None and mismatch.decision in ("s", ""):
+                    self.syncer.apply(m, "s")
+                if m.decision is not None:
+                    self.events.put((RESOLVED, m))